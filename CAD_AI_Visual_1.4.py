@@ -1,120 +1,362 @@
+from cad_startup import PROFILE_FLAG, marks, profile_startup  # first: start-up marks time the imports below
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, filedialog
-import google.generativeai as genai
-from pyautocad import Autocad, APoint
 import traceback
+import collections
 import datetime
 import os
+import pickle
+import sys
+import threading
+import time
+from cad_cache import ResponseCache, drawing_state, fingerprint, make_key
+from cad_context import build_context
+from cad_geometry import GeometryStore
+from cad_heal import Healer
+from cad_history import PAGE_SIZE, HistoryStore
+from cad_model import (MODEL_NAME, build_prompt, build_repair_prompt, gemini_model, generate, generate_with_usage,
+                       stream_code)
+from cad_reader import make_reader
+from cad_render import CanvasScene, Viewport
+from cad_retrieval import ExampleIndex, format_examples
+from cad_snapshot import EntitySnapshot
+from cad_tasks import Task, TaskCancelled, TaskExecutor
+from cad_tiles import TileLayer
+from cad_validate import repair, validate
+
+# google.generativeai, pyautocad (cad_backend, cad_preview, cad_transaction) and the sandbox are
+# imported where they are first used, on background threads, so the window opens without them.
+marks.mark("imports")
 
 # ========== CONFIG ========== #
-def load_api_key():
+LOG_FILE = "autocad_gemini_log.txt"
+HISTORY_FILE = "history.sqlite"  # Prompts, generated code and run outcomes (searchable)
+CODE_HISTORY_FILE = "code_history.txt"  # Old text-file history, imported into HISTORY_FILE once
+PROMPT_MEMORY_FILE = "prompt_memory.txt"
+CONTEXT_TOKEN_BUDGET = 2000  # Max tokens of drawing context sent with each prompt
+STREAM_RESPONSES = True  # Show generated code as it streams in
+READER_BACKEND = "lisp"  # "lisp" = one bulk export per scan, "com" = per-property COM reads
+CAD_BACKEND = os.environ.get("CAD_BACKEND", "autocad")  # "autocad" or "memory" (in-memory fake, no AutoCAD)
+USE_SANDBOX = True  # Run generated code in worker processes (timeout, CPU/memory limits) instead of in the GUI
+SANDBOX_TIMEOUT = 30  # Seconds before a generated script is killed
+REPAIR_ATTEMPTS = 1  # Model round-trips to fix generated code that fails validation
+HEAL_ATTEMPTS = 3  # Fixes tried by self-heal mode after a failed run
+FEW_SHOT_EXAMPLES = 3  # Similar successful past runs shown to Gemini as examples (0 = off)
+OFFER_REUSE = True  # Offer stored code for a near-identical earlier prompt instead of calling Gemini
+SUMMARY_CACHE_SIZE = 32  # Drawing summaries kept per (drawing state, prompt)
+PERSIST_SNAPSHOT = True  # Save the entity snapshot next to the .dwg; reopening it unchanged skips the full scan
+
+# ========== INIT Gemini (on first use; warmed up in the background at start-up) ========== #
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = gemini_model()
+            marks.mark("gemini ready")
+        return _model
+
+# ========== Response Cache ========== #
+response_cache = ResponseCache()
+
+# ========== Entity Snapshot ========== #
+snapshot = EntitySnapshot(make_reader(READER_BACKEND), persist=PERSIST_SNAPSHOT)
+
+# ========== Sandbox Workers (started and pre-warmed in the background) ========== #
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox():
+    # The worker pool, or None when USE_SANDBOX is off
+    global _sandbox
+    with _sandbox_lock:
+        if _sandbox is None and USE_SANDBOX:
+            from cad_sandbox import SandboxPool
+            _sandbox = SandboxPool(timeout=SANDBOX_TIMEOUT)
+        return _sandbox
+
+# ========== INIT AutoCAD (on the background COM thread) ========== #
+acad = None
+
+
+def connect_autocad():
+    global acad
     try:
-        with open("config.txt", "r") as f:
-            key = f.read().strip()
-            if not key:
-                raise ValueError("Empty API key")
-            return key
+        from cad_backend import connect
+        acad = connect(CAD_BACKEND)
+        snapshot.attach_events(acad)
+        snapshot.restore(acad)
     except Exception:
-        messagebox.showerror(
-            "API Key Missing",
-            "Please create a file named 'config.txt' with your Gemini API key."
-        )
-        exit()
+        marks.mark("autocad failed")
+        raise
+    marks.mark("autocad connected")
 
-GEMINI_API_KEY = load_api_key()
-LOG_FILE = "autocad_gemini_log.txt"
-CODE_HISTORY_FILE = "code_history.txt"
-PROMPT_MEMORY_FILE = "prompt_memory.txt"
 
-# ========== INIT Gemini ========== #
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
+def on_task_error(error):
+    set_status(f"Error: {error}")
+    messagebox.showerror("Error", f"Error: {error}")
+
 
-# ========== INIT AutoCAD ========== #
-acad = Autocad(create_if_not_exists=True)
+executor = TaskExecutor(com_init=connect_autocad, pump=snapshot.pump_events, on_error=on_task_error)
 
 # ========== Undo/Redo Stacks ========== #
 undo_stack = []
 redo_stack = []
 
-# ========== Drawing Summary ========== #
-def get_drawing_summary():
-    try:
-        summary = []
-        counts = {'Line': 0, 'Circle': 0, 'Polyline': 0, 'Text': 0}
-        for entity in acad.iter_objects(['Line', 'Circle', 'Polyline', 'Text', 'MText']):
-            layer = entity.Layer
-            if entity.ObjectName == 'AcDbLine':
-                start, end = entity.StartPoint, entity.EndPoint
-                summary.append(f"[{layer}] Line from {start} to {end}")
-                counts['Line'] += 1
-            elif entity.ObjectName == 'AcDbCircle':
-                center, radius = entity.Center, entity.Radius
-                summary.append(f"[{layer}] Circle at {center} with radius {radius}")
-                counts['Circle'] += 1
-            elif entity.ObjectName == 'AcDbPolyline':
-                summary.append(f"[{layer}] Polyline with {entity.NumberOfVertices} vertices")
-                counts['Polyline'] += 1
-            elif entity.ObjectName in ['AcDbText', 'AcDbMText']:
-                summary.append(f"[{layer}] Text: {entity.TextString}")
-                counts['Text'] += 1
-        count_summary = "\n".join([f"{k}s: {v}" for k, v in counts.items()])
-        details = "\n".join(summary) if summary else "No entities."
-        return f"Entities Count:\n{count_summary}\n\nDetails:\n{details}"
-    except Exception as e:
-        return f"Error reading drawing: {e}"
+# ========== History ========== #
+history = HistoryStore(HISTORY_FILE)
 
-# ========== Gemini Prompt ========== #
-def ask_gemini(prompt_text, mode="default"):  
-    context = get_drawing_summary()  
-    prompt = f"""
-You are an AutoCAD assistant using pyautocad in Python.
+# ========== Last Request (what self-heal sends back with a failing script) ========== #
+last_request = {"prompt": "", "mode": "default", "context": "", "history_id": None, "code": None}
 
-Drawing mode: {mode}
-Current drawing context:
-{context}
+# ========== Similar Past Runs (index built from the history in the background) ========== #
+example_index = ExampleIndex()
 
-User prompt: {prompt_text}
 
-Respond ONLY with Python code using pyautocad. Do not include explanations.
-"""
-    response = model.generate_content(prompt)
-    return response.text.strip()
+def load_example_index():
+    def build(task):
+        history.import_legacy(CODE_HISTORY_FILE, PROMPT_MEMORY_FILE)
+        return ExampleIndex.from_history(history)
 
-# ========== Save Command/Prompt History ========== #
-def save_code_to_file(code):
-    with open(CODE_HISTORY_FILE, "a", encoding="utf-8") as f:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        f.write(f"\n--- {timestamp} ---\n{code}\n")
+    def on_done(index):
+        global example_index
+        example_index = index
+        marks.mark("history indexed")
 
+    def on_error(e):
+        marks.mark("history failed")
+        set_status(f"History index unavailable: {e}")
 
-def save_prompt(prompt):
-    with open(PROMPT_MEMORY_FILE, "a", encoding="utf-8") as f:
-        f.write(f"{prompt}\n")
+    executor.submit("Index history", build, on_done=on_done, on_error=on_error, background=True)
 
-# ========== Run Code ========== #
-def run_code(code):
+
+# ========== Start-up (everything slow happens after the window is shown) ========== #
+def start_services():
+    def on_gemini_error(e):
+        marks.mark("gemini failed")
+        set_status(f"Gemini not ready: {e}")
+
+    def on_autocad(connected):
+        if not connected:  # a failed connection was already reported by the COM thread
+            return
+        if snapshot.restored:
+            set_status(f"Connected to AutoCAD (drawing restored from its saved snapshot, {len(snapshot.store)} entities).")
+        else:
+            set_status("Connected to AutoCAD.")
+
+    # background: the Cancel button leaves start-up work alone
+    executor.submit("Connect Gemini", lambda task: get_model(), background=True,
+                    on_done=lambda model: set_status("Gemini ready."), on_error=on_gemini_error)
+    # queued behind the connection made when the COM thread started
+    executor.submit_com("Check AutoCAD", lambda task: acad is not None, on_done=on_autocad, background=True)
+    if USE_SANDBOX:
+        executor.submit("Start sandbox", lambda task: get_sandbox(), background=True)
+    load_example_index()
+
+# ========== Drawing Summary (reused while the drawing fingerprint is unchanged) ========== #
+summary_cache = collections.OrderedDict()
+
+
+def get_drawing_summary(prompt_text=""):
+    return read_drawing(prompt_text)[0]
+
+
+def read_drawing(prompt_text=""):
+    # Returns (summary, drawing state key); the key is None if the drawing could not be read
     try:
-        exec_globals = {"acad": acad, "APoint": APoint}
-        exec(code, exec_globals)
-        undo_stack.append(code)
-        save_code_to_file(code)
-        status_label.config(text="Code executed successfully.")
-        messagebox.showinfo("Success", "Code executed successfully.")
-        update_visuals()  # Refresh visual display after execution
+        with snapshot.lock:
+            snapshot.refresh(acad)
+            state = drawing_state(snapshot.root, CONTEXT_TOKEN_BUDGET)
+            key = (state, prompt_text)
+            summary = summary_cache.get(key)
+            if summary is None:
+                summary = build_context(snapshot.store, prompt_text, CONTEXT_TOKEN_BUDGET, snapshot.index())
+                summary_cache[key] = summary
+                if len(summary_cache) > SUMMARY_CACHE_SIZE:
+                    summary_cache.popitem(last=False)
+            else:
+                summary_cache.move_to_end(key)
+            return summary, state
     except Exception as e:
-        error_text = traceback.format_exc()
+        return f"Error reading drawing: {e}", None
+
+# ========== Gemini Prompt ========== #
+def generate_code(prompt):
+    return generate(get_model(), prompt)
+
+# ========== Save Command/Prompt History ========== #
+def record_run(code, status, error=None, summary=None, seconds=None):
+    # Outcome of running code: on the generated entry it came from, or a new entry if it was edited/healed
+    run_id = last_request["history_id"]
+    if run_id is None or code != last_request["code"]:
+        run_id = history.add(last_request["prompt"], code, status, last_request["mode"])
+    history.set_outcome(run_id, status, error, summary, seconds)
+    last_request["history_id"] = None  # running it again gets an entry of its own
+    if status == "executed" and last_request["prompt"]:
+        example_index.add(run_id, last_request["prompt"], last_request["mode"], code)
+
+# ========== Run Code ========== #
+_packed_snapshot = {"key": None, "data": None}
+
+
+def sandbox_run(code, task=None):
+    # Dry-runs code in a sandbox worker against the current snapshot; returns the recorded result
+    # The lock is held only to pickle the store (once per version), never while the worker runs
+    with snapshot.lock:
+        key = (id(snapshot.store), snapshot.store.version)
+        if _packed_snapshot["key"] != key:
+            _packed_snapshot.update(key=key, data=pickle.dumps(snapshot.store, pickle.HIGHEST_PROTOCOL))
+        data = _packed_snapshot["data"]
+    return get_sandbox().run(code, data, key, cancelled=(lambda: task.cancelled) if task is not None else None)
+
+
+def dry_run(code, task=None):
+    # Runs code without touching AutoCAD (in a sandbox process when enabled)
+    # Returns (would-be entities, what the dry run could not model)
+    if USE_SANDBOX:
+        result = sandbox_run(code, task)
+        return GeometryStore.from_entities(result["records"]), result["unsupported"]
+    from cad_preview import preview
+    with snapshot.lock:  # a private copy, so the script runs without holding the lock
+        data = pickle.dumps((snapshot.store, snapshot.index()), pickle.HIGHEST_PROTOCOL)
+    store, index = pickle.loads(data)
+    recorder = preview(code, store, index)
+    return recorder.store, recorder.unsupported
+
+
+def execute_code(code, task=None, rollback=False):
+    # Runs on the COM thread; the tracking proxy records what the code creates/modifies for undo
+    # Returns (transaction, changes, seconds, what the sandbox could not replay - run in-process instead)
+    from cad_preview import run_script
+    from cad_sandbox import apply_result
+    from cad_transaction import Transaction, TrackingAutocad
+    started = time.perf_counter()
+    snapshot.refresh(acad)
+    transaction = Transaction(code, snapshot.store)
+    tracked = TrackingAutocad(acad, transaction)
+    unsupported = []
+    try:
+        if USE_SANDBOX:
+            result = sandbox_run(code, task)
+            unsupported = result["unsupported"]
+        if USE_SANDBOX and not unsupported:
+            apply_result(tracked, result)  # the script itself never runs in this process
+        else:  # no sandbox, or its recording would silently drop part of the script
+            run_script(code, tracked, snapshot.index())
+    except Exception:
+        if rollback:  # undo whatever the failed run managed to do before retrying
+            snapshot.invalidate(None if transaction.opaque else transaction.touched())
+            transaction.finish(snapshot.store, snapshot.refresh(acad))
+            transaction.undo(acad)
+            snapshot.invalidate(transaction.touched())
+            snapshot.refresh(acad)
+        raise
+    # re-read only what the run touched; the snapshot falls back to a diff if anything else changed
+    snapshot.invalidate(None if transaction.opaque else transaction.touched())
+    changes = snapshot.refresh(acad)
+    transaction.finish(snapshot.store, changes)
+    return transaction, changes, time.perf_counter() - started, unsupported
+
+
+def replay_transaction(transaction, action):
+    # Runs on the COM thread: one batched undo or redo, then an incremental snapshot refresh
+    touched = transaction.touched()
+    getattr(transaction, action)(acad)
+    snapshot.invalidate(touched | transaction.touched())
+    return snapshot.refresh(acad)
+
+
+def run_code(code, code_display=None, healer=None):
+    healing = heal_var.get()
+    validation = validate(code)  # the code may have been edited since it was generated
+    if not validation.ok:
+        if healing:
+            self_heal(code, validation.report(), code_display, healer)
+            return
+        set_status("Code rejected by validation; nothing was run.")
+        messagebox.showerror("Validation Failed", validation.report())
+        return
+    code = validation.code
+
+    def on_success(result):
+        transaction, changes, seconds, unsupported = result
+        undo_stack.append(transaction)
+        redo_stack.clear()
+        record_run(code, "executed", summary=transaction.summary(), seconds=round(seconds, 3))
+        healed = f"; self-healed: {healer.summary()}" if healer is not None else ""
+        in_process = f"; run in the app, the sandbox cannot replay {', '.join(unsupported)}" if unsupported else ""
+        set_status(f"Code executed successfully ({transaction.summary()}{healed}{in_process}).")
+        update_visuals.generated_code_entities = None  # the preview is now real geometry
+        apply_changes(changes)  # Redraw only what the code added/changed/erased
+        if unsupported:
+            messagebox.showinfo("Success", "Code executed successfully.\n\nIt ran inside the app instead of the "
+                                f"sandbox (no timeout), because the sandbox cannot replay: {', '.join(unsupported)}.")
+        else:
+            messagebox.showinfo("Success", "Code executed successfully.")
+
+    def on_error(e):
+        error_text = "".join(traceback.format_exception(type(e), e, e.__traceback__))
         with open(LOG_FILE, "a") as f:
             f.write(error_text)
-        status_label.config(text="Execution error.")
+        record_run(code, "failed", error=error_text)
+        if healing and not isinstance(e, TaskCancelled):
+            self_heal(code, error_text, code_display, healer)
+            return
+        set_status("Execution error.")
         if messagebox.askyesno("Execution Error", "An error occurred.\nWould you like to see details?"):
             messagebox.showerror("Error Details", error_text)
 
+    set_status("Running code in AutoCAD...")
+    executor.submit_com("Run code", lambda task: execute_code(code, task, rollback=healing),
+                        on_done=on_success, on_error=on_error)
+
+
+def self_heal(code, error, code_display=None, healer=None):
+    # Sends the failing code and its error back to Gemini; a fix that passes validation and a dry run is run
+    def fix(bad, problems):
+        prompt = build_repair_prompt(last_request["prompt"] or "(script written by the user)", last_request["mode"],
+                                     last_request["context"], bad, problems)
+        return generate_with_usage(get_model(), prompt)
+
+    healer = healer or Healer(fix, dry_run, HEAL_ATTEMPTS)
+
+    def log_attempts():
+        with open(LOG_FILE, "a") as f:
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"\n--- self-heal {timestamp} ---\n{healer.report()}\n")
+
+    def on_fixed(fixed):
+        log_attempts()
+        if code_display is not None:
+            code_display.delete(1.0, tk.END)
+            code_display.insert(tk.END, fixed)
+        run_code(fixed, code_display, healer)
+
+    def on_error(e):
+        log_attempts()
+        set_status(f"Self-heal gave up ({healer.summary()}).")
+        messagebox.showerror("Self-Heal Failed", f"{e}\n\n{healer.report()}")
+
+    set_status(f"Run failed; self-healing (attempt {len(healer.attempts) + 1} of {HEAL_ATTEMPTS})...")
+    executor.submit("Self-heal", lambda task: healer.heal(code, error, task), on_done=on_fixed, on_error=on_error)
+
+
+def set_status(text):
+    pending = len(executor.active)
+    status_label.config(text=f"{text}  [{pending} task(s) pending]" if pending else text)
+
 # ========== GUI Interface ========== #
 def create_gui():
-    global status_label, canvas
+    global status_label, canvas, scene, use_cache_var, raster_var, heal_var
 
     window = tk.Tk()
+    use_cache_var = tk.BooleanVar(value=True)
+    raster_var = tk.BooleanVar(value=False)
+    heal_var = tk.BooleanVar(value=False)
     window.title("AutoCAD Gemini Copilot - Advanced v3.0")
     window.geometry("1080x780")
 
@@ -136,10 +378,11 @@ def create_gui():
     tk.Button(btn_frame, text="Generate Code", command=lambda: on_generate(prompt_entry, code_display, mode_var)).pack(side=tk.LEFT, padx=5)
     tk.Button(btn_frame, text="Clear All", command=lambda: on_clear(prompt_entry, code_display)).pack(side=tk.LEFT, padx=5)
     tk.Button(btn_frame, text="Run in AutoCAD", command=lambda: on_run(code_display)).pack(side=tk.LEFT, padx=5)
+    tk.Button(btn_frame, text="Cancel", command=on_cancel).pack(side=tk.LEFT, padx=5)
     tk.Button(btn_frame, text="Undo", command=on_undo).pack(side=tk.LEFT, padx=5)
     tk.Button(btn_frame, text="Redo", command=on_redo).pack(side=tk.LEFT, padx=5)
     tk.Button(btn_frame, text="Save Code", command=lambda: on_save_code(code_display)).pack(side=tk.LEFT, padx=5)
-    tk.Button(btn_frame, text="Show History", command=on_load_prompt_history).pack(side=tk.LEFT, padx=5)
+    tk.Button(btn_frame, text="Show History", command=lambda: on_show_history(code_display)).pack(side=tk.LEFT, padx=5)
     btn_frame.pack(pady=10)
 
     # Mode Selector
@@ -166,86 +409,161 @@ def create_gui():
     context_display.pack(padx=10)
     tk.Button(left_frame, text="Refresh Drawing Context", command=lambda: on_refresh_context(context_display)).pack(pady=5)
 
+    # Response cache toggle (unchecked = always ask Gemini)
+    tk.Checkbutton(left_frame, text="Use response cache", variable=use_cache_var).pack(anchor='w', padx=10)
+    tk.Checkbutton(left_frame, text=f"Self-heal failed runs (up to {HEAL_ATTEMPTS} fixes)",
+                   variable=heal_var).pack(anchor='w', padx=10)
+
+    # Raster preview: cached image tiles instead of vector items (for dense drawings)
+    tk.Checkbutton(left_frame, text="Raster preview (dense drawings)", variable=raster_var,
+                   command=on_toggle_raster).pack(anchor='w', padx=10)
+
     # Right Frame (Visual Display)
     right_frame = tk.Frame(main_frame)
     right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-    # Canvas for Visuals
+    # Canvas for Visuals (wheel = zoom, drag = pan, double-click = fit drawing)
     canvas = tk.Canvas(right_frame, bg="white", width=680, height=780)
     canvas.pack(fill=tk.BOTH, expand=True)
+    scene = CanvasScene(canvas, view)
+    bind_view_controls(canvas)
 
     # Status Bar
     status_label = tk.Label(window, text="Ready.", bd=1, relief=tk.SUNKEN, anchor=tk.W)
     status_label.pack(side=tk.BOTTOM, fill=tk.X)
 
+    # Background work results are delivered through the Tk event loop
+    executor.attach(window, on_status=set_status)
+    marks.mark("window built")
+
+    def on_interactive():
+        # First pass of the event loop: the window is up and responding
+        marks.mark("interactive")
+        start_services()
+        if marks.enabled:  # --profile-startup child: report once the background services are ready
+            marks.finish_when(window, ("autocad", "gemini", "history"))
+
+    window.after(0, on_interactive)
+
+    def on_close():
+        # Save the snapshot for the next start (on the COM thread), then quit; give up waiting after a few seconds
+        closed = False
+
+        def finish(*args):
+            nonlocal closed
+            if not closed:
+                closed = True
+                executor.shutdown()
+                window.destroy()
+
+        executor.cancel_all()
+        if PERSIST_SNAPSHOT and acad is not None:
+            set_status("Saving drawing snapshot...")
+            executor.submit_com("Save snapshot", lambda task: snapshot.save(acad), on_done=finish, on_error=finish)
+            window.after(5000, finish)
+        else:
+            finish()
+
+    window.protocol("WM_DELETE_WINDOW", on_close)
     window.mainloop()
     
 # ========== Update Visuals (existing + generated) ========== #
 def update_visuals():
-    canvas.delete("all")  # Clear the canvas first
-    
-    # Draw the existing AutoCAD drawing
-    for entity in acad.iter_objects(['Line', 'Circle', 'Polyline', 'Text', 'MText']):
-        if entity.ObjectName == 'AcDbLine':
-            start, end = entity.StartPoint, entity.EndPoint
-            canvas.create_line(start[0], start[1], end[0], end[1], fill="black")
-        elif entity.ObjectName == 'AcDbCircle':
-            center, radius = entity.Center, entity.Radius
-            canvas.create_oval(center[0] - radius, center[1] - radius,
-                               center[0] + radius, center[1] + radius, outline="black")
-        elif entity.ObjectName == 'AcDbPolyline':
-            points = [APoint(p[0], p[1]) for p in entity.GetVertices()]
-            canvas.create_polygon([(p[0], p[1]) for p in points], outline="black", fill="")
-        elif entity.ObjectName in ['AcDbText', 'AcDbMText']:
-            text = entity.TextString
-            pos = entity.InsertionPoint
-            canvas.create_text(pos[0], pos[1], text=text, fill="black", anchor=tk.NW)
-    
-    # Now overlay generated shapes (if any)
-    if hasattr(update_visuals, 'generated_code_entities'):
-        for entity in update_visuals.generated_code_entities:
-            if isinstance(entity, dict):
-                # Draw the generated entity (example: a generated line or circle)
-                if entity["type"] == "Line":
-                    start, end = entity["start"], entity["end"]
-                    canvas.create_line(start[0], start[1], end[0], end[1], fill="blue", dash=(4, 2))
-                elif entity["type"] == "Circle":
-                    center, radius = entity["center"], entity["radius"]
-                    canvas.create_oval(center[0] - radius, center[1] - radius,
-                                       center[0] + radius, center[1] + radius, outline="blue", dash=(4, 2))
-                elif entity["type"] == "Text":
-                    text = entity["text"]
-                    pos = entity["position"]
-                    canvas.create_text(pos[0], pos[1], text=text, fill="blue", anchor=tk.NW)
-
-# Call this function when the new code is generated
-def on_generate(prompt_entry, code_display, mode_var):
-    prompt = prompt_entry.get().strip()
-    if not prompt:
-        messagebox.showwarning("Input Required", "Please enter a prompt.")
+    # Read the drawing on the COM thread, then draw on the Tk thread
+    executor.submit_com("Refresh preview", lambda task: snapshot.refresh(acad),
+                        on_done=apply_changes)
+
+
+def apply_changes(changes):
+    # Incremental canvas update from a snapshot change set; retried later while the snapshot is busy
+    if not snapshot.lock.acquire(blocking=False):  # the Tk thread never waits for a scan
+        canvas.after(SNAPSHOT_RETRY_MS, lambda: apply_changes(changes))
         return
-    if undo_stack:
-        if not messagebox.askyesno("Warning", "Generating new code will reset undo history. Continue?"):
-            return
-    mode = mode_var.get()
-    save_prompt(prompt)
     try:
-        code = ask_gemini(prompt, mode)
-        code_display.delete(1.0, tk.END)
-        code_display.insert(tk.END, code)
-        status_label.config(text="Code generated.")
-        
-        # Store generated entities (lines, circles, etc.) for overlay
-        generated_entities = []
-        exec(code, {}, {"acad": acad, "APoint": APoint, "generated_entities": generated_entities})
-        update_visuals.generated_code_entities = generated_entities  # Store generated entities for later use
-        update_visuals()  # Refresh visuals with the updated drawing
-        
-    except Exception as e:
-        status_label.config(text="Error generating code.")
-        messagebox.showerror("Gemini Error", f"Error: {e}")
+        scene.apply(snapshot.store, changes, snapshot.index,
+                    getattr(update_visuals, 'generated_code_entities', None))
+    finally:
+        snapshot.lock.release()
+
+
+def draw_visuals():
+    # Existing drawing (only what is on screen) plus generated shapes, if any
+    # Returns False (nothing drawn) while the COM thread holds the snapshot
+    view.resize(canvas.winfo_width(), canvas.winfo_height())
+    if not snapshot.lock.acquire(blocking=False):
+        return False
+    try:
+        stats = scene.redraw(snapshot.store, snapshot.index(),
+                             getattr(update_visuals, 'generated_code_entities', None))
+    finally:
+        snapshot.lock.release()
+    if stats.truncated:
+        set_status(f"Preview limited to {stats.drawn} of {stats.visible} visible entities - zoom in for detail.")
+    return True
+
+
+# ========== Pan / Zoom ========== #
+view = Viewport()
+_redraw_pending = False
+SNAPSHOT_RETRY_MS = 50  # Tk-side retry interval while a scan holds the snapshot
+
+
+def schedule_redraw():
+    # Coalesce bursts of wheel/drag events into one redraw per idle cycle
+    global _redraw_pending
+    if not _redraw_pending:
+        _redraw_pending = True
+
+        def redraw():
+            global _redraw_pending
+            if not draw_visuals():  # snapshot busy: keep the one pending redraw and try again
+                canvas.after(SNAPSHOT_RETRY_MS, redraw)
+                return
+            _redraw_pending = False
+
+        canvas.after_idle(redraw)
+
+
+def on_toggle_raster():
+    global tile_layer
+    if raster_var.get():
+        if tile_layer is None:
+            tile_layer = TileLayer(lambda data: tk.PhotoImage(data=data, format="PPM"))
+        scene.tiles = tile_layer
+    else:
+        scene.tiles = None
+    schedule_redraw()
+
+
+tile_layer = None
+
+
+def bind_view_controls(canvas):
+    drag = {}
+
+    def on_zoom(event, factor):
+        view.zoom(factor, event.x, event.y)
+        schedule_redraw()
 
-# Other handlers (on_clear, on_run, etc.) remain the same.
+    def on_press(event):
+        drag["x"], drag["y"] = event.x, event.y
+
+    def on_drag(event):
+        view.pan(event.x - drag["x"], event.y - drag["y"])
+        drag["x"], drag["y"] = event.x, event.y
+        schedule_redraw()
+
+    def on_fit(event):
+        view.fitted = False
+        schedule_redraw()
+
+    canvas.bind("<MouseWheel>", lambda e: on_zoom(e, 1.2 ** (e.delta / 120.0)))
+    canvas.bind("<Button-4>", lambda e: on_zoom(e, 1.2))  # X11 wheel up
+    canvas.bind("<Button-5>", lambda e: on_zoom(e, 1 / 1.2))  # X11 wheel down
+    canvas.bind("<ButtonPress-1>", on_press)
+    canvas.bind("<B1-Motion>", on_drag)
+    canvas.bind("<Double-Button-1>", on_fit)
+    canvas.bind("<Configure>", lambda e: schedule_redraw())
 
 # ========== Button Handlers & Utilities ========== #
 def on_generate(prompt_entry, code_display, mode_var):
@@ -257,43 +575,171 @@ def on_generate(prompt_entry, code_display, mode_var):
         if not messagebox.askyesno("Warning", "Generating new code will reset undo history. Continue?"):
             return
     mode = mode_var.get()
-    save_prompt(prompt)
-    try:
-        code = ask_gemini(prompt, mode)
+    use_cache = use_cache_var.get()
+    match = example_index.reusable(prompt, mode) if OFFER_REUSE else None
+    if match is not None and messagebox.askyesno(
+            "Reuse Earlier Code",
+            f"History entry #{match.id} is {match.score:.0%} similar:\n\n{match.prompt}\n\n"
+            "Use its code instead of asking Gemini?"):
+        reuse_code(match, prompt, mode, code_display)
+        return
+    task = Task(f"Generate: {prompt[:40]}")
+    outcome = {"cached": False, "seconds": None}
+
+    def read_context(task):
+        task.progress("Reading drawing...")
+        return read_drawing(prompt)
+
+    def call_model(task, context, state):
+        started = time.perf_counter()
+        state = state or fingerprint(context)  # the drawing fingerprint, or the summary text if unreadable
+        key = make_key(prompt, mode, MODEL_NAME, state)
+        code = response_cache.get(key) if use_cache else None
+        outcome["cached"] = code is not None
+        if code is None:
+            examples = ""
+            if FEW_SHOT_EXAMPLES:
+                examples = format_examples(example_index.search(prompt, FEW_SHOT_EXAMPLES))
+            code = generate_with_model(task, context, examples)
+        validation, rounds = repair(code, lambda bad, problems: repair_with_model(task, context, bad, problems),
+                                    REPAIR_ATTEMPTS)
+        outcome.update(validation=validation, repairs=rounds, fingerprint=state,
+                       seconds=round(time.perf_counter() - started, 3))
+        if validation.ok:
+            response_cache.put(key, validation.code)  # only code that passed validation is cached
+        return validation.code
+
+    def repair_with_model(task, context, code, problems):
+        task.check()
+        task.progress("Repairing generated code...")
+        return generate_code(build_repair_prompt(prompt, mode, context, code, problems))
+
+    def generate_with_model(task, context, examples):
+        task.progress("Waiting for Gemini...")
+        if not STREAM_RESPONSES:
+            return generate_code(build_prompt(prompt, mode, context, examples))
+        started = time.perf_counter()
+        first_chunk = []
+
+        def on_chunk(text):
+            if not first_chunk:
+                first_chunk.append(time.perf_counter() - started)
+                task.emit(start_stream, first_chunk[0])
+            task.emit(append_chunk, text)
+
+        return stream_code(get_model(), build_prompt(prompt, mode, context, examples), on_chunk, task)
+
+    def start_stream(latency):
+        code_display.delete(1.0, tk.END)
+        set_status(f"Streaming code (first token after {latency:.2f}s)...")
+
+    def append_chunk(text):
+        code_display.insert(tk.END, text)
+        code_display.see(tk.END)
+
+    def on_context(result):
+        context, state = result
+        last_request.update(prompt=prompt, mode=mode, context=context)
+        executor.submit(task.name, call_model, context, state, task=task, on_done=on_code, on_error=on_error)
+
+    def on_code(code):
         code_display.delete(1.0, tk.END)
         code_display.insert(tk.END, code)
-        status_label.config(text="Code generated.")
-    except Exception as e:
-        status_label.config(text="Error generating code.")
+        validation = outcome["validation"]
+        status = ("cached" if outcome["cached"] else "generated") if validation.ok else "invalid"
+        last_request.update(code=code, history_id=history.add(prompt, code, status, mode, outcome["fingerprint"],
+                                                              outcome["seconds"]))
+        if not validation.ok:
+            set_status(f"Generated code failed validation after {outcome['repairs']} repair(s); not previewed.")
+            messagebox.showwarning("Validation Failed", validation.report())
+            return
+        source = "from cache" if outcome["cached"] else "by Gemini"
+        repaired = f", repaired {outcome['repairs']}x" if outcome["repairs"] else ""
+        estimate = f"{'' if validation.exact else '>= '}{validation.entities} entities"
+        set_status(f"Code generated {source} ({estimate}{repaired}; {response_cache.stats_text()}).")
+        show_preview(code)
+
+    def on_error(e):
+        history.set_outcome(history.add(prompt, "", "error", mode), "error", error=str(e))
+        set_status("Error generating code.")
         messagebox.showerror("Gemini Error", f"Error: {e}")
 
+    executor.submit_com(task.name, read_context, task=task, on_done=on_context, on_error=on_error)
+    set_status("Generation queued.")
+
+
+def reuse_code(match, prompt, mode, code_display):
+    # Stored code of a successful earlier run stands in for a generation (no model call)
+    code_display.delete(1.0, tk.END)
+    code_display.insert(tk.END, match.code)
+    last_request.update(prompt=prompt, mode=mode, context="", code=match.code,
+                        history_id=history.add(prompt, match.code, "reused", mode))
+    set_status(f"Reused code from history entry #{match.id} ({match.score:.0%} similar).")
+    show_preview(match.code)
+
+
+def show_preview(code):
+    # Dry run off the GUI thread: shows what the code would add, without touching AutoCAD
+    def on_done(result):
+        overlay, unsupported = result
+        update_visuals.generated_code_entities = overlay
+        scene.set_overlay(overlay)
+        if unsupported:
+            set_status(f"Preview is incomplete; the dry run cannot show {', '.join(unsupported)}.")
+
+    def on_error(e):
+        set_status(f"Preview failed: {e}")
+
+    executor.submit("Preview", lambda task: dry_run(code, task), on_done=on_done, on_error=on_error)
+
+
+def on_cancel():
+    count = executor.cancel_all()
+    set_status(f"Cancelling {count} task(s)..." if count else "Nothing to cancel.")
+
 
 def on_clear(prompt_entry, code_display):
     prompt_entry.delete(0, tk.END)
     code_display.delete(1.0, tk.END)
+    update_visuals.generated_code_entities = None
+    scene.set_overlay(None)
     status_label.config(text="Cleared prompt and code.")
 
 
 def on_run(code_display):
     code = code_display.get(1.0, tk.END).strip()
     if code:
-        run_code(code)
+        run_code(code, code_display)
 
 
 def on_undo():
     if undo_stack:
-        last = undo_stack.pop()
-        redo_stack.append(last)
-        status_label.config(text="Undo performed.")
-        messagebox.showinfo("Undo", "Undo completed (manual redraw may be needed).")
+        transaction = undo_stack.pop()
+
+        def on_done(changes):
+            redo_stack.append(transaction)
+            set_status(f"Undo performed ({transaction.summary()}).")
+            apply_changes(changes)
+
+        set_status("Undoing...")
+        executor.submit_com("Undo", lambda task: replay_transaction(transaction, "undo"),
+                            on_done=on_done, on_error=lambda e: messagebox.showerror("Undo Error", str(e)))
     else:
         messagebox.showinfo("Undo", "No actions to undo.")
 
 
 def on_redo():
     if redo_stack:
-        redo_code = redo_stack.pop()
-        run_code(redo_code)
+        transaction = redo_stack.pop()
+
+        def on_done(changes):
+            undo_stack.append(transaction)
+            set_status(f"Redo performed ({transaction.summary()}).")
+            apply_changes(changes)
+
+        set_status("Redoing...")
+        executor.submit_com("Redo", lambda task: replay_transaction(transaction, "redo"),
+                            on_done=on_done, on_error=lambda e: messagebox.showerror("Redo Error", str(e)))
     else:
         messagebox.showinfo("Redo", "Nothing to redo.")
 
@@ -303,24 +749,115 @@ def on_save_code(code_display):
     if not code:
         messagebox.showinfo("Empty", "No code to save.")
         return
-    save_code_to_file(code)
+    history.add(last_request["prompt"], code, "saved", last_request["mode"])
     status_label.config(text="Code saved to history.")
 
 
-def on_load_prompt_history():
-    if os.path.exists(PROMPT_MEMORY_FILE):
-        with open(PROMPT_MEMORY_FILE, "r", encoding="utf-8") as f:
-            history = f.read()
-        messagebox.showinfo("Prompt History", history)
-    else:
-        messagebox.showinfo("Prompt History", "No prompt history found.")
+def on_show_history(code_display):
+    # Search box + list that loads PAGE_SIZE entries at a time as it is scrolled; details of the selection on the right
+    window = tk.Toplevel()
+    window.title("History")
+    window.geometry("960x520")
+    state = {"query": "", "ids": [], "done": False, "search_job": None}
+
+    top = tk.Frame(window)
+    tk.Label(top, text="Search prompts and code:").pack(side=tk.LEFT)
+    search_var = tk.StringVar()
+    tk.Entry(top, textvariable=search_var, width=50).pack(side=tk.LEFT, padx=5)
+    count_label = tk.Label(top, text="")
+    count_label.pack(side=tk.LEFT, padx=10)
+    top.pack(fill=tk.X, padx=10, pady=5)
+
+    panes = tk.PanedWindow(window, orient=tk.HORIZONTAL)
+    list_frame = tk.Frame(panes)
+    scrollbar = tk.Scrollbar(list_frame)
+    listbox = tk.Listbox(list_frame, width=70, activestyle="none", exportselection=False)
+    scrollbar.config(command=listbox.yview)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    detail = scrolledtext.ScrolledText(panes, width=50)
+    panes.add(list_frame)
+    panes.add(detail)
+    panes.pack(fill=tk.BOTH, expand=True, padx=10)
+
+    def describe(row):
+        when = datetime.datetime.fromtimestamp(row["created"]).strftime("%Y-%m-%d %H:%M") if row["created"] else "(imported)"
+        text = row["prompt"] or (row["code_head"] or "").strip().split("\n")[0]
+        return f"#{row['id']}  {when}  [{row['status']}]  {text}"[:160]
+
+    def load_page():
+        if state["done"]:
+            return
+        rows = history.page(state["query"], state["ids"][-1] if state["ids"] else None)
+        state["done"] = len(rows) < PAGE_SIZE
+        for row in rows:
+            state["ids"].append(row["id"])
+            listbox.insert(tk.END, describe(row))
+        count_label.config(text=f"{len(state['ids'])}{'' if state['done'] else '+'} entries")
+
+    def on_scroll(first, last):
+        scrollbar.set(first, last)
+        if float(last) >= 1.0 and not state["done"]:
+            window.after_idle(load_page)  # the end of the list is visible: fetch the next page
+
+    def search():
+        state.update(query=search_var.get(), ids=[], done=False, search_job=None)
+        listbox.delete(0, tk.END)
+        detail.delete(1.0, tk.END)
+        load_page()
+
+    def on_search_changed(*args):
+        if state["search_job"] is not None:
+            window.after_cancel(state["search_job"])
+        state["search_job"] = window.after(200, search)
+
+    def selected():
+        selection = listbox.curselection()
+        return history.get(state["ids"][selection[0]]) if selection else None
+
+    def on_select(event):
+        entry = selected()
+        if entry is None:
+            return
+        timings = ", ".join(f"{name} {entry[name + '_seconds']}s" for name in ("generate", "execute")
+                            if entry[name + "_seconds"] is not None)
+        lines = [f"Prompt: {entry['prompt']}", f"Mode: {entry['mode'] or '-'}   Status: {entry['status']}"]
+        if entry["summary"]:
+            lines.append(f"Result: {entry['summary']}")
+        if timings:
+            lines.append(f"Timings: {timings}")
+        if entry["error"]:
+            lines.append(f"Error:\n{entry['error']}")
+        detail.delete(1.0, tk.END)
+        detail.insert(tk.END, "\n".join(lines) + f"\n\n{entry['code']}")
+
+    def on_use():
+        entry = selected()
+        if entry is not None and entry["code"]:
+            code_display.delete(1.0, tk.END)
+            code_display.insert(tk.END, entry["code"])
+            last_request.update(prompt=entry["prompt"] or last_request["prompt"], mode=entry["mode"] or "default",
+                                history_id=None, code=None)
+            set_status(f"Loaded code from history entry #{entry['id']}.")
+
+    listbox.config(yscrollcommand=on_scroll)
+    listbox.bind("<<ListboxSelect>>", on_select)
+    search_var.trace_add("write", on_search_changed)
+    tk.Button(window, text="Use Selected Code", command=on_use).pack(pady=5)
+    search()
 
 
 def on_refresh_context(context_display):
-    context = get_drawing_summary()
-    context_display.delete(1.0, tk.END)
-    context_display.insert(tk.END, context)
+    def show(context):
+        context_display.delete(1.0, tk.END)
+        context_display.insert(tk.END, context)
+        set_status("Drawing context refreshed.")
+
+    snapshot.invalidate()
+    executor.submit_com("Refresh context", lambda task: get_drawing_summary(), on_done=show)
 
 # ========== START APP ========== #
 if __name__ == "__main__":
+    if PROFILE_FLAG in sys.argv:
+        sys.exit(profile_startup(os.path.abspath(__file__)))
     create_gui()
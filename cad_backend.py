@@ -0,0 +1,316 @@
+# AutoCAD backends for AutoCAD Gemini Copilot.
+# connect("autocad") returns the live pyautocad connection; connect("memory")
+# returns FakeAutocad, a pure-Python stand-in covering what the app and the
+# generated scripts use (iter_objects, model.Add*, doc, prompt). The fake
+# counts every COM-style call and can simulate per-call latency, so summary,
+# rendering and execution throughput can be measured on any machine.
+
+import collections
+import contextlib
+import math
+import re
+import time
+
+from cad_lisp import decode_unicode, file_encoding, format_record, parse_lisp_record
+
+try:
+    from pyautocad import Autocad, APoint
+except ImportError:  # no pyautocad/comtypes (e.g. Linux): only the memory backend works
+    Autocad = None
+
+    class APoint(tuple):
+        """Minimal stand-in for pyautocad.APoint (3D point with x/y/z)."""
+
+        def __new__(cls, x=0.0, y=0.0, z=0.0):
+            if isinstance(x, (tuple, list)):
+                x, y, z = (tuple(x) + (0.0, 0.0, 0.0))[:3]
+            return super().__new__(cls, (float(x), float(y), float(z)))
+
+        x = property(lambda self: self[0])
+        y = property(lambda self: self[1])
+        z = property(lambda self: self[2])
+
+        def __add__(self, other):
+            return APoint(*(a + b for a, b in zip(self, APoint(other))))
+
+        def __sub__(self, other):
+            return APoint(*(a - b for a, b in zip(self, APoint(other))))
+
+        def __mul__(self, k):
+            return APoint(*(a * k for a in self))
+
+        __rmul__ = __mul__
+
+        def distance_to(self, other):
+            return math.sqrt(sum((a - b) ** 2 for a, b in zip(self, APoint(other))))
+
+BACKENDS = ("autocad", "memory")
+
+_COUNTED = re.compile(r"^[A-Z]")
+
+
+# ========== Call Accounting ========== #
+class CallMeter:
+    """Counts COM-style calls and applies the simulated per-call latency."""
+
+    def __init__(self, latency=0.0, sleep=True):
+        self.latency = latency
+        self.sleep = sleep
+        self.calls = collections.Counter()
+        self.simulated_seconds = 0.0
+        self.enabled = True
+
+    def hit(self, name):
+        if not self.enabled:
+            return
+        self.calls[name] += 1
+        if self.latency:
+            self.simulated_seconds += self.latency
+            if self.sleep:
+                time.sleep(self.latency)
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+    def reset(self):
+        self.calls.clear()
+        self.simulated_seconds = 0.0
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Setup work inside this block is neither counted nor delayed."""
+        enabled, self.enabled = self.enabled, False
+        try:
+            yield
+        finally:
+            self.enabled = enabled
+
+
+class _Counted:
+    """Base for fake COM objects: PascalCase attribute access counts as a call."""
+
+    def __getattribute__(self, name):
+        if _COUNTED.match(name):
+            object.__getattribute__(self, "_meter").hit(name)
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        if _COUNTED.match(name):
+            self._meter.hit(name)
+        object.__setattr__(self, name, value)
+
+
+# ========== Fake Entities ========== #
+class FakeEntity(_Counted):
+    def __init__(self, meter, space, object_name, handle, **props):
+        object.__setattr__(self, "_meter", meter)
+        object.__setattr__(self, "_space", space)
+        object.__setattr__(self, "ObjectName", object_name)
+        object.__setattr__(self, "Handle", handle)
+        object.__setattr__(self, "ObjectID", int(handle, 16))
+        object.__setattr__(self, "Layer", "0")
+        for name, value in props.items():
+            object.__setattr__(self, name, value)
+
+    def Delete(self):
+        self._space._erase(self)
+
+    def Update(self):
+        pass
+
+    def record(self):
+        """Entity dict in the snapshot shape (no call accounting)."""
+        get = lambda name: object.__getattribute__(self, name)
+        kind = get("ObjectName")
+        record = {"handle": get("Handle"), "layer": get("Layer")}
+        if kind == "AcDbLine":
+            record.update(type="Line", start=tuple(get("StartPoint"))[:2], end=tuple(get("EndPoint"))[:2])
+        elif kind == "AcDbCircle":
+            record.update(type="Circle", center=tuple(get("Center"))[:2], radius=get("Radius"))
+        elif kind == "AcDbPolyline":
+            coords = list(get("Coordinates"))
+            record.update(type="Polyline", vertices=list(zip(coords[0::2], coords[1::2])), closed=bool(get("Closed")))
+        elif kind in ("AcDbText", "AcDbMText"):
+            record.update(type="Text", text=get("TextString"), position=tuple(get("InsertionPoint"))[:2],
+                          height=get("Height"))
+        else:
+            return None
+        return record
+
+
+class FakeModelSpace(_Counted):
+    """Model space holding FakeEntity objects in insertion order."""
+
+    def __init__(self, meter):
+        object.__setattr__(self, "_meter", meter)
+        object.__setattr__(self, "_entities", {})
+        object.__setattr__(self, "next_handle", 0x100)
+
+    def _add(self, object_name, **props):
+        handle = format(self.next_handle, "X")
+        object.__setattr__(self, "next_handle", self.next_handle + 1)
+        entity = FakeEntity(self._meter, self, object_name, handle, **props)
+        self._entities[handle] = entity
+        return entity
+
+    def _add_record(self, record):
+        """Creates an entity from a dict in the snapshot shape; None for unknown types."""
+        if record["type"] == "Line":
+            entity = self._add("AcDbLine", StartPoint=APoint(record["start"]), EndPoint=APoint(record["end"]))
+        elif record["type"] == "Circle":
+            entity = self._add("AcDbCircle", Center=APoint(record["center"]), Radius=float(record["radius"]))
+        elif record["type"] == "Polyline":
+            coords = tuple(float(v) for point in record["vertices"] for v in point[:2])
+            entity = self._add("AcDbPolyline", Coordinates=coords, Closed=bool(record.get("closed")))
+        elif record["type"] == "Text":
+            entity = self._add("AcDbText", TextString=str(record["text"]), InsertionPoint=APoint(record["position"]),
+                               Height=float(record.get("height", 1.0)))
+        else:
+            return None
+        object.__setattr__(entity, "Layer", record.get("layer", "0"))
+        return entity
+
+    def _erase(self, entity):
+        self._entities.pop(object.__getattribute__(entity, "Handle"), None)
+
+    @property
+    def Count(self):
+        return len(self._entities)
+
+    def Item(self, index):
+        return list(self._entities.values())[index]
+
+    def __iter__(self):
+        return iter(list(self._entities.values()))
+
+    def AddLine(self, start, end):
+        return self._add("AcDbLine", StartPoint=APoint(start), EndPoint=APoint(end))
+
+    def AddCircle(self, center, radius):
+        return self._add("AcDbCircle", Center=APoint(center), Radius=float(radius))
+
+    def AddLightWeightPolyline(self, coords):
+        coords = [float(v) for v in coords]
+        return self._add("AcDbPolyline", Coordinates=tuple(coords), Closed=False)
+
+    def AddPolyline(self, points):
+        # pyautocad passes flat 3D coordinates (aDouble) or a list of APoints
+        flat = [float(v) for p in points for v in (p if isinstance(p, (tuple, list)) else (p,))]
+        xy = [v for i, v in enumerate(flat) if i % 3 != 2]
+        return self._add("AcDbPolyline", Coordinates=tuple(xy), Closed=False)
+
+    def AddText(self, text, point, height):
+        return self._add("AcDbText", TextString=str(text), InsertionPoint=APoint(point), Height=float(height))
+
+    def AddMText(self, point, width, text):
+        return self._add("AcDbMText", TextString=str(text), InsertionPoint=APoint(point), Height=2.5, Width=width)
+
+
+def _unescaped(record):
+    # entmake keeps \U+XXXX escapes, but AutoCAD shows (and COM returns) the characters
+    record["layer"] = decode_unicode(record["layer"])
+    if "text" in record:
+        record["text"] = decode_unicode(record["text"])
+    return record
+
+
+class FakeDocument(_Counted):
+    def __init__(self, meter, model, name="Drawing1.dwg"):
+        object.__setattr__(self, "_meter", meter)
+        object.__setattr__(self, "ModelSpace", model)
+        object.__setattr__(self, "Name", name)
+        object.__setattr__(self, "FullName", name)
+        object.__setattr__(self, "commands", [])
+
+    def HandleToObject(self, handle):
+        return object.__getattribute__(self, "ModelSpace")._entities[handle]
+
+    def GetVariable(self, name):
+        if name.upper() == "HANDSEED":
+            return format(object.__getattribute__(self, "ModelSpace").next_handle, "X")
+        if name.upper() in ("SYSCODEPAGE", "DWGCODEPAGE"):
+            return "ANSI_1252"
+        raise KeyError(name)
+
+    def SendCommand(self, command):
+        """Emulates the gemini-* AutoLISP helpers from cad_lisp; other commands are recorded."""
+        self.commands.append(command)
+        model = object.__getattribute__(self, "ModelSpace")
+        match = re.match(r'\s*\((gemini-\w+)((?: "[^"]*")+)\)', command)
+        if not match:
+            return
+        name, paths = match.group(1), re.findall(r'"([^"]*)"', match.group(2))
+        encoding = file_encoding(self)  # files are in the code page, like AutoLISP's
+        if name == "gemini-dump":
+            lines = [format_record(r) for r in (e.record() for e in model._entities.values()) if r is not None]
+        elif name == "gemini-read":
+            with open(paths[0], "r", encoding=encoding) as f:
+                entities = [model._entities.get(line.strip()) for line in f if line.strip()]
+            lines = [format_record(r) for r in (e.record() for e in entities if e is not None) if r is not None]
+        elif name == "gemini-load":
+            with open(paths[0], "r", encoding=encoding) as f:
+                entities = [model._add_record(_unescaped(parse_lisp_record(line))) for line in f if line.strip()]
+            lines = [object.__getattribute__(e, "Handle") if e is not None else "" for e in entities]
+        elif name == "gemini-erase":
+            with open(paths[0], "r", encoding=encoding) as f:
+                handles = [line.strip() for line in f if line.strip()]
+            erased = [model._entities.pop(h, None) for h in handles]
+            lines = [str(sum(e is not None for e in erased))]
+        else:
+            return
+        with open(paths[-1], "w", encoding=encoding, errors="autocad-unicode") as f:
+            f.write("".join(line + "\n" for line in lines) + "END\n")
+
+
+class FakeAutocad:
+    """In-memory AutoCAD with the pyautocad surface used by the app.
+
+    `latency` seconds are added per COM-style call (PascalCase attribute or
+    method access); with sleep=False the delay is only accounted in
+    `meter.simulated_seconds`. `name` is the document's FullName.
+    """
+
+    def __init__(self, latency=0.0, sleep=True, name="Drawing1.dwg"):
+        self.meter = CallMeter(latency, sleep)
+        self.model = FakeModelSpace(self.meter)
+        self.doc = FakeDocument(self.meter, self.model, name)
+        self.messages = []
+
+    @property
+    def ActiveDocument(self):
+        return self.doc
+
+    def prompt(self, text):
+        self.messages.append(text)
+
+    def iter_objects(self, object_name_or_list=None, block=None, limit=None, dont_cast=False):
+        names = object_name_or_list
+        if isinstance(names, str):
+            names = [names]
+        names = [name.lower() for name in names or []]
+        if block is None:
+            block = self.model
+        for count, entity in enumerate(block):
+            if limit is not None and count >= limit:
+                break
+            if not names or any(name in entity.ObjectName.lower() for name in names):
+                yield entity
+
+    def load_records(self, records):
+        """Adds entity dicts (snapshot shape) without counting calls."""
+        with self.meter.paused():
+            for record in records:
+                self.model._add_record(record)
+        return self
+
+
+def connect(backend="autocad", **options):
+    """Returns an Autocad-like object for the named backend."""
+    if backend == "memory":
+        return FakeAutocad(**options)
+    if backend == "autocad":
+        if Autocad is None:
+            raise RuntimeError("pyautocad is not installed; use the 'memory' backend")
+        return Autocad(create_if_not_exists=True)
+    raise ValueError(f"Unknown backend {backend!r} (choose from {', '.join(BACKENDS)})")
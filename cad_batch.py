@@ -0,0 +1,237 @@
+# Headless batch runner for AutoCAD Gemini Copilot.
+# Reads prompts from a JSONL file, generates code for them concurrently
+# (bounded concurrency + request rate limit), validates each result (with a
+# repair round-trip to the model if it fails, see cad_validate.py), optionally
+# runs the valid ones against the open AutoCAD drawing, and writes one JSONL
+# result per prompt with timings. Runs go through the sandbox workers like
+# the app's (timeout, CPU/memory limits, result replayed on the drawing);
+# code the sandbox cannot replay runs in-process and its result says so.
+#
+# Usage:
+#   python cad_batch.py prompts.jsonl -o results.jsonl --concurrency 4 --rate 30 --execute
+#
+# Input lines look like {"id": "p1", "prompt": "Draw a 5x3 rectangle", "mode": "default"};
+# "id" and "mode" are optional. A line that is not valid JSON or has no
+# "prompt" gets an error result (with its line number) instead of stopping
+# the batch.
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cad_backend import BACKENDS, connect
+from cad_cache import ResponseCache, drawing_state, make_key
+from cad_context import DEFAULT_TOKEN_BUDGET, build_context
+from cad_model import MODEL_NAME, FakeModel, build_prompt, build_repair_prompt, gemini_model, generate
+from cad_preview import run_script
+from cad_reader import READERS, make_reader
+from cad_sandbox import TIMEOUT_SECONDS, SandboxPool, apply_result
+from cad_snapshot import EntitySnapshot
+from cad_transaction import TrackingAutocad, Transaction
+from cad_validate import REPAIR_ATTEMPTS, repair
+
+
+# ========== Rate Limiting ========== #
+class RateLimiter:
+    """Spaces calls so that at most `per_minute` start in any minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+# ========== Setup ========== #
+def load_prompts(path):
+    """Prompt dicts in file order; a line that cannot be used becomes a dict with an "error" instead."""
+    prompts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                prompts.append({"id": number, "error": f"line {number}: invalid JSON ({e})"})
+                continue
+            if not isinstance(item, dict) or not isinstance(item.get("prompt"), str):
+                item_id = item.get("id", number) if isinstance(item, dict) else number
+                prompts.append({"id": item_id, "error": f"line {number}: no \"prompt\" string"})
+                continue
+            prompts.append({"id": item.get("id", number), "prompt": item["prompt"],
+                            "mode": item.get("mode", "default")})
+    return prompts
+
+
+def create_model(fake):
+    if fake:
+        return FakeModel()
+    return gemini_model()
+
+
+def connect_autocad(drawing=None, backend="autocad"):
+    acad = connect(backend)
+    if drawing:
+        acad.app.Documents.Open(drawing)
+    return acad
+
+
+# ========== Execution ========== #
+def execute_code(code, acad, snapshot, sandbox=None):
+    """Runs code on the drawing like the app does; returns what the sandbox could not replay.
+
+    With a sandbox the script runs in a worker and its recorded result is
+    replayed; without one, or when the recording cannot stand for the script,
+    it runs in-process. The snapshot is brought up to date either way.
+    """
+    transaction = Transaction(code, snapshot.store)
+    tracked = TrackingAutocad(acad, transaction)
+    unsupported = []
+    try:
+        if sandbox is not None:
+            result = sandbox.run(code, snapshot.store, (id(snapshot.store), snapshot.store.version))
+            unsupported = result["unsupported"]
+        if sandbox is not None and not unsupported:
+            apply_result(tracked, result)
+        else:
+            run_script(code, tracked, snapshot.index())
+    finally:
+        snapshot.invalidate(None if transaction.opaque else transaction.touched())
+        snapshot.refresh(acad)
+    return unsupported
+
+
+# ========== Batch Run ========== #
+def run_batch(prompts, model, out, concurrency=4, rate=60, acad=None,
+              execute=False, cache=None, token_budget=DEFAULT_TOKEN_BUDGET, log=print, reader="lisp",
+              repair_attempts=REPAIR_ATTEMPTS, sandbox=None):
+    """Generates code for every prompt and writes JSONL results to `out`.
+
+    Executed code runs through `sandbox` (a SandboxPool) when one is given.
+    """
+    snapshot = EntitySnapshot(make_reader(reader))
+    if acad is not None:
+        snapshot.refresh(acad)
+    limiter = RateLimiter(rate)
+
+    def generate_one(item):
+        result = dict(item)
+        started = time.perf_counter()
+        try:
+            with snapshot.lock:
+                context = build_context(snapshot.store, item["prompt"], token_budget, snapshot.index())
+                state = drawing_state(snapshot.root, token_budget)  # the same key as the app's
+            key = make_key(item["prompt"], item["mode"], MODEL_NAME, state)
+            code = cache.get(key) if cache is not None else None
+            result["cached"] = code is not None
+            if code is None:
+                limiter.wait()
+                code = generate(model, build_prompt(item["prompt"], item["mode"], context))
+
+            def fix(bad, problems):
+                limiter.wait()
+                return generate(model, build_repair_prompt(item["prompt"], item["mode"], context, bad, problems))
+
+            validation, rounds = repair(code, fix, repair_attempts)
+            result.update(code=validation.code, repairs=rounds, entities=validation.entities)
+            if validation.ok:
+                if cache is not None:
+                    cache.put(key, validation.code)
+                result["status"] = "generated"
+            else:
+                result.update(status="error", error="validation failed:\n" + validation.report())
+        except Exception as e:
+            result.update(status="error", error=f"{type(e).__name__}: {e}")
+        result["generate_seconds"] = round(time.perf_counter() - started, 4)
+        return result
+
+    counts = {"ok": 0, "error": 0}
+    for item in prompts:
+        if "error" in item:  # unusable input line (see load_prompts)
+            counts["error"] += 1
+            out.write(json.dumps(dict(item, status="error")) + "\n")
+            log(f"[{item['id']}] error: {item['error']}")
+    out.flush()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(generate_one, item) for item in prompts if "error" not in item]
+        for future in as_completed(futures):
+            result = future.result()
+            if execute and result["status"] == "generated":
+                # COM calls stay on this thread, one script at a time
+                started = time.perf_counter()
+                try:
+                    unsupported = execute_code(result["code"], acad, snapshot, sandbox)
+                    result["status"] = "executed"
+                    if unsupported:
+                        result["in_process"] = unsupported  # the sandbox could not replay these
+                except Exception:
+                    result.update(status="error", error=traceback.format_exc(limit=3))
+                result["execute_seconds"] = round(time.perf_counter() - started, 4)
+            counts["error" if result["status"] == "error" else "ok"] += 1
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            log(f"[{result['id']}] {result['status']} in {result['generate_seconds']}s")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate (and optionally run) AutoCAD code for a JSONL file of prompts.")
+    parser.add_argument("prompts", help="JSONL file with one {\"prompt\": ...} object per line")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL results file")
+    parser.add_argument("--concurrency", type=int, default=4, help="max model calls in flight")
+    parser.add_argument("--rate", type=float, default=60, help="max model calls per minute (0 = unlimited)")
+    parser.add_argument("--execute", action="store_true", help="run generated code in AutoCAD")
+    parser.add_argument("--no-sandbox", action="store_true", help="run generated code in this process")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_SECONDS,
+                        help="seconds before a sandboxed script is killed")
+    parser.add_argument("--drawing", help="open this drawing before running")
+    parser.add_argument("--no-drawing", action="store_true", help="do not connect to AutoCAD (no context)")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the response cache")
+    parser.add_argument("--budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="drawing context token budget")
+    parser.add_argument("--fake-model", action="store_true", help="use the local fake model (no API calls)")
+    parser.add_argument("--repair-attempts", type=int, default=REPAIR_ATTEMPTS,
+                        help="model round-trips to fix code that fails validation")
+    parser.add_argument("--reader", choices=sorted(READERS), default="lisp", help="how the drawing is read")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("CAD_BACKEND", "autocad"),
+                        help="AutoCAD connection (memory = in-memory fake drawing)")
+    args = parser.parse_args(argv)
+    if args.execute and args.no_drawing:
+        parser.error("--execute needs a drawing")
+    if args.drawing and args.backend == "memory":
+        parser.error("--drawing needs the autocad backend (the memory backend starts with an empty drawing)")
+
+    prompts = load_prompts(args.prompts)
+    model = create_model(args.fake_model)
+    acad = None if args.no_drawing else connect_autocad(args.drawing, args.backend)
+    cache = None if args.no_cache else ResponseCache()
+    sandbox = SandboxPool(size=1, timeout=args.timeout) if args.execute and not args.no_sandbox else None
+    started = time.perf_counter()
+    try:
+        with open(args.output, "w", encoding="utf-8") as out:
+            counts = run_batch(prompts, model, out, args.concurrency, args.rate, acad,
+                               args.execute, cache, args.budget, reader=args.reader,
+                               repair_attempts=args.repair_attempts, sandbox=sandbox)
+    finally:
+        if sandbox is not None:
+            sandbox.close()
+    print(f"{counts['ok']} ok, {counts['error']} failed in {time.perf_counter() - started:.1f}s -> {args.output}")
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
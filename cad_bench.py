@@ -0,0 +1,241 @@
+# Benchmarks for AutoCAD Gemini Copilot.
+# Builds synthetic drawings (mixed lines, circles, polylines and text) in the
+# in-memory AutoCAD backend and times each hot path of the app against them:
+# reading the drawing, saving the snapshot file and restoring from it instead
+# of reading (cad_persist.py), the no-change refresh, building the drawing
+# fingerprint (cad_fingerprint.py), spatial indexing, the prompt
+# context, prompt construction + model call (fake model), canvas rendering
+# (headless canvas: full frame, zoomed in, incremental update after a script)
+# and running generated code, once with per-entity COM calls and once through
+# the bulk `batch` helper. Runs go through a Transaction like the app's, so the
+# snapshot refresh after them re-reads only the handles they touched; the
+# refresh stage is the hint-less diff.
+# Each stage reports wall time, peak traced memory and COM-style call counts;
+# results can be saved as a baseline and later runs compared against it.
+#
+# Usage:
+#   python cad_bench.py --sizes 1000 10000 100000 --save-baseline bench_baseline.json
+#   python cad_bench.py --sizes 1000 10000 100000 --baseline bench_baseline.json
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from cad_backend import APoint, FakeAutocad
+from cad_context import DEFAULT_TOKEN_BUDGET, build_context
+from cad_fingerprint import DrawingFingerprint
+from cad_model import FakeModel, build_prompt, generate
+from cad_persist import document_fingerprint, save_store, snapshot_path
+from cad_preview import run_script
+from cad_reader import READERS, make_reader
+from cad_render import CanvasScene, NullCanvas, Viewport
+from cad_snapshot import EntitySnapshot
+from cad_spatial import SpatialIndex
+from cad_transaction import TrackingAutocad, Transaction
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_TOLERANCE = 0.25
+PROMPT = "Draw a circle of radius 5 next to the text at (100, 100) on layer Walls"
+GENERATED_CODE = """
+for i in range(100):
+    acad.model.AddLine(APoint(i, 0), APoint(i, 10))
+"""
+BULK_CODE = """
+for i in range(100):
+    batch.line((i, 0), (i, 10))
+"""
+METRICS = ("seconds", "peak_mb", "com_calls")
+
+
+# ========== Synthetic Drawings ========== #
+def synthetic_records(count, seed=0):
+    """`count` entity dicts spread over a square sized for ~constant density."""
+    rng = np.random.default_rng(seed)
+    side = max(100.0, (count ** 0.5) * 20.0)
+    kinds = rng.integers(0, 4, count)
+    points = rng.uniform(0, side, (count, 2))
+    sizes = rng.uniform(1, 20, count)
+    layers = ["0", "Walls", "Doors", "Dims", "Text"]
+    records = []
+    for i, (kind, (x, y), size) in enumerate(zip(kinds.tolist(), points.tolist(), sizes.tolist())):
+        layer = layers[i % len(layers)]
+        if kind == 0:
+            records.append({"type": "Line", "start": (x, y), "end": (x + size, y + size / 2), "layer": layer})
+        elif kind == 1:
+            records.append({"type": "Circle", "center": (x, y), "radius": size / 2, "layer": layer})
+        elif kind == 2:
+            records.append({"type": "Polyline", "vertices": [(x, y), (x + size, y), (x + size, y + size), (x, y + size)],
+                            "closed": True, "layer": layer})
+        else:
+            records.append({"type": "Text", "text": f"T{i}", "position": (x, y), "height": size / 8, "layer": layer})
+    return records
+
+
+def fake_drawing(count, com_latency=0.0, seed=0, name="Drawing1.dwg"):
+    acad = FakeAutocad(latency=com_latency, sleep=False, name=name)
+    return acad.load_records(synthetic_records(count, seed))
+
+
+# ========== Measuring ========== #
+def measure(fn, meter, repeat=3):
+    """Best wall time of `repeat` runs, plus peak memory and COM calls of one traced run."""
+    meter.reset()
+    fn()
+    calls, com_seconds = meter.total, meter.simulated_seconds
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(best, 6), "peak_mb": round(peak / 2 ** 20, 3),
+            "com_calls": calls, "com_seconds": round(com_seconds, 4)}
+
+
+def bench_size(count, reader="lisp", repeat=3, com_latency=0.0, model_latency=0.0, seed=0):
+    """Runs every stage on one synthetic drawing; returns {stage: metrics}."""
+    directory = tempfile.mkdtemp(prefix="cad_bench_")
+    try:
+        return _bench_drawing(count, os.path.join(directory, "bench.dwg"), reader, repeat, com_latency,
+                              model_latency, seed)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _bench_drawing(count, drawing, reader, repeat, com_latency, model_latency, seed):
+    open(drawing, "wb").close()  # the snapshot file is kept next to an existing drawing
+    acad = fake_drawing(count, com_latency, seed, drawing)
+    snapshot = EntitySnapshot(make_reader(reader))
+    snapshot.refresh(acad)
+    model = FakeModel(reply=GENERATED_CODE, first_token_delay=model_latency)
+    canvas = NullCanvas()
+    view = Viewport(canvas.width, canvas.height)
+
+    def read():
+        EntitySnapshot(make_reader(reader)).refresh(acad)
+
+    def save():
+        save_store(snapshot_path(drawing), snapshot.store, document_fingerprint(acad), snapshot.root)
+
+    def restore():
+        if not EntitySnapshot(make_reader(reader), persist=True).restore(acad):
+            raise RuntimeError("snapshot file was not restored")
+
+    def refresh():
+        snapshot.invalidate()
+        snapshot.refresh(acad)
+
+    def prompt():
+        context = build_context(snapshot.store, PROMPT, DEFAULT_TOKEN_BUDGET, snapshot.index())
+        generate(model, build_prompt(PROMPT, "default", context))
+
+    def execute(code):
+        transaction = Transaction(code, snapshot.store)
+        run_script(code, TrackingAutocad(acad, transaction), snapshot.index())
+        snapshot.invalidate(None if transaction.opaque else transaction.touched())
+        transaction.finish(snapshot.store, snapshot.refresh(acad))
+
+    stages = [
+        ("read", read),
+        ("save_snapshot", save),
+        ("restore", restore),
+        ("refresh", refresh),
+        ("fingerprint", lambda: DrawingFingerprint.from_store(snapshot.store)),
+        ("index", lambda: SpatialIndex(snapshot.store)),
+        ("context", lambda: build_context(snapshot.store, PROMPT, DEFAULT_TOKEN_BUDGET, snapshot.index())),
+        ("prompt", prompt),
+        ("render", lambda: scene.redraw(snapshot.store, snapshot.index())),
+        ("render_zoomed", lambda: CanvasScene(canvas, zoomed).redraw(snapshot.store, snapshot.index())),
+        ("update", lambda: scene.apply(snapshot.store, changes, snapshot.index)),
+        ("execute", lambda: execute(GENERATED_CODE)),
+        ("execute_bulk", lambda: execute(BULK_CODE)),
+    ]
+    zoomed = Viewport(canvas.width, canvas.height)
+    zoomed.fit(snapshot.store.bounds())
+    zoomed.zoom(20.0)
+    scene = CanvasScene(canvas, view)
+    exec(GENERATED_CODE, {"acad": acad, "APoint": APoint})
+    snapshot.invalidate()
+    changes = snapshot.refresh(acad)  # what the update stage redraws: 100 new lines
+    results = {}
+    for name, fn in stages:
+        results[name] = measure(fn, acad.meter, repeat)
+        if name.startswith("render"):
+            results[name]["items"] = canvas.item_count
+    return results
+
+
+# ========== Baseline Comparison ========== #
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, min_seconds=0.002):
+    """Lines describing every metric that got worse than the baseline by more than `tolerance`."""
+    regressions = []
+    for size, stages in results["sizes"].items():
+        for stage, metrics in stages.items():
+            base = baseline.get("sizes", {}).get(size, {}).get(stage)
+            if not base:
+                continue
+            for metric in METRICS:
+                old, new = base.get(metric), metrics.get(metric)
+                if old is None or new is None or new <= old * (1 + tolerance):
+                    continue
+                if metric == "seconds" and new - old < min_seconds:
+                    continue
+                regressions.append(f"{size:>8} {stage:<13} {metric}: {old} -> {new} (+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    return regressions
+
+
+def format_table(results):
+    lines = [f"{'entities':>8} {'stage':<13} {'wall ms':>10} {'peak MB':>9} {'COM calls':>10} {'COM s*':>8}"]
+    for size, stages in results["sizes"].items():
+        for stage, m in stages.items():
+            lines.append(f"{size:>8} {stage:<13} {m['seconds'] * 1000:>10.2f} {m['peak_mb']:>9.2f}"
+                         f" {m['com_calls']:>10} {m['com_seconds']:>8.3f}")
+    lines.append("* simulated COM latency (--com-latency per call), not included in wall time")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the copilot's hot paths on synthetic drawings.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="entity counts")
+    parser.add_argument("--reader", choices=sorted(READERS), default="lisp", help="entity reader to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is reported)")
+    parser.add_argument("--com-latency", type=float, default=0.0005, help="simulated seconds per COM call")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="fake model latency in seconds")
+    parser.add_argument("-o", "--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="write results JSON as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    results = {"reader": args.reader, "python": platform.python_version(), "sizes": {}}
+    for size in args.sizes:
+        print(f"benchmarking {size} entities...", file=sys.stderr)
+        results["sizes"][str(size)] = bench_size(size, args.reader, args.repeat, args.com_latency, args.model_latency)
+    print(format_table(results))
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print("\n".join(["Regressions:"] + regressions) if regressions else "No regressions against baseline.")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
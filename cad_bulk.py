@@ -0,0 +1,66 @@
+# Bulk entity creation for AutoCAD Gemini Copilot.
+# Generated scripts get a `batch` object next to `acad`: batch.line(),
+# batch.polyline(), ... only collect geometry, and flush() creates all of it
+# in one round-trip (cad_lisp gemini-load) instead of one COM call per
+# entity. The batch flushes itself every BATCH_LIMIT entities and once more
+# after the script ends.
+
+BATCH_LIMIT = 5000
+
+
+def _xy(point):
+    values = tuple(point)
+    return float(values[0]), float(values[1])
+
+
+class EntityBatch:
+    """Collects entities and creates them in bulk through `create(records) -> handles`."""
+
+    def __init__(self, create, layer="0", limit=BATCH_LIMIT):
+        self.create = create
+        self.layer = layer
+        self.limit = limit
+        self.pending = []
+        self.handles = []
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _add(self, record, layer):
+        record["layer"] = str(layer if layer is not None else self.layer)
+        self.pending.append(record)
+        if len(self.pending) >= self.limit:
+            self.flush()
+
+    # ----- geometry (what generated code calls) ----- #
+    def line(self, start, end, layer=None):
+        self._add({"type": "Line", "start": _xy(start), "end": _xy(end)}, layer)
+
+    def circle(self, center, radius, layer=None):
+        self._add({"type": "Circle", "center": _xy(center), "radius": float(radius)}, layer)
+
+    def polyline(self, points, closed=False, layer=None):
+        self._add({"type": "Polyline", "vertices": [_xy(p) for p in points], "closed": bool(closed)}, layer)
+
+    def rectangle(self, corner, width, height, layer=None):
+        x, y = _xy(corner)
+        self.polyline([(x, y), (x + width, y), (x + width, y + height), (x, y + height)], True, layer)
+
+    def text(self, text, position, height=2.5, layer=None):
+        self._add({"type": "Text", "text": str(text), "position": _xy(position), "height": float(height)}, layer)
+
+    # ----- flushing ----- #
+    def flush(self):
+        """Creates everything pending in one call; returns the new handles."""
+        if not self.pending:
+            return []
+        records, self.pending = self.pending, []
+        handles = [h for h in self.create(records) if h]
+        self.handles.extend(handles)
+        return handles
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
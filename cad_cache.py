@@ -0,0 +1,107 @@
+# On-disk response cache for AutoCAD Gemini Copilot.
+# Generated code is stored in SQLite under a content hash of the prompt,
+# drawing mode, model name and the drawing state (drawing_state(): the root of
+# the snapshot's hash tree plus the context budget; the GUI and the batch
+# runner both key by it), so a repeated generation returns in milliseconds
+# without calling the model.
+# Entries expire after a TTL and the least recently used ones are evicted
+# once the cache grows past its size limit.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+CACHE_FILE = "response_cache.sqlite"
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+
+def fingerprint(text):
+    """Short content hash of a drawing context (or any text)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def drawing_state(root, token_budget):
+    """Cache key part for the drawing: its fingerprint root and the context budget used on it."""
+    return f"{root}:{token_budget}"
+
+
+def make_key(prompt_text, mode, model_name, context_fingerprint):
+    payload = json.dumps([prompt_text.strip(), mode, model_name, context_fingerprint])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache of generated code with TTL and LRU size eviction."""
+
+    def __init__(self, path=CACHE_FILE, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, code TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+    def get(self, key):
+        """Cached code for key, or None (expired entries count as misses)."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT code, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, code):
+        now = time.time()
+        size = len(code.encode("utf-8"))
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (key, code, size, now, now))
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats_text(self):
+        return f"cache {self.hits} hit(s) / {self.misses} miss(es)"
+
+    def close(self):
+        with self._lock:
+            self._db.close()
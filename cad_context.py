@@ -0,0 +1,252 @@
+# Token-budgeted drawing context for AutoCAD Gemini Copilot.
+# Instead of one line per entity, the prompt gets a hierarchy: totals,
+# per-layer counts and bounding boxes, aggregated patterns (parallel line
+# families, repeated circles/polylines, common texts) and full detail only
+# for the entities nearest to what the user prompt refers to. Output size is
+# capped by a token budget, so prompt cost stays flat as drawings grow.
+
+import re
+
+import numpy as np
+
+from cad_geometry import ENTITY_KINDS
+from cad_spatial import SpatialIndex
+
+DEFAULT_TOKEN_BUDGET = 2000
+CHARS_PER_TOKEN = 4
+
+_POINT_PATTERN = re.compile(r"\(?\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*\)?")
+
+
+# ========== Formatting ========== #
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _num(value):
+    text = f"{value:.3f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _pt(x, y):
+    return f"({_num(x)}, {_num(y)})"
+
+
+def _box(box):
+    return f"{_pt(box[0], box[1])}-{_pt(box[2], box[3])}"
+
+
+def describe(record):
+    """One detail line for an entity dict, e.g. '[Walls] Line from (0, 0) to (5, 0)'."""
+    layer = record["layer"]
+    if record["type"] == "Line":
+        return f"[{layer}] Line from {_pt(*record['start'][:2])} to {_pt(*record['end'][:2])}"
+    if record["type"] == "Circle":
+        return f"[{layer}] Circle at {_pt(*record['center'][:2])} with radius {_num(record['radius'])}"
+    if record["type"] == "Polyline":
+        points = " ".join(_pt(x, y) for x, y in record["vertices"][:8])
+        more = " ..." if len(record["vertices"]) > 8 else ""
+        kind = "Closed polyline" if record.get("closed") else "Polyline"
+        return f"[{layer}] {kind} with {len(record['vertices'])} vertices: {points}{more}"
+    return f"[{layer}] Text '{record['text']}' at {_pt(*record['position'][:2])}"
+
+
+class _Budget:
+    """Collects lines until the token budget is spent."""
+
+    def __init__(self, tokens):
+        self.remaining = tokens
+        self.lines = []
+
+    def add(self, line):
+        cost = estimate_tokens(line) + 1
+        if cost > self.remaining:
+            return False
+        self.lines.append(line)
+        self.remaining -= cost
+        return True
+
+    def add_all(self, lines, label):
+        lines = list(lines)
+        for index, line in enumerate(lines):
+            if not self.add(line):
+                self.add(f"... {len(lines) - index} more {label} omitted")
+                return False
+        return True
+
+
+# ========== Aggregation ========== #
+def line_patterns(store, min_count=3, limit=8):
+    """Groups lines into parallel families and reports their spacing."""
+    coords = store.tables["Line"].coords[store.rows("Line")]
+    if len(coords) < min_count:
+        return []
+    dx, dy = coords[:, 2] - coords[:, 0], coords[:, 3] - coords[:, 1]
+    angles = np.round(np.degrees(np.arctan2(dy, dx)) % 180.0).astype(np.int64) % 180
+    lengths = np.hypot(dx, dy)
+    families, counts = np.unique(angles, return_counts=True)
+    order = np.argsort(-counts)
+    patterns = []
+    evenly_spaced = set()
+    for index in order[:limit].tolist():
+        if counts[index] < min_count:
+            break
+        angle = int(families[index])
+        members = angles == angle
+        theta = np.radians(angle)
+        offsets = np.unique(np.round(-np.sin(theta) * coords[members, 0] + np.cos(theta) * coords[members, 1], 6))
+        shortest, longest = _num(lengths[members].min()), _num(lengths[members].max())
+        span = shortest if shortest == longest else f"{shortest}-{longest}"
+        text = f"{counts[index]} parallel lines at {angle} deg, length {span}"
+        if len(offsets) >= min_count:
+            gaps = np.diff(offsets)
+            if gaps.mean() > 0 and gaps.std() <= 0.05 * gaps.mean():
+                text += f", evenly spaced every {_num(gaps.mean())}"
+                evenly_spaced.add(angle)
+        patterns.append(text)
+    for angle in evenly_spaced:
+        if (angle + 90) % 180 in evenly_spaced and angle < 90:
+            patterns.append(f"Lines at {angle} and {angle + 90} deg form a grid pattern")
+    return patterns
+
+
+def shape_patterns(store, min_count=2, limit=6):
+    """Reports repeated circles (by radius) and polylines (by vertex count)."""
+    patterns = []
+    radii = store.tables["Circle"].circle[store.rows("Circle"), 2]
+    values, counts = np.unique(np.round(radii, 3), return_counts=True)
+    for index in np.argsort(-counts)[:limit].tolist():
+        if counts[index] >= min_count:
+            patterns.append(f"{counts[index]} circles of radius {_num(values[index])}")
+    polylines = store.tables["Polyline"]
+    rows = store.rows("Polyline")
+    keys = polylines.count[rows].astype(np.int64) * 2 + polylines.closed[rows]
+    values, counts = np.unique(keys, return_counts=True)
+    for index in np.argsort(-counts)[:limit].tolist():
+        if counts[index] >= min_count:
+            closed = "closed " if values[index] % 2 else ""
+            patterns.append(f"{counts[index]} {closed}polylines with {values[index] // 2} vertices")
+    return patterns
+
+
+def text_patterns(store, limit=15):
+    rows = store.rows("Text").tolist()
+    tally = {}
+    for row in rows:
+        text = store.texts[row]
+        tally[text] = tally.get(text, 0) + 1
+    common = sorted(tally.items(), key=lambda item: -item[1])[:limit]
+    return [f"'{text}'" + (f" x{count}" if count > 1 else "") for text, count in common]
+
+
+# ========== Focus Region ========== #
+def prompt_focus(store, prompt_text):
+    """Points and layer names the prompt refers to."""
+    points = [(float(x), float(y)) for x, y in _POINT_PATTERN.findall(prompt_text or "")]
+    lowered = (prompt_text or "").lower()
+    layers = [name for name in store.layers
+              if len(name) > 1 and re.search(r"\b" + re.escape(name.lower()) + r"\b", lowered)]
+    return points, layers
+
+
+def _distances(boxes, points):
+    """Distance from each bounding box to the nearest focus point (inf for entities without geometry)."""
+    distance = np.full(len(boxes), np.inf)
+    for x, y in points:
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - boxes[:, 3]), 0.0)
+        distance = np.minimum(distance, np.hypot(dx, dy))
+    return np.where(np.isnan(distance), np.inf, distance)
+
+
+def ranked_entities(store, index, points, layers, limit):
+    """Yields (kind, row) ordered by (outside the focus layers, distance to the nearest focus point).
+
+    Focus-layer entities are ranked exactly. Of the others only the `limit`
+    nearest to each point are looked up through the index; the remaining
+    entities follow in store order.
+    """
+    seen = set()
+    layer_ids = [store.layer_id(name) for name in layers]
+    distances, kinds, rows = [], [], []
+    for code, kind in enumerate(ENTITY_KINDS):
+        kind_rows = store.rows(kind)
+        kind_rows = kind_rows[np.isin(store.tables[kind].layer.values[kind_rows], layer_ids)]
+        distances.append(_distances(store.bboxes(kind, kind_rows), points) if points else np.zeros(len(kind_rows)))
+        kinds.append(np.full(len(kind_rows), code, dtype=np.int8))
+        rows.append(kind_rows)
+    order = np.argsort(np.concatenate(distances), kind="stable")
+    for code, row in zip(np.concatenate(kinds)[order].tolist(), np.concatenate(rows)[order].tolist()):
+        seen.add((ENTITY_KINDS[code], row))
+        yield ENTITY_KINDS[code], row
+    if points and len(index):
+        ids = np.unique(np.concatenate([index.ids_nearest(x, y, limit) for x, y in points]))
+        distance = np.min([index.distances(ids, x, y) for x, y in points], axis=0)
+        ids = ids[np.argsort(distance, kind="stable")]
+        for code, row in zip(index.kinds[ids].tolist(), index.rows[ids].tolist()):
+            if (ENTITY_KINDS[code], row) not in seen:
+                seen.add((ENTITY_KINDS[code], row))
+                yield ENTITY_KINDS[code], row
+    for kind in ENTITY_KINDS:
+        for row in store.rows(kind).tolist():
+            if (kind, row) not in seen:
+                yield kind, row
+
+
+# ========== Context Builder ========== #
+def build_context(store, prompt_text="", token_budget=DEFAULT_TOKEN_BUDGET, index=None):
+    """Budgeted, hierarchical description of the drawing for the model prompt."""
+    budget = _Budget(token_budget)
+    counts = store.counts()
+    budget.add("Entities Count:")
+    for kind in ENTITY_KINDS:
+        budget.add(f"{kind}s: {counts[kind]}")
+    bounds = store.bounds()
+    if bounds is None:
+        budget.add("")
+        budget.add("No entities.")
+        return "\n".join(budget.lines)
+    budget.add(f"Drawing extents: {_box(bounds)}")
+
+    budget.add("")
+    budget.add("Layers:")
+    layer_lines = []
+    for name, stats in sorted(store.layer_stats().items(), key=lambda item: -sum(item[1].values())):
+        layer_id = store.layer_id(name)
+        boxes = []
+        for kind in stats:
+            rows = store.rows(kind)
+            rows = rows[store.tables[kind].layer.values[rows] == layer_id]
+            boxes.append(store.bboxes(kind, rows))
+        boxes = np.concatenate(boxes)
+        parts = ", ".join(f"{count} {kind}s" for kind, count in stats.items())
+        extent = _box((np.nanmin(boxes[:, 0]), np.nanmin(boxes[:, 1]),
+                       np.nanmax(boxes[:, 2]), np.nanmax(boxes[:, 3]))) if not np.isnan(boxes).all() else "n/a"
+        layer_lines.append(f"[{name}] {parts}; extents {extent}")
+    budget.add_all(layer_lines, "layers")
+
+    patterns = line_patterns(store) + shape_patterns(store)
+    if patterns:
+        budget.add("")
+        budget.add("Patterns:")
+        budget.add_all(patterns, "patterns")
+    texts = text_patterns(store)
+    if texts:
+        budget.add("")
+        budget.add("Texts: " + ", ".join(texts))
+
+    points, layers = prompt_focus(store, prompt_text)
+    if points and index is None:
+        index = SpatialIndex(store)
+    heading = "Details"
+    if points or layers:
+        heading += " near " + ", ".join([_pt(x, y) for x, y in points] + [f"layer {name}" for name in layers])
+    budget.add("")
+    budget.add(heading + ":")
+    shown = 0
+    for kind, row in ranked_entities(store, index, points, layers, budget.remaining // 10 + 1):
+        if not budget.add(describe(store.record(kind, row))):
+            budget.lines.append(f"... {len(store) - shown} more entities omitted")
+            break
+        shown += 1
+    return "\n".join(budget.lines)
@@ -0,0 +1,282 @@
+# Drawing fingerprint for AutoCAD Gemini Copilot.
+# A hash tree over a GeometryStore. Every entity gets a 64-bit hash of its
+# kind, handle, layer and geometry and falls into a grid cell (CELL_SIZE
+# drawing units) by the centre of its bounding box; cells roll up into
+# blocks of BLOCK_CELLS x BLOCK_CELLS cells, blocks into layers and layers
+# into the root. A node's hash is the sum (mod 2**64) of the entity hashes
+# below it, so adding, changing or removing an entity updates one path in
+# O(1), and two fingerprints are compared top-down, visiting only the
+# layers, blocks and cells whose hashes differ.
+# The snapshot keeps one up to date (cad_snapshot.py): its root keys the
+# response and summary caches, re-reads report only the entities whose hash
+# changed (so the canvas and tiles redraw only those), and the persisted
+# snapshot stores the root to check the file against on load.
+
+import collections
+import hashlib
+
+import numpy as np
+
+from cad_geometry import ENTITY_KINDS
+
+CELL_SIZE = 100.0
+BLOCK_CELLS = 16
+
+_MASK = (1 << 64) - 1
+_COORD_BITS = 21
+_COORD_OFFSET = 1 << (_COORD_BITS - 1)
+_COORD_MASK = (1 << _COORD_BITS) - 1
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+
+
+# ========== Entity Hashes ========== #
+def _mix(x):
+    """splitmix64 finaliser over a uint64 array."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * _M1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def _fold(h, values):
+    return _mix((h ^ values) + _GOLDEN)
+
+
+def _bits(values):
+    # + 0.0 turns -0.0 into 0.0, so equal coordinates always have equal bits
+    return (np.ascontiguousarray(values, dtype=np.float64) + 0.0).view(np.uint64)
+
+
+def _text_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _polyline_hashes(store, rows):
+    """Order-sensitive hash of each polyline's vertices, count and closed flag."""
+    table = store.tables["Polyline"]
+    counts = table.count[rows].astype(np.int64)
+    hashes = np.zeros(len(rows), dtype=np.uint64)
+    nonempty = counts > 0
+    if nonempty.any():
+        offsets, sizes = table.offset[rows][nonempty], counts[nonempty]
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        total = int(sizes.sum())
+        position = np.arange(total) - np.repeat(starts, sizes)
+        points = store.vertices.values[np.repeat(offsets - starts, sizes) + np.arange(total)]
+        vertex = _fold(_fold(position.astype(np.uint64), _bits(points[:, 0])), _bits(points[:, 1]))
+        hashes[nonempty] = np.add.reduceat(vertex, starts)
+    return _fold(_fold(hashes, counts.astype(np.uint64)), table.closed[rows].astype(np.uint64))
+
+
+def entity_hashes(store, rows_by_kind=None):
+    """(keys, hashes, layer ids, centres) of the given {kind: rows} (default: every live entity).
+
+    Layer ids index `store.layers`.
+    """
+    layer_hashes = np.array([_text_hash(name) for name in store.layers], dtype=np.uint64)
+    parts = []
+    for code, kind in enumerate(ENTITY_KINDS):
+        rows = store.rows(kind) if rows_by_kind is None else np.asarray(rows_by_kind.get(kind, ()), dtype=np.int64)
+        if not len(rows):
+            continue
+        table = store.tables[kind]
+        keys = table.handle.values[rows]
+        layers = table.layer.values[rows]
+        h = _fold(keys.astype(np.uint64), np.full(len(rows), code + 1, dtype=np.uint64))
+        h = _fold(h, layer_hashes[layers])
+        if kind == "Line":
+            geometry = [_bits(table.coords[rows][:, i]) for i in range(4)]
+        elif kind == "Circle":
+            geometry = [_bits(table.circle[rows][:, i]) for i in range(3)]
+        elif kind == "Text":
+            texts = np.array([_text_hash(store.texts[row]) for row in rows.tolist()], dtype=np.uint64)
+            geometry = [_bits(table.insert[rows][:, 0]), _bits(table.insert[rows][:, 1]),
+                        _bits(table.height[rows]), texts]
+        else:
+            geometry = [_polyline_hashes(store, rows)]
+        for values in geometry:
+            h = _fold(h, values)
+        boxes = store.bboxes(kind, rows)
+        centres = np.nan_to_num(np.column_stack(((boxes[:, 0] + boxes[:, 2]) / 2,
+                                                  (boxes[:, 1] + boxes[:, 3]) / 2)))
+        parts.append((keys.astype(np.int64), h, layers.astype(np.int64), centres))
+    if not parts:
+        return np.zeros(0, np.int64), np.zeros(0, np.uint64), np.zeros(0, np.int64), np.zeros((0, 2))
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def _group_sums(groups, hashes):
+    """Distinct values of `groups` and the wrapping uint64 sum of `hashes` per value."""
+    order = np.argsort(groups, kind="stable")
+    groups = groups[order]
+    starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1]))) if len(groups) else groups
+    return groups[starts], np.add.reduceat(hashes[order], starts) if len(groups) else hashes
+
+
+# ========== Fingerprint Tree ========== #
+class DrawingFingerprint:
+    """Hash tree root -> layer -> block -> cell -> entity over a GeometryStore.
+
+    `cells` and `blocks` map (layer, x, y) grid keys to hashes, `layers`
+    maps layer names to hashes and `root` is the hash of the whole drawing
+    (`digest` is its hex form). Per-entity hashes are kept in arrays sorted
+    by handle for update() and changes_from().
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self.keys = np.zeros(0, np.int64)
+        self.hashes = np.zeros(0, np.uint64)
+        self.leaves = np.zeros(0, np.int64)  # packed (layer id, cell x, cell y) per entity
+        self.layer_names = []
+        self._layer_ids = {}
+        self.cells = {}
+        self.blocks = {}
+        self.layers = {}
+        self.root = 0
+        self._layer_blocks = collections.defaultdict(set)
+
+    @classmethod
+    def from_store(cls, store, cell_size=CELL_SIZE):
+        fingerprint = cls(cell_size)
+        keys, hashes, layers, centres = entity_hashes(store)
+        order = np.argsort(keys, kind="stable")
+        fingerprint.keys, fingerprint.hashes = keys[order], hashes[order]
+        fingerprint.leaves = fingerprint._pack(store, layers[order], centres[order])
+        fingerprint._build_tree()
+        return fingerprint
+
+    @property
+    def digest(self):
+        return format(self.root, "016x")
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ----- cells ----- #
+    def _layer_id(self, name):
+        layer = self._layer_ids.get(name)
+        if layer is None:
+            layer = self._layer_ids[name] = len(self.layer_names)
+            self.layer_names.append(name)
+        return layer
+
+    def _pack(self, store, layers, centres):
+        """Packed (layer id, cell x, cell y) per entity; `layers` index store.layers."""
+        ids = np.array([self._layer_id(name) for name in store.layers], dtype=np.int64)
+        layers = ids[layers] if len(layers) else layers
+        cells = np.floor(centres / self.cell_size)
+        cells = np.clip(cells, -_COORD_OFFSET, _COORD_OFFSET - 1).astype(np.int64) + _COORD_OFFSET
+        return (layers << (2 * _COORD_BITS)) | (cells[:, 0] << _COORD_BITS) | cells[:, 1]
+
+    def _cell(self, leaf):
+        return (self.layer_names[leaf >> (2 * _COORD_BITS)],
+                ((leaf >> _COORD_BITS) & _COORD_MASK) - _COORD_OFFSET, (leaf & _COORD_MASK) - _COORD_OFFSET)
+
+    def cell_bounds(self, cell):
+        """(xmin, ymin, xmax, ymax) of a (layer, x, y) cell."""
+        _, x, y = cell
+        size = self.cell_size
+        return x * size, y * size, (x + 1) * size, (y + 1) * size
+
+    # ----- tree ----- #
+    def _build_tree(self):
+        leaves, sums = _group_sums(self.leaves, self.hashes)
+        cells = [self._cell(leaf) for leaf in leaves.tolist()]
+        self.cells = dict(zip(cells, sums.tolist()))
+        self.blocks, self.layers, self._layer_blocks = {}, {}, collections.defaultdict(set)
+        for (layer, x, y), value in self.cells.items():
+            block = (layer, x // BLOCK_CELLS, y // BLOCK_CELLS)
+            self.blocks[block] = (self.blocks.get(block, 0) + value) & _MASK
+            self.layers[layer] = (self.layers.get(layer, 0) + value) & _MASK
+            self._layer_blocks[layer].add(block[1:])
+        self.root = int(np.add.reduce(self.hashes, dtype=np.uint64)) if len(self.hashes) else 0
+
+    def _add_to_tree(self, leaf, value):
+        """Adds `value` (mod 2**64) along the path of one cell; empty nodes are dropped."""
+        layer, x, y = cell = self._cell(leaf)
+        block = (layer, x // BLOCK_CELLS, y // BLOCK_CELLS)
+        for nodes, key in ((self.cells, cell), (self.blocks, block), (self.layers, layer)):
+            total = (nodes.get(key, 0) + value) & _MASK
+            if total:
+                nodes[key] = total
+            else:
+                del nodes[key]
+        if block in self.blocks:
+            self._layer_blocks[layer].add(block[1:])
+        else:
+            self._layer_blocks[layer].discard(block[1:])
+        self.root = (self.root + value) & _MASK
+
+    def update(self, store, changes):
+        """Applies a snapshot change set (handle sets added / modified / erased) in O(changes)."""
+        handles = changes["added"] | changes["modified"] | changes["erased"]
+        if not handles:
+            return
+        keys = np.array(sorted(int(handle, 16) for handle in handles), dtype=np.int64)
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        old = positions[found]
+        for value, leaf in zip(self.hashes[old].tolist(), self.leaves[old].tolist()):
+            self._add_to_tree(leaf, -value)
+        self.keys, self.hashes, self.leaves = (np.delete(array, old) for array in (self.keys, self.hashes, self.leaves))
+
+        rows_by_kind = collections.defaultdict(list)
+        for handle in changes["added"] | changes["modified"]:
+            kind, row = store.locate(handle)
+            if kind is not None:
+                rows_by_kind[kind].append(row)
+        keys, hashes, layers, centres = entity_hashes(store, rows_by_kind)
+        leaves = self._pack(store, layers, centres)
+        for value, leaf in zip(hashes.tolist(), leaves.tolist()):
+            self._add_to_tree(leaf, value)
+        order = np.argsort(keys, kind="stable")
+        positions = np.searchsorted(self.keys, keys[order])
+        self.keys = np.insert(self.keys, positions, keys[order])
+        self.hashes = np.insert(self.hashes, positions, hashes[order])
+        self.leaves = np.insert(self.leaves, positions, leaves[order])
+
+    # ----- comparison ----- #
+    def diff(self, other):
+        """(layer, x, y) cells whose contents differ from `other`, visiting only nodes that differ."""
+        if self.cell_size != other.cell_size:
+            raise ValueError("fingerprints with different cell sizes cannot be compared")
+        if self.root == other.root:
+            return []
+        changed = []
+        for layer in self.layers.keys() | other.layers.keys():
+            if self.layers.get(layer) == other.layers.get(layer):
+                continue
+            for bx, by in self._layer_blocks.get(layer, set()) | other._layer_blocks.get(layer, set()):
+                if self.blocks.get((layer, bx, by)) == other.blocks.get((layer, bx, by)):
+                    continue
+                for x in range(bx * BLOCK_CELLS, (bx + 1) * BLOCK_CELLS):
+                    for y in range(by * BLOCK_CELLS, (by + 1) * BLOCK_CELLS):
+                        if self.cells.get((layer, x, y)) != other.cells.get((layer, x, y)):
+                            changed.append((layer, x, y))
+        return changed
+
+    def _in_cells(self, cells):
+        packed = [(self._layer_ids[layer] << (2 * _COORD_BITS)) | ((x + _COORD_OFFSET) << _COORD_BITS)
+                  | (y + _COORD_OFFSET) for layer, x, y in cells if layer in self._layer_ids]
+        return np.isin(self.leaves, np.array(packed, dtype=np.int64))
+
+    def changes_from(self, other):
+        """Handle sets (added, modified, erased) that turn `other`'s drawing into this one.
+
+        Only entities in the cells diff() reports are compared.
+        """
+        cells = self.diff(other)
+        mine, theirs = self._in_cells(cells), other._in_cells(cells)
+        keys, hashes = self.keys[mine], self.hashes[mine]
+        other_keys, other_hashes = other.keys[theirs], other.hashes[theirs]
+        _, at, other_at = np.intersect1d(keys, other_keys, assume_unique=True, return_indices=True)
+        modified = keys[at][hashes[at] != other_hashes[other_at]]
+        added = np.setdiff1d(keys, other_keys, assume_unique=True)
+        erased = np.setdiff1d(other_keys, keys, assume_unique=True)
+        return {name: {format(int(key), "X") for key in values.tolist() if key >= 0}
+                for name, values in (("added", added), ("modified", modified), ("erased", erased))}
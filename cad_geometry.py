@@ -0,0 +1,405 @@
+# Columnar geometry store for AutoCAD Gemini Copilot.
+# Drawing entities live in per-type NumPy columns (float64 coordinates,
+# interned layer ids, a flat vertex buffer for polylines) instead of one
+# Python dict per entity. The summary builder and the canvas renderer both
+# read from here, and bounds / counts / per-layer stats are vectorized.
+
+import numpy as np
+
+ENTITY_KINDS = ("Line", "Circle", "Polyline", "Text")
+
+_ROW_BITS = 40
+
+
+# ========== Growable Columns ========== #
+class _Column:
+    """NumPy array with amortised O(1) append."""
+
+    def __init__(self, dtype, width=None, capacity=16):
+        shape = (capacity,) if width is None else (capacity, width)
+        self._data = np.zeros(shape, dtype=dtype)
+        self.size = 0
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed > len(self._data):
+            capacity = max(needed, 2 * len(self._data))
+            grown = np.zeros((capacity,) + self._data.shape[1:], dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+
+    def append(self, value):
+        self._reserve(1)
+        self._data[self.size] = value
+        self.size += 1
+        return self.size - 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        start = self.size
+        self._reserve(len(values))
+        self._data[start:start + len(values)] = values
+        self.size += len(values)
+        return start
+
+    @property
+    def values(self):
+        return self._data[:self.size]
+
+    def replace(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        self._data = values.copy() if len(values) else np.zeros((16,) + self._data.shape[1:], self._data.dtype)
+        self.size = len(values)
+
+    def wrap(self, values):
+        """Uses `values` (e.g. a memory-mapped array) as the column without copying it."""
+        self._data = np.asanyarray(values, dtype=self._data.dtype)
+        self.size = len(values)
+
+    def detach(self):
+        """Copies a memory-mapped column into memory (releasing the file)."""
+        if isinstance(self._data, np.memmap):
+            self._data = np.array(self._data[:self.size])
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+
+class _Table:
+    """One entity kind: handle, layer and alive columns plus geometry columns."""
+
+    def __init__(self, **columns):
+        self.handle = _Column(np.int64)
+        self.layer = _Column(np.int32)
+        self.alive = _Column(np.bool_)
+        self.columns = {name: _Column(*spec) for name, spec in columns.items()}
+
+    def __len__(self):
+        return self.handle.size
+
+    def append(self, handle, layer, **values):
+        row = self.handle.append(handle)
+        self.layer.append(layer)
+        self.alive.append(True)
+        for name, value in values.items():
+            self.columns[name].append(value)
+        return row
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["columns"][name].values
+        except KeyError:
+            raise AttributeError(name)
+
+    def all_columns(self):
+        return [self.handle, self.layer, self.alive] + list(self.columns.values())
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.all_columns())
+
+
+# ========== Geometry Store ========== #
+class GeometryStore:
+    """Compact columnar storage for Lines, Circles, Polylines and Texts.
+
+    Entities are addressed by their AutoCAD handle (hex string). Entities
+    added without a handle (generated overlays) get a negative synthetic
+    key. Removal only clears the alive flag; `compact()` reclaims space.
+    """
+
+    def __init__(self):
+        self.layers = []
+        self._layer_ids = {}
+        self.tables = {
+            "Line": _Table(coords=(np.float64, 4)),
+            "Circle": _Table(circle=(np.float64, 3)),
+            "Polyline": _Table(offset=(np.int64,), count=(np.int32,), closed=(np.bool_,)),
+            "Text": _Table(insert=(np.float64, 2), height=(np.float64,), chars=(np.int32,)),
+        }
+        self.vertices = _Column(np.float64, 2)
+        self.texts = []
+        self._index = {}
+        self._next_synthetic = -1
+        self._dead = 0
+        self.version = 0
+
+    @classmethod
+    def from_entities(cls, entities):
+        """Builds a store from entity dicts (snapshot records or overlay dicts)."""
+        store = cls()
+        for entity in entities:
+            if isinstance(entity, dict):
+                store.add(entity)
+        return store
+
+    # ----- keys and layers ----- #
+    def _key(self, handle):
+        if handle is None:
+            key = self._next_synthetic
+            self._next_synthetic -= 1
+            return key
+        return handle if isinstance(handle, int) else int(handle, 16)
+
+    @staticmethod
+    def handle_text(key):
+        return format(int(key), "X") if key >= 0 else None
+
+    def layer_id(self, name):
+        name = name or "0"
+        layer = self._layer_ids.get(name)
+        if layer is None:
+            layer = self._layer_ids[name] = len(self.layers)
+            self.layers.append(name)
+        return layer
+
+    # ----- mutation ----- #
+    def add(self, entity):
+        """Adds an entity dict in the snapshot/overlay shape; returns its key."""
+        kind = entity.get("type")
+        layer = entity.get("layer", "0")
+        handle = entity.get("handle")
+        if kind == "Line":
+            return self.add_line(entity["start"], entity["end"], layer, handle)
+        if kind == "Circle":
+            return self.add_circle(entity["center"], entity["radius"], layer, handle)
+        if kind == "Polyline":
+            return self.add_polyline(entity["vertices"], entity.get("closed", False), layer, handle)
+        if kind == "Text":
+            return self.add_text(entity["text"], entity["position"], entity.get("height", 0.0), layer, handle)
+        return None
+
+    def _claim(self, handle):
+        key = self._key(handle)
+        if key in self._index:
+            self.remove(key)
+        return key
+
+    def _insert(self, kind, key, layer, **values):
+        row = self.tables[kind].append(key, self.layer_id(layer), **values)
+        self._index[key] = (ENTITY_KINDS.index(kind) << _ROW_BITS) | row
+        self.version += 1
+        return key
+
+    def add_line(self, start, end, layer="0", handle=None):
+        key = self._claim(handle)
+        return self._insert("Line", key, layer, coords=(start[0], start[1], end[0], end[1]))
+
+    def add_circle(self, center, radius, layer="0", handle=None):
+        key = self._claim(handle)
+        return self._insert("Circle", key, layer, circle=(center[0], center[1], radius))
+
+    def add_polyline(self, vertices, closed=False, layer="0", handle=None):
+        key = self._claim(handle)
+        points = np.asarray([(p[0], p[1]) for p in vertices], dtype=np.float64).reshape(-1, 2)
+        offset = self.vertices.extend(points)
+        return self._insert("Polyline", key, layer, offset=offset, count=len(points), closed=bool(closed))
+
+    def add_text(self, text, position, height=0.0, layer="0", handle=None):
+        key = self._claim(handle)
+        text = str(text)
+        self.texts.append(text)
+        return self._insert("Text", key, layer, insert=(position[0], position[1]),
+                            height=height, chars=len(text))
+
+    def locate(self, handle):
+        packed = self._index.get(self._key(handle) if handle is not None else None)
+        if packed is None:
+            return None, None
+        return ENTITY_KINDS[packed >> _ROW_BITS], packed & ((1 << _ROW_BITS) - 1)
+
+    def remove(self, handle):
+        kind, row = self.locate(handle)
+        if kind is None:
+            return False
+        self.tables[kind].alive.values[row] = False
+        del self._index[int(self.tables[kind].handle.values[row])]
+        self._dead += 1
+        self.version += 1
+        if self._dead > 1024 and self._dead > len(self._index):
+            self.compact()
+        return True
+
+    def clear(self):
+        version = self.version
+        self.__init__()
+        self.version = version + 1
+
+    def compact(self):
+        """Drops removed rows and rebuilds the polyline vertex buffer."""
+        polylines = self.tables["Polyline"]
+        keep = polylines.alive.values
+        offsets, counts = polylines.offset[keep], polylines.count[keep]
+        chunks = [self.vertices.values[o:o + c] for o, c in zip(offsets, counts)]
+        self.vertices.replace(np.concatenate(chunks) if chunks else np.zeros((0, 2)))
+        new_offsets = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(counts) else counts
+        texts = self.tables["Text"]
+        self.texts = [t for t, alive in zip(self.texts, texts.alive.values) if alive]
+        self._index = {}
+        for code, kind in enumerate(ENTITY_KINDS):
+            table = self.tables[kind]
+            keep = table.alive.values.copy()
+            for column in table.all_columns():
+                column.replace(column.values[keep])
+            if kind == "Polyline":
+                table.columns["offset"].replace(new_offsets)
+            for row, key in enumerate(table.handle.values.tolist()):
+                self._index[key] = (code << _ROW_BITS) | row
+        self._dead = 0
+
+    # ----- persistence (see cad_persist.py) ----- #
+    def to_arrays(self):
+        """Live entities as compact arrays ({"Line.coords": ..., "vertices": ...}), layer names and texts."""
+        arrays = {}
+        for kind in ENTITY_KINDS:
+            table = self.tables[kind]
+            keep = table.alive.values
+            arrays[kind + ".handle"] = table.handle.values[keep]
+            arrays[kind + ".layer"] = table.layer.values[keep]
+            for name, column in table.columns.items():
+                arrays[f"{kind}.{name}"] = column.values[keep]
+        polylines = self.tables["Polyline"]
+        keep = polylines.alive.values
+        offsets, counts = polylines.offset[keep], polylines.count[keep]
+        chunks = [self.vertices.values[o:o + c] for o, c in zip(offsets.tolist(), counts.tolist())]
+        arrays["vertices"] = np.concatenate(chunks) if chunks else np.zeros((0, 2))
+        arrays["Polyline.offset"] = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64) \
+            if len(counts) else offsets
+        texts = [t for t, alive in zip(self.texts, self.tables["Text"].alive.values) if alive]
+        return arrays, list(self.layers), texts
+
+    @classmethod
+    def from_arrays(cls, arrays, layers, texts):
+        """Store over arrays in the to_arrays() layout; the arrays are used as they are, not copied."""
+        store = cls()
+        for name in layers:
+            store.layer_id(name)
+        for code, kind in enumerate(ENTITY_KINDS):
+            table = store.tables[kind]
+            table.handle.wrap(arrays[kind + ".handle"])
+            table.layer.wrap(arrays[kind + ".layer"])
+            for name, column in table.columns.items():
+                column.wrap(arrays[f"{kind}.{name}"])
+            table.alive.wrap(np.ones(len(table), dtype=np.bool_))
+            keys = table.handle.values.tolist()
+            store._index.update(zip(keys, ((code << _ROW_BITS) | np.arange(len(keys), dtype=np.int64)).tolist()))
+        store.vertices.wrap(arrays["vertices"])
+        store.texts = list(texts)
+        store._next_synthetic = min(-1, min(store._index, default=0) - 1)
+        store.version = 1
+        return store
+
+    def detach(self):
+        """Copies memory-mapped columns into memory, so the file they came from can be replaced."""
+        for table in self.tables.values():
+            for column in table.all_columns():
+                column.detach()
+        self.vertices.detach()
+
+    # ----- queries ----- #
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, handle):
+        return self.locate(handle)[0] is not None
+
+    def handles(self):
+        """Set of AutoCAD handles (hex strings) of the live entities."""
+        return {format(key, "X") for key in self._index if key >= 0}
+
+    def get(self, handle):
+        """Returns the entity as a dict in the snapshot/overlay shape."""
+        kind, row = self.locate(handle)
+        if kind is None:
+            return None
+        return self.record(kind, row)
+
+    def record(self, kind, row):
+        table = self.tables[kind]
+        record = {"type": kind, "handle": self.handle_text(table.handle.values[row]),
+                  "layer": self.layers[table.layer.values[row]]}
+        if kind == "Line":
+            x1, y1, x2, y2 = table.coords[row].tolist()
+            record.update(start=(x1, y1), end=(x2, y2))
+        elif kind == "Circle":
+            x, y, r = table.circle[row].tolist()
+            record.update(center=(x, y), radius=r)
+        elif kind == "Polyline":
+            record.update(vertices=[tuple(p) for p in self.polyline_vertices(row).tolist()],
+                          closed=bool(table.closed[row]))
+        else:
+            x, y = table.insert[row].tolist()
+            record.update(text=self.texts[row], position=(x, y), height=float(table.height[row]))
+        return record
+
+    def iter_entities(self):
+        for kind in ENTITY_KINDS:
+            for row in self.rows(kind).tolist():
+                yield self.record(kind, row)
+
+    def rows(self, kind):
+        """Row numbers of the live entities of one kind."""
+        return np.flatnonzero(self.tables[kind].alive.values)
+
+    def polyline_vertices(self, row):
+        table = self.tables["Polyline"]
+        offset, count = int(table.offset[row]), int(table.count[row])
+        return self.vertices.values[offset:offset + count]
+
+    def counts(self):
+        return {kind: int(np.count_nonzero(self.tables[kind].alive.values)) for kind in ENTITY_KINDS}
+
+    def bboxes(self, kind, rows=None):
+        """(N, 4) array of xmin, ymin, xmax, ymax for the given (default: live) rows."""
+        rows = self.rows(kind) if rows is None else rows
+        table = self.tables[kind]
+        if kind == "Line":
+            c = table.coords[rows]
+            return np.column_stack((np.minimum(c[:, 0], c[:, 2]), np.minimum(c[:, 1], c[:, 3]),
+                                    np.maximum(c[:, 0], c[:, 2]), np.maximum(c[:, 1], c[:, 3])))
+        if kind == "Circle":
+            c = table.circle[rows]
+            return np.column_stack((c[:, 0] - c[:, 2], c[:, 1] - c[:, 2], c[:, 0] + c[:, 2], c[:, 1] + c[:, 2]))
+        if kind == "Text":
+            p, h = table.insert[rows], table.height[rows]
+            width = h * table.chars[rows] * 0.8
+            return np.column_stack((p[:, 0], p[:, 1], p[:, 0] + width, p[:, 1] + h))
+        counts = table.count[rows]
+        boxes = np.full((len(rows), 4), np.nan)
+        nonempty = counts > 0
+        if nonempty.any():
+            offsets, counts = table.offset[rows][nonempty], counts[nonempty]
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            index = np.repeat(offsets - starts, counts) + np.arange(int(counts.sum()))
+            points = self.vertices.values[index]
+            boxes[nonempty] = np.column_stack((np.minimum.reduceat(points[:, 0], starts),
+                                               np.minimum.reduceat(points[:, 1], starts),
+                                               np.maximum.reduceat(points[:, 0], starts),
+                                               np.maximum.reduceat(points[:, 1], starts)))
+        return boxes
+
+    def bounds(self):
+        """Overall (xmin, ymin, xmax, ymax) of the live entities, or None."""
+        boxes = [self.bboxes(kind) for kind in ENTITY_KINDS]
+        boxes = np.concatenate([b for b in boxes if len(b)]) if any(len(b) for b in boxes) else None
+        if boxes is None or np.isnan(boxes).all():
+            return None
+        return (float(np.nanmin(boxes[:, 0])), float(np.nanmin(boxes[:, 1])),
+                float(np.nanmax(boxes[:, 2])), float(np.nanmax(boxes[:, 3])))
+
+    def layer_stats(self):
+        """{layer: {kind: count}} for the live entities."""
+        stats = {}
+        for kind in ENTITY_KINDS:
+            table = self.tables[kind]
+            per_layer = np.bincount(table.layer.values[table.alive.values], minlength=len(self.layers))
+            for layer_id in np.flatnonzero(per_layer).tolist():
+                stats.setdefault(self.layers[layer_id], {})[kind] = int(per_layer[layer_id])
+        return stats
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the store (arrays plus text strings)."""
+        return (sum(table.nbytes for table in self.tables.values()) + self.vertices.nbytes
+                + sum(len(t) for t in self.texts))
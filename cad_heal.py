@@ -0,0 +1,88 @@
+# Self-healing runs for AutoCAD Gemini Copilot.
+# When generated code fails -- validation, the dry run, or the real run --
+# the failing code and its error or traceback go back to the model through
+# the repair prompt. Each fixed version is validated and dry-run before it
+# may touch the drawing, and the loop gives up after `attempts` fixes.
+# Every attempt records the model round-trip time, the dry-run time and the
+# tokens used, so the cost of healing shows up next to its outcome.
+
+import collections
+import time
+import traceback
+
+from cad_validate import validate
+
+HEAL_ATTEMPTS = 3
+
+Attempt = collections.namedtuple(
+    "Attempt", "number outcome error fix_seconds dry_run_seconds prompt_tokens response_tokens")
+
+
+class HealFailed(Exception):
+    """No fixed version passed within the allowed attempts."""
+
+    def __init__(self, message, attempts):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+def error_text(error):
+    return "".join(traceback.format_exception(type(error), error, error.__traceback__))
+
+
+class Healer:
+    """Repair loop around one request.
+
+    `fix(code, error)` asks the model for a new version and returns
+    (code, usage) as cad_model.generate_with_usage does; `dry_run(code)`
+    raises if the code fails without touching the drawing. Attempts are
+    counted across heal() calls, so a version that passes the dry run but
+    fails for real uses up the same budget.
+    """
+
+    def __init__(self, fix, dry_run, attempts=HEAL_ATTEMPTS):
+        self.fix = fix
+        self.dry_run = dry_run
+        self.max_attempts = attempts
+        self.attempts = []
+
+    def heal(self, code, error, task=None):
+        """Fixes code that failed with `error` until a version validates and dry-runs cleanly.
+
+        Returns that version; raises HealFailed once the attempts are used up.
+        """
+        while len(self.attempts) < self.max_attempts:
+            if task is not None:
+                task.check()
+                task.progress(f"Self-heal attempt {len(self.attempts) + 1}/{self.max_attempts}...")
+            started = time.perf_counter()
+            code, usage = self.fix(code, error)
+            fix_seconds = time.perf_counter() - started
+            validation = validate(code)
+            code, dry_run_seconds, outcome = validation.code, 0.0, "passed"
+            if not validation.ok:
+                outcome, error = "invalid", validation.report()
+            else:
+                started = time.perf_counter()
+                try:
+                    self.dry_run(code)
+                except Exception as e:
+                    outcome, error = "dry run failed", error_text(e)
+                dry_run_seconds = time.perf_counter() - started
+            self.attempts.append(Attempt(len(self.attempts) + 1, outcome,
+                                         "" if outcome == "passed" else error.strip().splitlines()[-1],
+                                         round(fix_seconds, 3), round(dry_run_seconds, 3),
+                                         usage["prompt_tokens"], usage["response_tokens"]))
+            if outcome == "passed":
+                return code
+        raise HealFailed(f"No working version after {len(self.attempts)} attempt(s):\n{error}", self.attempts)
+
+    def summary(self):
+        model_seconds = sum(a.fix_seconds for a in self.attempts)
+        tokens = sum(a.prompt_tokens + a.response_tokens for a in self.attempts)
+        return f"{len(self.attempts)} attempt(s), {model_seconds:.1f}s model time, {tokens:,} tokens"
+
+    def report(self):
+        return "\n".join(f"attempt {a.number}: {a.outcome}{' (' + a.error + ')' if a.error else ''}"
+                         f" fix {a.fix_seconds}s, dry run {a.dry_run_seconds}s,"
+                         f" {a.prompt_tokens}+{a.response_tokens} tokens" for a in self.attempts)
@@ -0,0 +1,212 @@
+# Prompt and code history for AutoCAD Gemini Copilot.
+# One SQLite row per generation (WAL journal, like the response cache),
+# linking the prompt, drawing mode, context fingerprint and generated code
+# to how its run went: status, error, summary and generation/execution
+# times. Prompt and code are full-text indexed with FTS5 (plain LIKE search
+# when the SQLite build has no FTS5), and the GUI pages through results by
+# id, so browsing stays instant however long the history gets.
+# The old code_history.txt / prompt_memory.txt files are imported once.
+# The old app appended code there after each successful run (or Save Code),
+# so imported scripts count as successful runs for retrieval. Prompts were
+# kept without timestamps; scripts are paired with them newest first (see
+# _pair_prompts), and older scripts left without a prompt are listed in the
+# history but cannot be retrieved as examples.
+
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from cad_model import strip_code_fences
+
+HISTORY_FILE = "history.sqlite"
+PAGE_SIZE = 100
+IMPORTED = "imported"  # status of scripts from code_history.txt
+_LEGACY_HEADER = re.compile(r"^--- (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) ---$")
+_COLUMNS = ("id", "created", "prompt", "mode", "context_fingerprint", "code", "status", "error",
+            "summary", "generate_seconds", "execute_seconds")
+
+
+class HistoryStore:
+    """SQLite history of prompts, generated code and run outcomes."""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " id INTEGER PRIMARY KEY, created REAL NOT NULL, prompt TEXT NOT NULL DEFAULT '',"
+            " mode TEXT, context_fingerprint TEXT, code TEXT NOT NULL DEFAULT '', status TEXT NOT NULL,"
+            " error TEXT, summary TEXT, generate_seconds REAL, execute_seconds REAL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.full_text = self._create_fts()
+        self._db.commit()
+
+    def _create_fts(self):
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5("
+                             "prompt, code, content='runs', content_rowid='id')")
+        except sqlite3.OperationalError:
+            return False  # no FTS5 in this SQLite build
+        self._db.executescript(
+            "CREATE TRIGGER IF NOT EXISTS runs_ai AFTER INSERT ON runs BEGIN"
+            " INSERT INTO runs_fts(rowid, prompt, code) VALUES (new.id, new.prompt, new.code); END;"
+            "CREATE TRIGGER IF NOT EXISTS runs_ad AFTER DELETE ON runs BEGIN"
+            " INSERT INTO runs_fts(runs_fts, rowid, prompt, code) VALUES ('delete', old.id, old.prompt, old.code); END;"
+            "CREATE TRIGGER IF NOT EXISTS runs_au AFTER UPDATE OF prompt, code ON runs BEGIN"
+            " INSERT INTO runs_fts(runs_fts, rowid, prompt, code) VALUES ('delete', old.id, old.prompt, old.code);"
+            " INSERT INTO runs_fts(rowid, prompt, code) VALUES (new.id, new.prompt, new.code); END;"
+        )
+        return True
+
+    # ----- writing ----- #
+    def add(self, prompt="", code="", status="generated", mode=None, context_fingerprint=None,
+            generate_seconds=None, created=None):
+        """Appends one record; returns its id."""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO runs (created, prompt, mode, context_fingerprint, code, status, generate_seconds)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (created or time.time(), prompt, mode, context_fingerprint, code, status, generate_seconds))
+            self._db.commit()
+            return cursor.lastrowid
+
+    def set_outcome(self, run_id, status, error=None, summary=None, execute_seconds=None):
+        """Records how running a history entry's code went."""
+        with self._lock:
+            self._db.execute("UPDATE runs SET status = ?, error = ?, summary = ?, execute_seconds = ? WHERE id = ?",
+                             (status, error, summary, execute_seconds, run_id))
+            self._db.commit()
+
+    # ----- reading ----- #
+    def page(self, query="", before_id=None, limit=PAGE_SIZE):
+        """Newest-first entries (without their code) older than `before_id`, matching `query`.
+
+        Pass the last id of one page as `before_id` to get the next.
+        """
+        fields = "runs.id, runs.created, runs.prompt, runs.mode, runs.status, runs.summary, substr(runs.code, 1, 200)"
+        match = self._match(query)
+        if match is not None and self.full_text:
+            # driven by the FTS index in rowid order, so a page costs the same at any depth
+            sql = f"SELECT {fields} FROM runs_fts JOIN runs ON runs.id = runs_fts.rowid WHERE runs_fts MATCH ?"
+            params = [match]
+            key = "runs_fts.rowid"
+        else:
+            sql = f"SELECT {fields} FROM runs WHERE 1"
+            params = []
+            key = "runs.id"
+            if match is not None:
+                pattern = "%" + re.sub(r"([%_\\])", r"\\\1", query.strip()) + "%"
+                sql += " AND (runs.prompt LIKE ? ESCAPE '\\' OR runs.code LIKE ? ESCAPE '\\')"
+                params += [pattern, pattern]
+        if before_id is not None:
+            sql += f" AND {key} < ?"
+            params.append(before_id)
+        sql += f" ORDER BY {key} DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, params + [limit]).fetchall()
+        return [dict(zip(("id", "created", "prompt", "mode", "status", "summary", "code_head"), row)) for row in rows]
+
+    @staticmethod
+    def _match(query):
+        """FTS5 query: every word must appear (prefix match); None for an empty query."""
+        words = re.findall(r"\w+", query or "")
+        if not words:
+            return None
+        return " ".join(f'"{word}"*' for word in words)
+
+    def get(self, run_id):
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return dict(zip(_COLUMNS, row)) if row is not None else None
+
+    def successful(self, limit=None):
+        """(id, prompt, mode, code) of the newest entries whose code ran successfully, newest first.
+
+        Imported legacy scripts count as successful runs.
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, prompt, mode, code FROM runs WHERE status IN ('executed', ?) AND prompt != '' AND code != ''"
+                " ORDER BY id DESC LIMIT ?", (IMPORTED, -1 if limit is None else limit)).fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    # ----- migration ----- #
+    def import_legacy(self, code_file="code_history.txt", prompt_file="prompt_memory.txt"):
+        """Imports the old text-file history once per file; returns the number of records added."""
+        texts = {}
+        for path in (code_file, prompt_file):
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    texts[path] = f.read()
+        prompts = [prompt for _, prompt, _, _ in _parse_prompt_memory(texts.get(prompt_file, ""))]
+        added = 0
+        for path, parse in ((code_file, lambda text: _pair_prompts(list(_parse_code_history(text)), prompts)),
+                            (prompt_file, _parse_prompt_memory)):
+            if path not in texts:
+                continue
+            marker = "imported:" + os.path.abspath(path)
+            with self._lock:
+                if self._db.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                    continue
+            records = list(parse(texts[path]))
+            with self._lock:
+                self._db.executemany("INSERT INTO runs (created, prompt, code, status) VALUES (?, ?, ?, ?)",
+                                     records)
+                self._db.execute("INSERT INTO meta VALUES (?, ?)", (marker, str(time.time())))
+                self._db.commit()
+            added += len(records)
+        return added
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _parse_code_history(text):
+    """(created, prompt, code, status) per '--- timestamp ---' block of code_history.txt."""
+    created, lines = None, []
+    for line in text.splitlines() + ["--- 0000-00-00 00:00:00 ---"]:
+        header = _LEGACY_HEADER.match(line.strip())
+        if header is None:
+            lines.append(line)
+            continue
+        code = strip_code_fences("\n".join(lines))
+        if created is not None and code:
+            yield created, "", code, IMPORTED
+        try:
+            created = datetime.datetime.strptime(header.group(1), "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            created = None
+        lines = []
+
+
+def _pair_prompts(scripts, prompts):
+    """Gives the newest scripts the newest prompts, one each, walking back in order.
+
+    The old app appended the prompt on every generation and the code after
+    a successful run; regenerating repeated the prompt, so consecutive
+    repeats count once. Scripts older than the oldest prompt keep "".
+    """
+    distinct = [prompt for i, prompt in enumerate(prompts) if i == 0 or prompt != prompts[i - 1]]
+    paired = list(scripts)
+    for offset in range(1, min(len(paired), len(distinct)) + 1):
+        created, _, code, status = paired[-offset]
+        paired[-offset] = (created, distinct[-offset], code, status)
+    return paired
+
+
+def _parse_prompt_memory(text):
+    """(created, prompt, code, status) per line of prompt_memory.txt (no timestamps were kept)."""
+    for line in text.splitlines():
+        if line.strip():
+            yield 0.0, line.strip(), "", "prompt"
@@ -0,0 +1,342 @@
+# AutoLISP bridge for AutoCAD Gemini Copilot.
+# Bulk operations run inside AutoCAD as AutoLISP and exchange data through a
+# temp file, so one SendCommand round-trip replaces thousands of per-entity
+# COM property reads. Dump record format (tab separated, one entity per line):
+#
+#   LINE        handle  layer  x1 y1 x2 y2
+#   CIRCLE      handle  layer  cx cy r
+#   LWPOLYLINE  handle  layer  closed  "x y x y ..."
+#   TEXT/MTEXT  handle  layer  x y height text
+#
+# followed by a final END line once the file is complete. gemini-read
+# writes the same records for a list of handles (one per line; erased,
+# unsupported and paper space entities are left out). Bulk creation
+# (gemini-load) reads one LISP list per line instead, e.g.
+# ("LINE" "Walls" x1 y1 x2 y2), and bulk erase (gemini-erase) one handle
+# per line; both answer through an output file ending in END. entdel
+# toggles (on an erased entity it restores it), so gemini-erase only erases
+# and counts handles whose entity is still live (entget).
+# AutoLISP `open` reads and writes files in AutoCAD's ANSI code page
+# (SYSCODEPAGE, e.g. ANSI_1252 -> cp1252), so the files are encoded with that
+# code page (file_encoding()). Characters it cannot hold are written the way
+# AutoCAD stores them, as \U+XXXX, and decoded back when records are parsed.
+
+import codecs
+import os
+import re
+import sys
+import tempfile
+import time
+
+DEFAULT_TIMEOUT = 60.0
+
+LISP_SOURCE = r"""
+(defun gemini-num (v) (rtos v 2 8))
+(defun gemini-vertices (d / out)
+  (setq out "")
+  (foreach item d
+    (if (= (car item) 10)
+      (setq out (strcat out (gemini-num (cadr item)) " " (gemini-num (caddr item)) " "))))
+  out)
+(defun gemini-text (d / out)
+  (setq out "")
+  (foreach item d (if (= (car item) 3) (setq out (strcat out (cdr item)))))
+  (strcat out (cdr (assoc 1 d))))
+(defun gemini-record (typ d / head p q)
+  (setq head (strcat typ "\t" (cdr (assoc 5 d)) "\t" (cdr (assoc 8 d))))
+  (cond
+    ((= typ "LINE")
+     (setq p (cdr (assoc 10 d)) q (cdr (assoc 11 d)))
+     (strcat head "\t" (gemini-num (car p)) "\t" (gemini-num (cadr p))
+             "\t" (gemini-num (car q)) "\t" (gemini-num (cadr q))))
+    ((= typ "CIRCLE")
+     (setq p (cdr (assoc 10 d)))
+     (strcat head "\t" (gemini-num (car p)) "\t" (gemini-num (cadr p)) "\t" (gemini-num (cdr (assoc 40 d)))))
+    ((= typ "LWPOLYLINE")
+     (strcat head "\t" (itoa (logand 1 (cdr (assoc 70 d)))) "\t" (gemini-vertices d)))
+    (T
+     (setq p (cdr (assoc 10 d)))
+     (strcat head "\t" (gemini-num (car p)) "\t" (gemini-num (cadr p))
+             "\t" (gemini-num (cdr (assoc 40 d))) "\t" (gemini-text d)))))
+(defun gemini-dump (path / f ss i d)
+  (setq f (open path "w"))
+  (if (setq ss (ssget "_X" '((0 . "LINE,CIRCLE,LWPOLYLINE,TEXT,MTEXT") (410 . "Model"))))
+    (progn
+      (setq i 0)
+      (repeat (sslength ss)
+        (setq d (entget (ssname ss i)))
+        (write-line (gemini-record (cdr (assoc 0 d)) d) f)
+        (setq i (1+ i)))))
+  (write-line "END" f)
+  (close f)
+  (princ))
+(defun gemini-read (in out / f g line e d)
+  (setq f (open in "r") g (open out "w"))
+  (while (setq line (read-line f))
+    (if (and (setq e (handent line)) (setq d (entget e))
+             (member (cdr (assoc 0 d)) '("LINE" "CIRCLE" "LWPOLYLINE" "TEXT" "MTEXT"))
+             (/= 1 (cdr (assoc 67 d))))
+      (write-line (gemini-record (cdr (assoc 0 d)) d) g)))
+  (close f)
+  (write-line "END" g)
+  (close g)
+  (princ))
+(defun gemini-make (r / typ layer pts)
+  (setq typ (car r) layer (cadr r))
+  (cond
+    ((= typ "LINE")
+     (entmake (list '(0 . "LINE") (cons 8 layer)
+                    (list 10 (nth 2 r) (nth 3 r) 0.0) (list 11 (nth 4 r) (nth 5 r) 0.0))))
+    ((= typ "CIRCLE")
+     (entmake (list '(0 . "CIRCLE") (cons 8 layer) (list 10 (nth 2 r) (nth 3 r) 0.0) (cons 40 (nth 4 r)))))
+    ((= typ "LWPOLYLINE")
+     (setq pts (cdddr r))
+     (entmake (append (list '(0 . "LWPOLYLINE") '(100 . "AcDbEntity") (cons 8 layer) '(100 . "AcDbPolyline")
+                            (cons 90 (/ (length pts) 2)) (cons 70 (nth 2 r)))
+                      (gemini-pairs pts))))
+    ((= typ "TEXT")
+     (entmake (list '(0 . "TEXT") (cons 8 layer) (list 10 (nth 2 r) (nth 3 r) 0.0)
+                    (cons 40 (nth 4 r)) (cons 1 (nth 5 r)))))))
+(defun gemini-pairs (pts / out)
+  (while pts
+    (setq out (cons (list 10 (car pts) (cadr pts)) out) pts (cddr pts)))
+  (reverse out))
+(defun gemini-load (in out / f g line)
+  (setq f (open in "r") g (open out "w"))
+  (while (setq line (read-line f))
+    (if (gemini-make (read line))
+      (write-line (cdr (assoc 5 (entget (entlast)))) g)
+      (write-line "" g)))
+  (close f)
+  (write-line "END" g)
+  (close g)
+  (princ))
+(defun gemini-erase (in out / f g line e n)
+  (setq f (open in "r") n 0)
+  (while (setq line (read-line f))
+    (if (and (setq e (handent line)) (entget e)) (progn (entdel e) (setq n (1+ n)))))
+  (close f)
+  (setq g (open out "w"))
+  (write-line (itoa n) g)
+  (write-line "END" g)
+  (close g)
+  (princ))
+"""
+
+_loaded = set()
+_encodings = {}
+_UNICODE_ESCAPE = re.compile(r"\\U\+([0-9A-Fa-f]{4,5})")
+
+
+# ========== Code Page ========== #
+def _unicode_escape(error, prefix="\\U+"):
+    return "".join(f"{prefix}{ord(c):04X}" for c in error.object[error.start:error.end]), error.end
+
+
+codecs.register_error("autocad-unicode", _unicode_escape)  # as AutoCAD writes them (dump files)
+codecs.register_error("autocad-lisp", lambda error: _unicode_escape(error, "\\\\U+"))  # inside LISP strings
+
+
+def decode_unicode(text):
+    """Replaces AutoCAD's \\U+XXXX escapes with the characters they stand for."""
+    return _UNICODE_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), text)
+
+
+def _code_page(doc):
+    for variable in ("SYSCODEPAGE", "DWGCODEPAGE"):
+        try:
+            codec = "cp" + str(doc.GetVariable(variable)).rsplit("_", 1)[-1]  # "ANSI_1252" -> "cp1252"
+            codecs.lookup(codec)
+            return codec
+        except Exception:
+            continue
+    return "mbcs" if sys.platform == "win32" else "utf-8"
+
+
+def file_encoding(doc):
+    """Python codec of the files AutoLISP reads and writes for this document."""
+    key = doc.Name
+    if key not in _encodings:
+        _encodings[key] = _code_page(doc)
+    return _encodings[key]
+
+
+# ========== Sending LISP ========== #
+def lisp_path(path):
+    return path.replace("\\", "/")
+
+
+def temp_path(name):
+    return os.path.join(tempfile.gettempdir(), f"gemini_{os.getpid()}_{name}.txt")
+
+
+def ensure_loaded(doc):
+    """Defines the gemini-* LISP functions in the document (once per document)."""
+    key = doc.Name
+    if key not in _loaded:
+        doc.SendCommand(" ".join(LISP_SOURCE.split("\n")) + "\n")
+        _loaded.add(key)
+
+
+def call(doc, expression, out_path, timeout=DEFAULT_TIMEOUT):
+    """Sends one LISP expression that writes `out_path`, waits for END, returns the lines."""
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    ensure_loaded(doc)
+    doc.SendCommand(expression + "\n")
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(out_path):
+            with open(out_path, "rb") as f:
+                data = f.read().rstrip()
+            if data == b"END" or data.endswith(b"\nEND"):  # complete, so no character is cut in half
+                os.remove(out_path)
+                return data.decode(file_encoding(doc)).replace("\r", "").split("\n")[:-1]
+        time.sleep(0.01)
+    raise TimeoutError(f"AutoCAD did not finish {expression!r} within {timeout}s")
+
+
+# ========== Dump Records ========== #
+def parse_record(line):
+    """Turns one dump line into an entity dict (snapshot record shape)."""
+    fields = line.rstrip("\r").split("\t")
+    kind, handle, layer = fields[0], fields[1], decode_unicode(fields[2])
+    record = {"handle": handle, "layer": layer}
+    if kind == "LINE":
+        x1, y1, x2, y2 = map(float, fields[3:7])
+        record.update(type="Line", start=(x1, y1), end=(x2, y2))
+    elif kind == "CIRCLE":
+        x, y, r = map(float, fields[3:6])
+        record.update(type="Circle", center=(x, y), radius=r)
+    elif kind == "LWPOLYLINE":
+        coords = [float(v) for v in fields[4].split()]
+        record.update(type="Polyline", vertices=list(zip(coords[0::2], coords[1::2])),
+                      closed=fields[3] == "1")
+    elif kind in ("TEXT", "MTEXT"):
+        x, y, height = map(float, fields[3:6])
+        record.update(type="Text", text=decode_unicode("\t".join(fields[6:])), position=(x, y), height=height)
+    else:
+        return None
+    return record
+
+
+def lisp_string(text):
+    return '"' + str(text).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def lisp_record(record):
+    """One gemini-load input line for an entity dict."""
+    num = lambda v: repr(float(v))
+    kind, layer = record["type"], lisp_string(record.get("layer", "0"))
+    if kind == "Line":
+        values = [num(v) for v in list(record["start"][:2]) + list(record["end"][:2])]
+        return f'("LINE" {layer} {" ".join(values)})'
+    if kind == "Circle":
+        values = [num(v) for v in list(record["center"][:2]) + [record["radius"]]]
+        return f'("CIRCLE" {layer} {" ".join(values)})'
+    if kind == "Polyline":
+        coords = " ".join(num(v) for point in record["vertices"] for v in point[:2])
+        return f'("LWPOLYLINE" {layer} {1 if record.get("closed") else 0} {coords})'
+    if kind == "Text":
+        x, y = record["position"][:2]
+        return f'("TEXT" {layer} {num(x)} {num(y)} {num(record.get("height", 1.0))} {lisp_string(record["text"])})'
+    raise ValueError(f"Unsupported entity type {kind!r}")
+
+
+_LISP_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([^\s()"]+)')
+
+
+def parse_lisp_record(line):
+    """Inverse of lisp_record (used by the in-memory backend)."""
+    values = []
+    for text, atom in _LISP_TOKEN.findall(line):
+        if atom:
+            values.append(float(atom))
+        else:
+            values.append(re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), text))
+    kind, layer, rest = values[0], values[1], values[2:]
+    if kind == "LINE":
+        return {"type": "Line", "layer": layer, "start": tuple(rest[0:2]), "end": tuple(rest[2:4])}
+    if kind == "CIRCLE":
+        return {"type": "Circle", "layer": layer, "center": tuple(rest[0:2]), "radius": rest[2]}
+    if kind == "LWPOLYLINE":
+        coords = rest[1:]
+        return {"type": "Polyline", "layer": layer, "closed": bool(rest[0]),
+                "vertices": list(zip(coords[0::2], coords[1::2]))}
+    return {"type": "Text", "layer": layer, "position": tuple(rest[0:2]), "height": rest[2], "text": rest[3]}
+
+
+def format_record(record):
+    """Inverse of parse_record: the dump line gemini-record writes for an entity dict."""
+    num = lambda v: repr(float(v))
+    head = [record.get("handle", ""), record.get("layer", "0")]
+    kind = record["type"]
+    if kind == "Line":
+        fields = ["LINE"] + head + [num(v) for v in list(record["start"][:2]) + list(record["end"][:2])]
+    elif kind == "Circle":
+        fields = ["CIRCLE"] + head + [num(v) for v in record["center"][:2]] + [num(record["radius"])]
+    elif kind == "Polyline":
+        coords = " ".join(num(v) for point in record["vertices"] for v in point[:2])
+        fields = ["LWPOLYLINE"] + head + ["1" if record.get("closed") else "0", coords + " "]
+    elif kind == "Text":
+        fields = (["TEXT"] + head + [num(v) for v in record["position"][:2]]
+                  + [num(record.get("height", 1.0)), str(record["text"])])
+    else:
+        raise ValueError(f"Unsupported entity type {kind!r}")
+    return "\t".join(fields)
+
+
+def dump_entities(doc, timeout=DEFAULT_TIMEOUT):
+    """All supported model space entities in a single round-trip."""
+    path = temp_path("dump")
+    lines = call(doc, f'(gemini-dump "{lisp_path(path)}")', path, timeout)
+    return [record for record in map(parse_record, lines) if record is not None]
+
+
+def dump_handles(doc, handles, timeout=DEFAULT_TIMEOUT):
+    """Records of the given handles in one round-trip; live, supported model space entities only."""
+    handles = list(handles)
+    if not handles:
+        return []
+    in_path, out_path = temp_path("read_in"), temp_path("read_out")
+    _write_lines(in_path, handles, file_encoding(doc))
+    try:
+        lines = call(doc, f'(gemini-read "{lisp_path(in_path)}" "{lisp_path(out_path)}")', out_path, timeout)
+    finally:
+        os.remove(in_path)
+    return [record for record in map(parse_record, lines) if record is not None]
+
+
+# ========== Bulk Create / Erase ========== #
+def _write_lines(path, lines, encoding):
+    with open(path, "w", encoding=encoding, errors="autocad-lisp") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def load_entities(doc, records, timeout=DEFAULT_TIMEOUT):
+    """Creates all records in one round-trip; returns the new handles (None where entmake failed)."""
+    records = list(records)
+    if not records:
+        return []
+    in_path, out_path = temp_path("load_in"), temp_path("load_out")
+    _write_lines(in_path, (lisp_record(record) for record in records), file_encoding(doc))
+    try:
+        lines = call(doc, f'(gemini-load "{lisp_path(in_path)}" "{lisp_path(out_path)}")', out_path, timeout)
+    finally:
+        os.remove(in_path)
+    return [line.strip() or None for line in lines]
+
+
+def erase_handles(doc, handles, timeout=DEFAULT_TIMEOUT):
+    """Erases all handles in one round-trip; returns how many were erased (already erased ones are skipped)."""
+    handles = list(handles)
+    if not handles:
+        return 0
+    in_path, out_path = temp_path("erase_in"), temp_path("erase_out")
+    _write_lines(in_path, handles, file_encoding(doc))
+    try:
+        lines = call(doc, f'(gemini-erase "{lisp_path(in_path)}" "{lisp_path(out_path)}")', out_path, timeout)
+    finally:
+        os.remove(in_path)
+    return int(lines[0]) if lines else 0
@@ -0,0 +1,247 @@
+# Gemini model helpers for AutoCAD Gemini Copilot.
+# The prompt templates shared by the GUI and the batch runner (generation,
+# and repair of code that failed validation), markdown fence stripping
+# (whole-text and incremental for streaming), streaming generation into a
+# callback, and a local fake model that yields chunks with configurable
+# delays so streaming can be exercised offline. load_api_key() and
+# gemini_model() set up the real model from config.txt for both entry points.
+
+import time
+
+from cad_context import estimate_tokens
+
+FENCE = "```"
+MODEL_NAME = "gemini-2.0-flash"
+CONFIG_FILE = "config.txt"
+
+PROMPT_TEMPLATE = """
+You are an AutoCAD assistant using pyautocad in Python.
+
+Drawing mode: {mode}
+Current drawing context:
+{context}
+
+A spatial index of the drawing is available as `drawing_index`:
+drawing_index.entities_in(xmin, ymin, xmax, ymax), drawing_index.nearest(x, y, k)
+and drawing_index.within(x, y, radius) return entity dicts (type, handle, layer, geometry).
+
+For new geometry prefer the bulk helper `batch` (already defined, no import needed):
+batch.line((x1, y1), (x2, y2)), batch.circle((x, y), r), batch.polyline([(x, y), ...], closed=False),
+batch.rectangle((x, y), width, height) and batch.text("text", (x, y), height); each takes an
+optional layer="name". Entities are created together when the script ends (or at batch.flush(),
+which returns their handles), which is far faster than one acad.model.Add* call per entity.
+Use acad.model.Add* only when you need the entity object right away.
+{examples}
+User prompt: {prompt_text}
+
+Respond ONLY with Python code using pyautocad. Do not include explanations.
+"""
+
+REPAIR_TEMPLATE = """
+Your previous code for this request did not work:
+
+{code}
+
+Problems:
+{problems}
+
+Return the complete corrected script. Respond ONLY with Python code using pyautocad.
+"""
+
+
+# ========== Gemini Setup ========== #
+def load_api_key(path=CONFIG_FILE):
+    try:
+        with open(path, "r") as f:
+            key = f.read().strip()
+            if not key:
+                raise ValueError("Empty API key")
+            return key
+    except Exception:
+        raise RuntimeError(f"Please create a file named '{path}' with your Gemini API key.")
+
+
+def gemini_model():
+    """Configures google.generativeai with the key from config.txt; returns the model."""
+    import google.generativeai as genai
+    genai.configure(api_key=load_api_key())
+    return genai.GenerativeModel(MODEL_NAME)
+
+
+# ========== Prompting ========== #
+def build_prompt(prompt_text, mode, context, examples=""):
+    """`examples` is an optional few-shot block (see cad_retrieval.format_examples)."""
+    return PROMPT_TEMPLATE.format(prompt_text=prompt_text, mode=mode, context=context,
+                                  examples="\n" + examples if examples else "")
+
+
+def build_repair_prompt(prompt_text, mode, context, code, problems):
+    """The original prompt followed by the rejected code and what was wrong with it."""
+    return build_prompt(prompt_text, mode, context) + REPAIR_TEMPLATE.format(code=code, problems=problems)
+
+
+def generate(model, prompt):
+    """One blocking generation; returns fence-stripped code."""
+    response = model.generate_content(prompt)
+    return strip_code_fences(response.text)
+
+
+def generate_with_usage(model, prompt):
+    """Like generate(), plus the prompt/response token counts (estimated if the response has none)."""
+    response = model.generate_content(prompt)
+    text = response.text
+    usage = getattr(response, "usage_metadata", None)
+    return strip_code_fences(text), {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None) or estimate_tokens(prompt),
+        "response_tokens": getattr(usage, "candidates_token_count", None) or estimate_tokens(text),
+    }
+
+
+# ========== Code Fences ========== #
+def strip_code_fences(text):
+    """Removes a surrounding ```python ... ``` block, if any (and prose before it)."""
+    stripper = FenceStripper()
+    stripper.feed(text)
+    stripper.finish()
+    return stripper.text.strip()
+
+
+class FenceStripper:
+    """Strips markdown code fences from text that arrives in pieces.
+
+    An opening fence line (```python) is dropped, output stops at the
+    closing fence, and a trailing partial line that could still turn into
+    a fence is held back until more text arrives. A fence after prose
+    ("Here is the code:") opens the block: the prose is dropped from
+    `text`, the complete result, though feed() has already returned it.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._state = "head"
+        self._opened = False
+        self._prose = ""
+        self.text = ""
+
+    def feed(self, chunk):
+        if self._state == "done":
+            return ""
+        self._buffer += chunk
+        if self._state == "head":
+            stripped = self._buffer.lstrip()
+            if not stripped or (len(stripped) < len(FENCE) and FENCE.startswith(stripped)):
+                return ""
+            if stripped.startswith(FENCE):
+                if "\n" not in stripped:
+                    return ""
+                self._buffer = stripped.split("\n", 1)[1]
+                self._opened = True
+            self._state = "body"
+        return self._drain(final=False)
+
+    def finish(self):
+        """Returns whatever was held back once the stream has ended."""
+        if self._state == "head":
+            self._state = "body"
+        text = self._drain(final=True)
+        if not self.text.strip() and self._prose:
+            self.text = self._prose  # the only fence closed unfenced code rather than opening a block
+        return text
+
+    def _drain(self, final):
+        if self._state == "done":
+            return ""
+        out = []
+        newline = self._buffer.find("\n")
+        while newline >= 0:
+            line = self._buffer[:newline]
+            self._buffer = self._buffer[newline + 1:]
+            if line.strip().startswith(FENCE):
+                if self._opened:
+                    return self._close(out)
+                self._opened = True  # prose came first: this fence opens the code
+                self._prose = self.text + "".join(out)
+                self.text, out = "", []
+            else:
+                out.append(line + "\n")
+            newline = self._buffer.find("\n")
+        tail = self._buffer.strip()
+        if tail.startswith(FENCE):
+            if self._opened or final:
+                return self._close(out)
+            return self._emit(out)  # may open the code block once its line is complete
+        if final or (tail and not FENCE.startswith(tail)):
+            out.append(self._buffer)
+            self._buffer = ""
+        return self._emit(out)
+
+    def _emit(self, out):
+        text = "".join(out)
+        self.text += text
+        return text
+
+    def _close(self, out):
+        self._state = "done"
+        self._buffer = ""
+        return self._emit(out)
+
+
+# ========== Streaming ========== #
+def stream_code(model, prompt, on_chunk, task=None):
+    """Streams a generation, passing fence-stripped text to on_chunk as it arrives.
+
+    Returns the complete stripped code. Stops early if `task` is cancelled.
+    """
+    stripper = FenceStripper()
+    for chunk in model.generate_content(prompt, stream=True):
+        if task is not None:
+            task.check()
+        text = stripper.feed(chunk.text or "")
+        if text:
+            on_chunk(text)
+    text = stripper.finish()
+    if text:
+        on_chunk(text)
+    return stripper.text.strip()
+
+
+# ========== Fake Model ========== #
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Stand-in for genai.GenerativeModel that answers locally.
+
+    `reply` is a string or a callable prompt -> string. Streaming splits the
+    reply into `chunk_size` character chunks, waiting `first_token_delay`
+    before the first one and `chunk_delay` between the rest.
+    """
+
+    def __init__(self, reply="acad.model.AddLine(APoint(0, 0), APoint(10, 0))",
+                 chunk_size=16, first_token_delay=0.0, chunk_delay=0.0, model_name="fake-model"):
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.model_name = model_name
+        self.prompts = []
+
+    def _text(self, prompt):
+        self.prompts.append(prompt)
+        return self.reply(prompt) if callable(self.reply) else self.reply
+
+    def generate_content(self, prompt, stream=False):
+        text = self._text(prompt)
+        if not stream:
+            time.sleep(self.first_token_delay + self.chunk_delay * (len(text) // max(self.chunk_size, 1)))
+            return _FakeResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        time.sleep(self.first_token_delay)
+        for start in range(0, len(text), self.chunk_size):
+            if start:
+                time.sleep(self.chunk_delay)
+            yield _FakeResponse(text[start:start + self.chunk_size])
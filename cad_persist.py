@@ -0,0 +1,140 @@
+# Persisted entity snapshot for AutoCAD Gemini Copilot.
+# The snapshot's GeometryStore is written next to the drawing
+# (Plan.dwg -> Plan.dwg.gemini-snapshot) as one binary file: a JSON header
+# (format version, layer names, array layout, a fingerprint of the document
+# and the hash tree root of the entities, see cad_fingerprint.py) followed
+# by the raw column arrays, 64-byte aligned. Loading maps
+# the arrays copy-on-write (np.memmap mode "c"), so reopening a drawing of a
+# million entities costs a file open instead of a full COM scan; pages are
+# read as they are touched and edits never write back to the file.
+#
+# The document fingerprint is cheap on purpose: drawing path, size and
+# modification time of the .dwg, HANDSEED (the next handle AutoCAD will
+# assign; it grows with every new object) and the model space count. A
+# saved file is only used if all of them still match. Edits that create no
+# objects and are never saved (moving a line while the app is closed) are
+# not caught by this check. Drawings that were never saved have no path
+# and are not persisted.
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from cad_geometry import GeometryStore
+
+SNAPSHOT_SUFFIX = ".gemini-snapshot"
+FORMAT_VERSION = 1
+MAGIC = b"GEMSNAP\x00"
+ALIGN = 64
+_LENGTH = struct.Struct("<Q")
+
+
+# ========== Document Fingerprint ========== #
+def document_fingerprint(acad):
+    """Cheap identity and state of the open drawing (a few COM calls and a stat)."""
+    doc = acad.doc
+    name = doc.FullName or ""
+    try:
+        handseed = str(doc.GetVariable("HANDSEED"))
+    except Exception:
+        handseed = None
+    document = {"name": name, "handseed": handseed, "count": int(acad.model.Count)}
+    if name and os.path.isfile(name):
+        stat = os.stat(name)
+        document.update(size=stat.st_size, mtime=stat.st_mtime_ns)
+    return document
+
+
+def snapshot_path(drawing_name, directory=None):
+    """Where the snapshot of a drawing is kept, or None for a drawing without a file."""
+    if not drawing_name or not os.path.isabs(drawing_name):
+        return None
+    if directory is None:
+        return drawing_name + SNAPSHOT_SUFFIX
+    return os.path.join(directory, os.path.basename(drawing_name) + SNAPSHOT_SUFFIX)
+
+
+# ========== Writing ========== #
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def save_store(path, store, document, digest=None):
+    """Writes the live entities of `store` with the document fingerprint; returns the bytes written.
+
+    `digest` is the store's DrawingFingerprint digest, checked again on load.
+
+    The file is written under a temporary name and then renamed over the
+    old one, so a reader never sees half a snapshot.
+    """
+    arrays, layers, texts = store.to_arrays()
+    encoded = [text.encode("utf-8") for text in texts]
+    arrays["texts.data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    arrays["texts.offsets"] = np.concatenate(([0], np.cumsum([len(t) for t in encoded], dtype=np.int64)))
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"format": FORMAT_VERSION, "document": document, "digest": digest, "layers": layers,
+                         "entities": len(store), "arrays": layout}).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + _LENGTH.size + len(header))
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][2])
+            f.write(array.tobytes())
+        size = f.tell()
+    os.replace(temporary, path)
+    return size
+
+
+# ========== Reading ========== #
+def read_header(path):
+    """(header dict, offset of the array data) of a snapshot file."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        length, = _LENGTH.unpack(f.read(_LENGTH.size))
+        header = json.loads(f.read(length).decode("utf-8"))
+    return header, _aligned(len(MAGIC) + _LENGTH.size + length)
+
+
+def load_store(path, document=None, verify=None, mmap=True):
+    """The GeometryStore saved at `path`, or None if there is none or it does not match `document`.
+
+    `verify(store)` returns the store's digest; a file whose saved digest
+    it does not reproduce is rejected. With mmap the arrays stay in the
+    file (copy-on-write) until touched.
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        header, data_start = read_header(path)
+        if header.get("format") != FORMAT_VERSION:
+            return None
+        if document is not None and header.get("document") != document:
+            return None
+        arrays = {}
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            shape = tuple(shape)
+            if not np.prod(shape, dtype=np.int64):
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            elif mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="c", offset=data_start + offset, shape=shape)
+            else:
+                arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)),
+                                           offset=data_start + offset).reshape(shape)
+        data, offsets = arrays.pop("texts.data"), arrays.pop("texts.offsets").tolist()
+        blob = data.tobytes()
+        texts = [blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+        store = GeometryStore.from_arrays(arrays, header["layers"], texts)
+        if verify is not None and header.get("digest") is not None and verify(store) != header["digest"]:
+            return None
+        return store
+    except (OSError, ValueError, KeyError, TypeError):
+        return None  # unreadable or from another version: fall back to a full scan
@@ -0,0 +1,336 @@
+# Dry-run preview for AutoCAD Gemini Copilot.
+# Generated code runs against RecordingAutocad instead of the live drawing:
+# model.Add* calls are captured into a GeometryStore (the dashed blue
+# overlay) and nothing is sent over COM. Reads of the existing drawing
+# (iter_objects, HandleToObject) are answered from the entity snapshot, and
+# `import pyautocad` inside the script resolves to the recorder as well.
+# Everything else the script does -- property writes, method calls, edits of
+# existing entities, SendCommand -- is appended to `ops` so it can be replayed
+# later (see cad_sandbox.apply_result). What cannot be recorded faithfully
+# (AddArc, InsertBlock, reading e.Length) is listed in `unsupported`; such a
+# run has to execute for real instead of being replayed.
+# exec_globals() builds that script environment for any acad-like object, so
+# real runs route `pyautocad.Autocad()` to their tracking proxy the same way,
+# and run_script() also flushes the script's bulk `batch` (cad_bulk) at the end.
+
+import builtins
+import collections
+import types
+
+from cad_backend import APoint
+from cad_bulk import EntityBatch
+from cad_geometry import GeometryStore
+from cad_transaction import create_entities
+from cad_validate import BLOCKED_CALLS
+
+PREVIEW_HANDLE_BASE = 0x7F000000  # recorded entities get handles far above real ones
+OBJECT_NAMES = {"Line": "AcDbLine", "Circle": "AcDbCircle", "Polyline": "AcDbPolyline", "Text": "AcDbText"}
+
+
+def _xy(point):
+    values = tuple(point)
+    return float(values[0]), float(values[1])
+
+
+def aDouble(*values):
+    """Flat tuple of floats, like pyautocad.types.aDouble."""
+    if len(values) == 1 and not isinstance(values[0], (int, float)):
+        values = values[0]
+    flat = []
+    for value in values:
+        flat.extend((value,) if isinstance(value, (int, float)) else value)
+    return tuple(float(v) for v in flat)
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+class Unmodelled:
+    """Returned by calls the recorder cannot model (AddArc, InsertBlock, ...); absorbs whatever the script does next."""
+
+    def __getattr__(self, name):
+        return Unmodelled()
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return Unmodelled()
+
+
+# ========== Recorded Entities ========== #
+class RecordedEntity:
+    """Stand-in for an entity created during preview; property writes update the overlay."""
+
+    _GEOMETRY = {"Layer": "layer", "Closed": "closed", "TextString": "text", "Height": "height", "Radius": "radius"}
+
+    def __init__(self, recorder, record):
+        object.__setattr__(self, "_recorder", recorder)
+        object.__setattr__(self, "_record", record)
+        object.__setattr__(self, "_props", {})
+
+    @property
+    def Handle(self):
+        return self._record["handle"]
+
+    @property
+    def ObjectName(self):
+        return OBJECT_NAMES[self._record["type"]]
+
+    def __setattr__(self, name, value):
+        key = self._GEOMETRY.get(name)
+        if key is not None and key in self._record:
+            self._record[key] = bool(value) if key == "closed" else value
+            self._recorder.store.add(self._record)
+        self._props[name] = value
+        self._recorder.ops.append(("set", self._record["handle"], name, value))
+
+    def __getattr__(self, name):
+        key = self._GEOMETRY.get(name)
+        if key is not None and key in self._record:
+            return self._record[key]
+        if name in self._props:
+            return self._props[name]
+        if name == "Delete":
+            return lambda: self._recorder.delete(self._record["handle"])
+        if name[:1].isupper():
+            # Update(), Move(), ... have no effect on the preview but are recorded
+            return self._recorder.member(self._record["handle"], name)
+        raise AttributeError(name)
+
+
+class SnapshotEntity:
+    """View of an existing entity, served from the snapshot store.
+
+    Writes and method calls leave the snapshot alone; with a recorder they
+    are appended to its ops.
+    """
+
+    _PROPS = {"Layer": "layer", "Handle": "handle", "Radius": "radius", "Closed": "closed",
+              "TextString": "text", "Height": "height"}
+    _POINTS = {"StartPoint": "start", "EndPoint": "end", "Center": "center", "InsertionPoint": "position"}
+
+    def __init__(self, record, recorder=None):
+        object.__setattr__(self, "_record", record)
+        object.__setattr__(self, "_recorder", recorder)
+
+    @property
+    def ObjectName(self):
+        return OBJECT_NAMES[self._record["type"]]
+
+    @property
+    def Coordinates(self):
+        return tuple(v for point in self._record.get("vertices", ()) for v in point)
+
+    def __getattr__(self, name):
+        if name in self._PROPS and self._PROPS[name] in self._record:
+            return self._record[self._PROPS[name]]
+        if name in self._POINTS and self._POINTS[name] in self._record:
+            return APoint(*self._record[self._POINTS[name]])
+        if name == "Delete" and self._recorder is not None:
+            return lambda: self._recorder.ops.append(("delete", self._record["handle"]))
+        if name[:1].isupper():
+            if self._recorder is None:
+                return _noop
+            return self._recorder.member(self._record["handle"], name)
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if self._recorder is not None:
+            self._recorder.ops.append(("set", self._record["handle"], name, value))
+
+
+# ========== Recording AutoCAD ========== #
+class RecordingModelSpace:
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    def AddLine(self, start, end):
+        return self._recorder.add(type="Line", start=_xy(start), end=_xy(end))
+
+    def AddCircle(self, center, radius):
+        return self._recorder.add(type="Circle", center=_xy(center), radius=float(radius))
+
+    def AddPolyline(self, points):
+        flat = aDouble(points)
+        return self._recorder.add(type="Polyline", vertices=list(zip(flat[0::3], flat[1::3])), closed=False)
+
+    def AddLightWeightPolyline(self, points):
+        flat = aDouble(points)
+        return self._recorder.add(type="Polyline", vertices=list(zip(flat[0::2], flat[1::2])), closed=False)
+
+    def AddText(self, text, point, height):
+        return self._recorder.add(type="Text", text=str(text), position=_xy(point), height=float(height))
+
+    def AddMText(self, point, width, text):
+        return self._recorder.add(type="Text", text=str(text), position=_xy(point), height=2.5)
+
+    def __iter__(self):
+        return self._recorder.iter_objects()
+
+    def __getattr__(self, name):
+        if name[:1].isupper():  # AddArc, AddDimAligned, InsertBlock, ...: nothing to record them as
+            self._recorder.unsupported_calls.add(name)
+            return Unmodelled()
+        raise AttributeError(name)
+
+
+class _Layers:
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    def Add(self, name):
+        self._recorder.layers.add(name)
+        return types.SimpleNamespace(Name=name)
+
+    def Item(self, name):
+        return types.SimpleNamespace(Name=name)
+
+
+class RecordingDocument:
+    def __init__(self, recorder):
+        self._recorder = recorder
+        self.ModelSpace = recorder.model
+        self.Layers = _Layers(recorder)
+        self.Name = "preview"
+
+    def HandleToObject(self, handle):
+        record = self._recorder.existing.get(handle) if self._recorder.existing is not None else None
+        if record is None:
+            raise KeyError(handle)
+        return SnapshotEntity(record, self._recorder)
+
+    def SendCommand(self, command):
+        self._recorder.ops.append(("command", command))
+
+    def __getattr__(self, name):
+        return _noop
+
+
+class RecordingAutocad:
+    """Stands in for pyautocad.Autocad during a dry run.
+
+    `store` collects every entity the code adds (with synthetic handles);
+    `ops` lists everything else it did, in order. `existing` is the snapshot
+    store used to answer reads of the current drawing (may be None).
+    `unsupported` names what the recording cannot stand for: model space
+    calls it does not know, and entity properties that were read (Length,
+    Area, ...) rather than called. Replaying such a run would not do what
+    the script does.
+    """
+
+    def __init__(self, existing=None):
+        self.existing = existing
+        self.store = GeometryStore()
+        self.ops = []
+        self.messages = []
+        self.layers = set()
+        self.unsupported_calls = set()
+        self._members = collections.Counter()  # unknown entity members fetched minus those called
+        self._next_handle = PREVIEW_HANDLE_BASE
+        self.model = RecordingModelSpace(self)
+        self.doc = RecordingDocument(self)
+        self.ActiveDocument = self.doc
+        self.app = types.SimpleNamespace(ActiveDocument=self.doc)
+
+    @property
+    def unsupported(self):
+        reads = {f"{name} (read)" for name, count in self._members.items() if count > 0}
+        return sorted(self.unsupported_calls | reads)
+
+    def member(self, handle, name):
+        """Unknown entity member: recorded as an op when called, reported as an unsupported read otherwise."""
+        self._members[name] += 1
+
+        def call(*args):
+            self._members[name] -= 1
+            self.ops.append(("call", handle, name, args))
+        return call
+
+    def add(self, **record):
+        record.setdefault("layer", "0")
+        record["handle"] = format(self._next_handle, "X")
+        self._next_handle += 1
+        self.store.add(record)
+        self.ops.append(("add", record["handle"]))
+        return RecordedEntity(self, record)
+
+    def add_records(self, records):
+        """Bulk counterpart of add() used by cad_bulk; returns the synthetic handles."""
+        return [self.add(**dict(record)).Handle for record in records]
+
+    def delete(self, handle):
+        self.store.remove(handle)
+        self.ops.append(("delete", handle))
+
+    def prompt(self, text):
+        self.messages.append(text)
+
+    def iter_objects(self, object_name_or_list=None, block=None, limit=None, dont_cast=False):
+        if self.existing is None:
+            return
+        names = object_name_or_list
+        if isinstance(names, str):
+            names = [names]
+        names = [name.lower() for name in names or []]
+        for count, record in enumerate(self.existing.iter_entities()):
+            if limit is not None and count >= limit:
+                break
+            entity = SnapshotEntity(record, self)
+            if not names or any(name in entity.ObjectName.lower() for name in names):
+                yield entity
+
+
+# ========== Script Environment ========== #
+def _pyautocad_for(acad):
+    """A pyautocad module whose Autocad() returns `acad` (the real module's other names if installed)."""
+    module = types.ModuleType("pyautocad")
+    try:
+        import pyautocad
+        module.__dict__.update(vars(pyautocad))
+    except ImportError:
+        module.APoint = APoint
+        module.aDouble = aDouble
+        module.types = types.SimpleNamespace(aDouble=aDouble, APoint=APoint)
+    module.Autocad = lambda *args, **kwargs: acad
+    return module
+
+
+def exec_globals(acad, drawing_index=None):
+    """Globals for exec() that route `acad` and `import pyautocad` to the given object.
+
+    `batch` creates entities in bulk through acad.add_records() when the object
+    has one (recorder, tracking proxy), else through cad_transaction.create_entities.
+    The builtins cad_validate rejects (BLOCKED_CALLS) are left out of the
+    script's builtins as well, in case a check is ever bypassed.
+    """
+    fake = _pyautocad_for(acad)
+    real_import = builtins.__import__
+
+    def routed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if name == "pyautocad" or name.startswith("pyautocad."):
+            return fake
+        return real_import(name, globals, locals, fromlist, level)
+
+    sandboxed = {name: value for name, value in vars(builtins).items() if name not in BLOCKED_CALLS}
+    sandboxed["__import__"] = routed_import
+    create = getattr(acad, "add_records", None) or (lambda records: create_entities(acad, records))
+    return {"__builtins__": sandboxed, "__name__": "__generated__", "acad": acad,
+            "APoint": APoint, "drawing_index": drawing_index, "batch": EntityBatch(create)}
+
+
+def run_script(code, acad, drawing_index=None):
+    """Executes generated code against acad and flushes its batch; returns the globals."""
+    env = exec_globals(acad, drawing_index)
+    batch = env["batch"]
+    exec(code, env)
+    batch.flush()
+    return env
+
+
+def preview(code, existing=None, drawing_index=None):
+    """Dry-runs code; returns the RecordingAutocad holding the would-be entities."""
+    recorder = RecordingAutocad(existing)
+    run_script(code, recorder, drawing_index)
+    return recorder
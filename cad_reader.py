@@ -0,0 +1,109 @@
+# Entity readers for AutoCAD Gemini Copilot.
+# A reader turns the model space into entity dicts for the snapshot. The
+# COM reader walks entities and reads their properties one IDispatch call
+# at a time (4-6 round-trips per entity); the LISP reader exports every
+# entity in one SendCommand round-trip and parses the file (cad_lisp.py).
+# Readers are pluggable so each path can be benchmarked against a fake
+# COM server.
+
+from cad_lisp import DEFAULT_TIMEOUT, dump_entities, dump_handles
+
+ENTITY_TYPES = ['Line', 'Circle', 'Polyline', 'Text', 'MText']
+
+
+def read_entity(entity):
+    """Reads one COM entity into a plain dict, or None for unsupported types."""
+    name = entity.ObjectName
+    record = {"handle": entity.Handle, "layer": entity.Layer}
+    if name == 'AcDbLine':
+        record.update(type="Line", start=tuple(entity.StartPoint)[:2], end=tuple(entity.EndPoint)[:2])
+    elif name == 'AcDbCircle':
+        record.update(type="Circle", center=tuple(entity.Center)[:2], radius=entity.Radius)
+    elif name == 'AcDbPolyline':
+        coords = list(entity.Coordinates)
+        vertices = [(coords[i], coords[i + 1]) for i in range(0, len(coords) - 1, 2)]
+        record.update(type="Polyline", vertices=vertices, closed=bool(entity.Closed))
+    elif name in ['AcDbText', 'AcDbMText']:
+        record.update(type="Text", text=entity.TextString,
+                      position=tuple(entity.InsertionPoint)[:2], height=entity.Height)
+    else:
+        return None
+    return record
+
+
+class ComEntityReader:
+    """Per-entity, per-property COM reads (works everywhere, slowest)."""
+
+    name = "com"
+    bulk = False
+
+    def read_all(self, acad):
+        for entity in acad.iter_objects(ENTITY_TYPES):
+            record = read_entity(entity)
+            if record is not None:
+                try:
+                    record["object_id"] = entity.ObjectID
+                except Exception:
+                    pass
+                yield record
+
+    def read_handles(self, acad):
+        for entity in acad.iter_objects(ENTITY_TYPES):
+            yield entity.Handle, entity
+
+    def read_one(self, acad, handle):
+        return read_entity(acad.doc.HandleToObject(handle))
+
+    def read_some(self, acad, handles):
+        """{handle: record} for the given handles; erased or unsupported ones are left out."""
+        records = {}
+        for handle in handles:
+            try:
+                record = self.read_one(acad, handle)
+            except Exception:
+                continue
+            if record is not None:
+                records[handle] = record
+        return records
+
+
+class LispEntityReader:
+    """Bulk export through AutoLISP: one round-trip for the whole drawing.
+
+    Falls back to the COM reader for the rest of the session if the export
+    fails (e.g. LISP disabled or AutoCAD busy).
+    """
+
+    name = "lisp"
+    bulk = True
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.fallback = ComEntityReader()
+        self.failed = False
+
+    def read_all(self, acad):
+        if not self.failed:
+            try:
+                return dump_entities(acad.doc, self.timeout)
+            except Exception:
+                self.failed = True
+        return self.fallback.read_all(acad)
+
+    def read_one(self, acad, handle):
+        return self.fallback.read_one(acad, handle)
+
+    def read_some(self, acad, handles):
+        if not self.failed:
+            try:
+                return {record["handle"]: record for record in dump_handles(acad.doc, handles, self.timeout)}
+            except Exception:
+                self.failed = True
+        return self.fallback.read_some(acad, handles)
+
+
+READERS = {"com": ComEntityReader, "lisp": LispEntityReader}
+
+
+def make_reader(name):
+    return READERS[name]()
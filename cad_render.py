@@ -0,0 +1,370 @@
+# Canvas rendering for AutoCAD Gemini Copilot.
+# Draws a GeometryStore onto a Tk canvas (or anything with the same
+# create_* methods) through a Viewport: a world-to-screen transform with a
+# y-flip (drawing y goes up, canvas y goes down), pan and zoom. Each frame
+# only touches entities whose bounding box is on screen (spatial index),
+# collapses sub-pixel entities into one dot per pixel, skips text too small
+# to read and stops at a per-frame item cap, so redraw cost follows what is
+# visible rather than drawing size. NullCanvas implements the canvas
+# surface without Tk and counts items, so rendering can be benchmarked
+# headless.
+
+import collections
+
+import numpy as np
+
+from cad_geometry import ENTITY_KINDS
+from cad_spatial import SpatialIndex
+
+MIN_FEATURE_PX = 1.5  # entities smaller than this on screen collapse to a dot
+MIN_TEXT_PX = 5  # text shorter than this on screen is skipped
+MAX_ITEMS = 8000  # canvas items created per frame
+MIN_SCALE, MAX_SCALE = 1e-9, 1e9
+
+
+# ========== Viewport ========== #
+class Viewport:
+    """World (drawing units) <-> screen (pixels) transform with pan and zoom."""
+
+    def __init__(self, width=800, height=600, scale=1.0, center=None):
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.center = center if center is not None else (width / (2.0 * scale), height / (2.0 * scale))
+        self.fitted = False
+
+    def resize(self, width, height):
+        self.width, self.height = max(int(width), 1), max(int(height), 1)
+
+    def fit(self, bounds, margin=0.05):
+        """Zooms to show `bounds` (xmin, ymin, xmax, ymax) with a margin on each side."""
+        if bounds is None:
+            return
+        xmin, ymin, xmax, ymax = bounds
+        span_x, span_y = max(xmax - xmin, 1e-9), max(ymax - ymin, 1e-9)
+        usable = 1.0 - 2 * margin
+        self.scale = min(self.width * usable / span_x, self.height * usable / span_y)
+        self.scale = min(max(self.scale, MIN_SCALE), MAX_SCALE)
+        self.center = ((xmin + xmax) / 2.0, (ymin + ymax) / 2.0)
+        self.fitted = True
+
+    def to_screen(self, x, y):
+        """Screen coordinates of world points (scalars or arrays)."""
+        sx = (np.asarray(x) - self.center[0]) * self.scale + self.width / 2.0
+        sy = self.height / 2.0 - (np.asarray(y) - self.center[1]) * self.scale
+        return sx, sy
+
+    def to_world(self, sx, sy):
+        x = (sx - self.width / 2.0) / self.scale + self.center[0]
+        y = (self.height / 2.0 - sy) / self.scale + self.center[1]
+        return x, y
+
+    def world_window(self):
+        """(xmin, ymin, xmax, ymax) of the drawing area currently on screen."""
+        half_w, half_h = self.width / (2.0 * self.scale), self.height / (2.0 * self.scale)
+        cx, cy = self.center
+        return cx - half_w, cy - half_h, cx + half_w, cy + half_h
+
+    def pan(self, dx, dy):
+        """Moves the view by a screen-pixel drag of (dx, dy)."""
+        self.center = (self.center[0] - dx / self.scale, self.center[1] + dy / self.scale)
+
+    def zoom(self, factor, sx=None, sy=None):
+        """Zooms by `factor`, keeping the world point under screen (sx, sy) in place."""
+        sx = self.width / 2.0 if sx is None else sx
+        sy = self.height / 2.0 if sy is None else sy
+        wx, wy = self.to_world(sx, sy)
+        self.scale = min(max(self.scale * factor, MIN_SCALE), MAX_SCALE)
+        self.center = (wx - (sx - self.width / 2.0) / self.scale,
+                       wy - (self.height / 2.0 - sy) / self.scale)
+
+
+# ========== Frame Rendering ========== #
+FrameStats = collections.namedtuple("FrameStats", "visible drawn collapsed skipped_text truncated")
+
+REDRAW_FRACTION = 0.25  # change sets larger than this share of MAX_ITEMS trigger a full redraw
+_TEXT = ENTITY_KINDS.index("Text")
+
+
+def _draw_lines(canvas, store, rows, view, color, dash, tags):
+    c = store.tables["Line"].coords[rows]
+    x1, y1 = view.to_screen(c[:, 0], c[:, 1])
+    x2, y2 = view.to_screen(c[:, 2], c[:, 3])
+    return [canvas.create_line(*line, fill=color, dash=dash, tags=tags)
+            for line in np.column_stack((x1, y1, x2, y2)).tolist()]
+
+
+def _draw_circles(canvas, store, rows, view, color, dash, tags):
+    c = store.tables["Circle"].circle[rows]
+    x, y = view.to_screen(c[:, 0], c[:, 1])
+    r = c[:, 2] * view.scale
+    return [canvas.create_oval(x0, y0, x1, y1, outline=color, dash=dash, tags=tags)
+            for x0, y0, x1, y1 in np.column_stack((x - r, y - r, x + r, y + r)).tolist()]
+
+
+def _draw_polylines(canvas, store, rows, view, color, dash, tags):
+    closed = store.tables["Polyline"].closed
+    items = []
+    for row in rows.tolist():
+        points = store.polyline_vertices(row)
+        if len(points) < 2:
+            items.append(None)
+            continue
+        sx, sy = view.to_screen(points[:, 0], points[:, 1])
+        flat = np.column_stack((sx, sy)).ravel().tolist()
+        if closed[row]:
+            items.append(canvas.create_polygon(flat, outline=color, fill="", dash=dash, tags=tags))
+        else:
+            items.append(canvas.create_line(flat, fill=color, dash=dash, tags=tags))
+    return items
+
+
+def _draw_texts(canvas, store, rows, view, color, dash, tags):
+    table = store.tables["Text"]
+    p = table.insert[rows]
+    x, y = view.to_screen(p[:, 0], p[:, 1])
+    sizes = np.maximum((table.height[rows] * view.scale).astype(np.int64), 1)
+    # insertion point is the text's lower-left corner; negative font size = pixels
+    return [canvas.create_text(sx, sy, text=store.texts[row], fill=color, anchor="sw",
+                               font=("Arial", -size), tags=tags)
+            for row, sx, sy, size in zip(rows.tolist(), x.tolist(), y.tolist(), sizes.tolist())]
+
+
+_DRAW = {"Line": _draw_lines, "Circle": _draw_circles, "Polyline": _draw_polylines, "Text": _draw_texts}
+
+
+class CanvasScene:
+    """Canvas contents for a GeometryStore, kept in sync by applying change sets.
+
+    redraw() rebuilds the frame for the current view. apply() takes the
+    snapshot's change set (added/modified/erased handles) and only deletes
+    and draws the items of those entities, so a script that adds one line
+    costs one canvas item instead of a full clear-and-redraw. A full redraw
+    still happens when the view moved or the change set is large.
+
+    With `tiles` set (a cad_tiles.TileLayer) the drawing is shown as cached
+    raster tiles instead of vector items; the overlay stays vector.
+    """
+
+    def __init__(self, canvas, view, max_items=MAX_ITEMS, tiles=None):
+        self.canvas = canvas
+        self.view = view
+        self.max_items = max_items
+        self.tiles = tiles
+        self.stats = None
+        self._reset()
+
+    def _reset(self):
+        self.items = {}  # handle -> canvas item ids
+        self._dot_items = {}  # (px, py) -> canvas item id
+        self._dot_counts = collections.Counter()
+        self._dot_keys = np.zeros(0, dtype=np.int64)  # store keys of collapsed entities...
+        self._dot_pixels = np.zeros((0, 2), dtype=np.int64)  # ...and the pixel each one went to
+        self._view_state = None
+        self._overlay = None
+        self._overlay_version = None
+
+    def _state(self):
+        view = self.view
+        return view.scale, view.center, view.width, view.height
+
+    @property
+    def item_count(self):
+        return len(self.items) + len(self._dot_items)
+
+    # ----- full frame ----- #
+    def redraw(self, store, index, overlay=None):
+        """Clears the canvas and draws the visible part of `store`, then the overlay."""
+        self.canvas.delete("all")
+        self._reset()
+        if not self.view.fitted:
+            self.view.fit(store.bounds())
+        if self.tiles is not None:
+            self.stats = FrameStats(len(index), self.tiles.draw(self.canvas, store, index, self.view), 0, 0, False)
+        else:
+            ids = index.ids_in_bbox(*self.view.world_window())
+            self.stats = self._draw(store, index.kinds[ids], index.rows[ids], index.boxes[ids], self.max_items)
+        self._view_state = self._state()
+        self.set_overlay(overlay)
+        return self.stats
+
+    # ----- incremental updates ----- #
+    def apply(self, store, changes, get_index, overlay=None):
+        """Applies a snapshot change set; `get_index` is called only if a full redraw is needed."""
+        touched = changes["added"] | changes["modified"]
+        if (self._view_state != self._state() or self.stats is None
+                or len(touched) > self.max_items * REDRAW_FRACTION):
+            return self.redraw(store, get_index(), overlay)
+        if self.tiles is not None:
+            # only the tiles the changes touch are rasterized again
+            self.tiles.invalidate(store, changes)
+            self.tiles.draw(self.canvas, store, get_index(), self.view)
+            self._view_state = self._state()
+            self.set_overlay(overlay)
+            return self.stats
+
+        for handle in touched | changes["erased"]:
+            self._forget(handle)
+        kinds, rows = [], []
+        for handle in touched:
+            kind, row = store.locate(handle)
+            if kind is not None:
+                kinds.append(ENTITY_KINDS.index(kind))
+                rows.append(row)
+        if rows:
+            kinds, rows = np.array(kinds, dtype=np.int8), np.array(rows, dtype=np.int64)
+            boxes = np.zeros((len(rows), 4))
+            for code, kind in enumerate(ENTITY_KINDS):
+                mask = kinds == code
+                if mask.any():
+                    boxes[mask] = store.bboxes(kind, rows[mask])
+            xmin, ymin, xmax, ymax = self.view.world_window()
+            on_screen = ((boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin)
+                         & (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin))
+            # Changed entities are drawn even on a capped frame: they are what the user is looking for
+            self._draw(store, kinds[on_screen], rows[on_screen], boxes[on_screen], len(rows))
+        self.set_overlay(overlay)
+        self.canvas.tag_raise("overlay")
+        return self.stats
+
+    def _forget(self, handle):
+        for item in self.items.pop(handle, ()):
+            self.canvas.delete(item)
+        if not len(self._dot_keys):
+            return
+        try:
+            key = int(handle, 16)
+        except ValueError:
+            return
+        hit = np.flatnonzero(self._dot_keys == key)
+        for pixel in map(tuple, self._dot_pixels[hit].tolist()):
+            self._dot_counts[pixel] -= 1
+            if self._dot_counts[pixel] <= 0:
+                del self._dot_counts[pixel]
+                item = self._dot_items.pop(pixel, None)
+                if item is not None:
+                    self.canvas.delete(item)
+        self._dot_keys[hit] = np.iinfo(np.int64).min
+
+    # ----- overlay ----- #
+    def set_overlay(self, overlay):
+        """Redraws the overlay (blue, dashed) only if it changed since the last call."""
+        version = None if overlay is None else overlay.version
+        if overlay is self._overlay and version == self._overlay_version:
+            return
+        self.canvas.delete("overlay")
+        self._overlay, self._overlay_version = overlay, version
+        if overlay is not None and len(overlay):
+            index = SpatialIndex(overlay)
+            ids = index.ids_in_bbox(*self.view.world_window())
+            self._draw(overlay, index.kinds[ids], index.rows[ids], index.boxes[ids], self.max_items,
+                       color="blue", dash=(4, 2), tags=("overlay",), record=False)
+
+    # ----- drawing ----- #
+    def _draw(self, store, kinds, rows, boxes, max_items, color="black", dash=None, tags=(), record=True):
+        """Draws the given entities with LOD and an item cap; returns FrameStats."""
+        view, canvas = self.view, self.canvas
+        extent = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) * view.scale
+        is_text = kinds == _TEXT
+        readable = ~is_text | ((boxes[:, 3] - boxes[:, 1]) * view.scale >= MIN_TEXT_PX)
+        small = ~is_text & (extent < MIN_FEATURE_PX)
+        full = readable & ~small
+
+        # Sub-pixel entities: one dot per occupied pixel
+        sx, sy = view.to_screen((boxes[small, 0] + boxes[small, 2]) / 2.0, (boxes[small, 1] + boxes[small, 3]) / 2.0)
+        pixels = np.column_stack((np.floor(sx), np.floor(sy))).astype(np.int64)
+        unique, counts = np.unique(pixels, axis=0, return_counts=True)
+        unique = list(map(tuple, unique.tolist()))
+        new_dots = [p for p in unique if p not in self._dot_items]
+        drawn = 0
+        for x, y in new_dots[:max_items]:
+            item = canvas.create_rectangle(x, y, x + 1, y + 1, outline=color, tags=tags)
+            drawn += 1
+            if record:
+                self._dot_items[(x, y)] = item
+        if record and len(pixels):
+            small_ids = np.flatnonzero(small)
+            keys = np.zeros(len(small_ids), dtype=np.int64)
+            for code, kind in enumerate(ENTITY_KINDS):
+                mask = kinds[small_ids] == code
+                if mask.any():
+                    keys[mask] = store.tables[kind].handle.values[rows[small_ids[mask]]]
+            self._dot_keys = np.concatenate((self._dot_keys, keys))
+            self._dot_pixels = np.concatenate((self._dot_pixels, pixels))
+            self._dot_counts.update(dict(zip(unique, counts.tolist())))
+
+        # Largest entities first, so the cap drops the least visible ones
+        order = np.flatnonzero(full)[np.argsort(-extent[full], kind="stable")]
+        budget = max(max_items - drawn, 0)
+        truncated = len(order) > budget or len(new_dots) > max_items
+        order = order[:budget]
+        for code, kind in enumerate(ENTITY_KINDS):
+            selected = order[kinds[order] == code]
+            if not len(selected):
+                continue
+            kind_rows = rows[selected]
+            items = _DRAW[kind](canvas, store, kind_rows, view, color, dash, tags)
+            drawn += len(items)
+            if record:
+                keys = store.tables[kind].handle.values[kind_rows].tolist()
+                for key, item in zip(keys, items):
+                    if item is not None:
+                        self.items.setdefault(store.handle_text(key), []).append(item)
+        return FrameStats(len(rows), drawn, int(small.sum()), int((~readable).sum()), truncated)
+
+
+# ========== Headless Canvas ========== #
+class NullCanvas:
+    """Headless stand-in for tk.Canvas that only counts created items."""
+
+    def __init__(self, width=800, height=600):
+        self.width = width
+        self.height = height
+        self.items = collections.Counter()
+        self.deleted = 0
+        self._next_id = 1
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def _create(self, kind):
+        self.items[kind] += 1
+        item, self._next_id = self._next_id, self._next_id + 1
+        return item
+
+    def create_line(self, *args, **kwargs):
+        return self._create("line")
+
+    def create_oval(self, *args, **kwargs):
+        return self._create("oval")
+
+    def create_polygon(self, *args, **kwargs):
+        return self._create("polygon")
+
+    def create_rectangle(self, *args, **kwargs):
+        return self._create("rectangle")
+
+    def create_text(self, *args, **kwargs):
+        return self._create("text")
+
+    def create_image(self, *args, **kwargs):
+        return self._create("image")
+
+    def delete(self, *items):
+        if "all" in items:
+            self.items.clear()
+        else:
+            self.deleted += len(items)
+
+    def tag_raise(self, *args):
+        pass
+
+    def tag_lower(self, *args):
+        pass
+
+    @property
+    def item_count(self):
+        return sum(self.items.values())
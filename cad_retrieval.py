@@ -0,0 +1,128 @@
+# Retrieval of similar past generations for AutoCAD Gemini Copilot.
+# A local TF-IDF index over the prompts of runs that executed successfully
+# (see cad_history.py). For a new prompt the top matches go into the model
+# prompt as short few-shot examples; a near-identical earlier prompt (same
+# mode, similarity >= REUSE_SIMILARITY) lets the GUI offer the stored code
+# without calling the model at all. Numbers are tokens too, at half weight,
+# and reuse also requires the same numbers: "5x3 rectangle" and "10x2
+# rectangle" are similar, but only the exact dimensions are offered for reuse.
+# Everything is in memory and local; the index is built from the history
+# once and extended as runs succeed.
+
+import collections
+import math
+import re
+import threading
+
+TOP_K = 3
+MIN_SIMILARITY = 0.25
+REUSE_SIMILARITY = 0.9
+EXAMPLE_CHARS = 600
+MAX_DOCUMENTS = 20000
+NUMBER_WEIGHT = 0.5
+STOPWORDS = {"a", "an", "the", "of", "to", "in", "on", "at", "and", "or", "with", "for", "by", "from",
+             "please", "me", "it", "is", "that", "this", "draw", "create", "make", "add"}
+_TOKEN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+Match = collections.namedtuple("Match", "score id prompt mode code")
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _tf(count, term):
+    return (1.0 + math.log(count)) * (NUMBER_WEIGHT if term[0].isdigit() else 1.0)
+
+
+def _numbers(text):
+    return sorted(token for token in tokenize(text) if token[0].isdigit())
+
+
+class ExampleIndex:
+    """TF-IDF cosine similarity over past prompts, with an inverted index for lookups.
+
+    Document frequencies are kept current as entries are added; a document's
+    norm uses the IDF at the time it was added, which drifts little once the
+    index holds more than a handful of entries.
+    """
+
+    def __init__(self):
+        self.docs = []  # (id, prompt, mode, code)
+        self.norms = []
+        self.postings = collections.defaultdict(list)  # term -> [(doc, term weight)]
+        self.df = collections.Counter()
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_history(cls, history, limit=MAX_DOCUMENTS):
+        index = cls()
+        for run_id, prompt, mode, code in reversed(history.successful(limit)):
+            index.add(run_id, prompt, mode, code)
+        return index
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _idf(self, term):
+        return math.log((1 + len(self.docs)) / (1 + self.df[term])) + 1.0
+
+    def add(self, run_id, prompt, mode, code):
+        """Indexes one successful run; a repeat of the same prompt and code is skipped."""
+        terms = collections.Counter(tokenize(prompt))
+        key = (tuple(sorted(terms.items())), mode, code.strip())
+        with self._lock:
+            if not terms or key in self._keys:
+                return
+            self._keys[key] = len(self.docs)
+            doc = len(self.docs)
+            self.docs.append((run_id, prompt, mode, code))
+            self.df.update(terms.keys())
+            weights = {term: _tf(count, term) for term, count in terms.items()}
+            for term, weight in weights.items():
+                self.postings[term].append((doc, weight))
+            self.norms.append(math.sqrt(sum((w * self._idf(t)) ** 2 for t, w in weights.items())))
+
+    def search(self, prompt, k=TOP_K, mode=None, min_score=MIN_SIMILARITY):
+        """Best matches for a prompt (optionally only of one mode), most similar first."""
+        terms = collections.Counter(tokenize(prompt))
+        with self._lock:
+            if not terms or not self.docs:
+                return []
+            query = {term: _tf(count, term) * self._idf(term) for term, count in terms.items()}
+            query_norm = math.sqrt(sum(w * w for w in query.values()))
+            scores = collections.defaultdict(float)
+            for term, q_weight in query.items():
+                idf = self._idf(term)
+                for doc, weight in self.postings.get(term, ()):
+                    scores[doc] += q_weight * weight * idf
+            ranked = []
+            for doc, score in scores.items():
+                score /= query_norm * self.norms[doc]
+                run_id, doc_prompt, doc_mode, code = self.docs[doc]
+                if score >= min_score and (mode is None or doc_mode == mode):
+                    ranked.append(Match(round(min(score, 1.0), 4), run_id, doc_prompt, doc_mode, code))
+        ranked.sort(key=lambda m: (-m.score, -m.id))
+        return ranked[:k]
+
+    def reusable(self, prompt, mode, threshold=REUSE_SIMILARITY):
+        """A stored match close enough to offer instead of generating (same numbers too), or None."""
+        numbers = _numbers(prompt)
+        for match in self.search(prompt, TOP_K, mode, threshold):
+            if _numbers(match.prompt) == numbers:
+                return match
+        return None
+
+
+def format_examples(matches, max_chars=EXAMPLE_CHARS):
+    """Compact few-shot block for the model prompt ("" when there are no matches)."""
+    if not matches:
+        return ""
+    parts = ["Similar earlier requests whose code ran successfully (adapt them, do not copy blindly):"]
+    for match in matches:
+        code = match.code.strip()
+        if len(code) > max_chars:
+            code = code[:max_chars].rsplit("\n", 1)[0] + "\n# ..."
+        parts.append(f"# Request: {match.prompt}\n{code}")
+    return "\n\n".join(parts) + "\n"
@@ -0,0 +1,301 @@
+# Sandboxed execution for AutoCAD Gemini Copilot.
+# Generated code runs in a pool of pre-warmed worker processes instead of the
+# GUI process. Each worker dry-runs the script against RecordingAutocad (see
+# cad_preview.py) with the current entity snapshot, so it needs no COM
+# connection; what the script did comes back as recorded geometry plus an
+# ops list, and apply_result() replays that on the live drawing in bulk.
+# Scripts that use something the recorder cannot stand for (see
+# RecordingAutocad.unsupported) are refused by apply_result(); the app runs
+# those in-process instead and says so.
+#
+# A run that exceeds its wall-clock timeout (or is cancelled) has its worker
+# killed and replaced. On POSIX each job also gets a CPU-time rlimit and the
+# worker an address-space rlimit; on Windows the timeout is the guard.
+# Workers import the script environment (NumPy, pyautocad if installed)
+# before they report ready, so a run never pays for interpreter start-up.
+# The snapshot store is pickled to a worker only when it changed since that
+# worker's last job.
+#
+# Worker usage (started by SandboxPool, not by hand):
+#   python cad_sandbox.py --worker <host> <port> <authkey hex>
+
+import os
+import pickle
+import queue
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+
+SANDBOX_WORKERS = 2
+TIMEOUT_SECONDS = 30.0
+CPU_SECONDS = 30
+MEMORY_MB = 2048
+POLL_SECONDS = 0.1
+
+
+class SandboxError(Exception):
+    """Generated code failed inside a worker; the message holds its traceback."""
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class SandboxUnsupported(SandboxError):
+    """The dry run used calls or properties it cannot record, so replaying it would not match the script."""
+
+    def __init__(self, names):
+        super().__init__("The sandbox cannot replay: " + ", ".join(names))
+        self.names = names
+
+
+# ========== Worker Process ========== #
+def _set_limits(cpu_seconds=None, memory_mb=None):
+    try:
+        import resource
+    except ImportError:
+        return  # Windows: no rlimits, the parent's timeout still applies
+    if memory_mb:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+
+def _run_job(job, cache):
+    from cad_preview import RecordingAutocad, run_script
+    from cad_spatial import SpatialIndex
+
+    if job.get("store") is not None:
+        store = job["store"]
+        if isinstance(store, bytes):  # pickled by the caller while it held its snapshot lock
+            store = pickle.loads(store)
+        cache.clear()
+        cache.update(key=job["store_key"], store=store, index=None)
+    store = cache.get("store") if cache.get("key") == job["store_key"] else None
+    if store is not None and cache["index"] is None:
+        cache["index"] = SpatialIndex(store)
+    started = time.perf_counter()
+    recorder = RecordingAutocad(store)
+    failure = None
+    try:
+        run_script(job["code"], recorder, cache.get("index") if store is not None else None)
+    except Exception:
+        if not recorder.unsupported:
+            raise
+        failure = traceback.format_exc()  # most likely tripped over what the recorder could not model
+    order = {op[1]: i for i, op in enumerate(recorder.ops) if op[0] == "add"}
+    return {
+        "records": sorted(recorder.store.iter_entities(), key=lambda r: order.get(r["handle"], 0)),
+        "ops": recorder.ops,
+        "messages": recorder.messages,
+        "layers": sorted(recorder.layers),
+        "unsupported": recorder.unsupported,
+        "failure": failure,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def worker_main(host, port, authkey, memory_mb=MEMORY_MB):
+    # pre-warm: everything a script run needs is imported before reporting ready
+    import cad_preview  # noqa: F401
+    import cad_spatial  # noqa: F401
+    try:
+        import pyautocad  # noqa: F401
+    except ImportError:
+        pass
+    _set_limits(memory_mb=memory_mb)
+    conn = Client((host, port), authkey=authkey)
+    cache = {}
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        _set_limits(cpu_seconds=job.get("cpu_seconds"))
+        try:
+            result = _run_job(job, cache)
+        except BaseException as e:
+            result = {"error": "".join(traceback.format_exception(type(e), e, e.__traceback__))}
+        try:
+            conn.send(result)
+        except Exception as e:  # e.g. the script left something unpicklable in ops
+            conn.send({"error": f"Result could not be sent back: {type(e).__name__}: {e}"})
+    conn.close()
+
+
+# ========== Worker Pool ========== #
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.store_key = None
+
+    def kill(self):
+        try:
+            self.conn.close()
+        finally:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+
+
+class SandboxPool:
+    """Pre-warmed worker processes that dry-run generated code with limits.
+
+    run() blocks until a worker is free, so call it off the GUI thread.
+    Workers are started (and replaced after a kill) on a background thread.
+    """
+
+    def __init__(self, size=SANDBOX_WORKERS, timeout=TIMEOUT_SECONDS, cpu_seconds=CPU_SECONDS,
+                 memory_mb=MEMORY_MB):
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self._authkey = secrets.token_bytes(16)
+        self._listener = Listener(("127.0.0.1", 0), authkey=self._authkey)
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._spawn_lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._spawn_async()
+
+    # ----- workers ----- #
+    def _spawn(self):
+        host, port = self._listener.address
+        command = [sys.executable, os.path.abspath(__file__), "--worker", host, str(port),
+                   self._authkey.hex(), str(self.memory_mb or 0)]
+        with self._spawn_lock:  # one start-up at a time, so accept() gets this process's connection
+            process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+            conn = self._listener.accept()
+        worker = _Worker(process, conn)
+        if self._closed:
+            worker.kill()
+            return
+        self._workers.add(worker)
+        self._idle.put(worker)
+
+    def _spawn_async(self):
+        threading.Thread(target=self._spawn, name="sandbox-spawn", daemon=True).start()
+
+    def _discard(self, worker):
+        self._workers.discard(worker)
+        worker.kill()
+        if not self._closed:
+            self._spawn_async()
+
+    # ----- running ----- #
+    def run(self, code, store=None, store_key=None, timeout=None, cancelled=None):
+        """Dry-runs code in a worker; returns its result dict (see apply_result).
+
+        `store` is the snapshot store the script may read, or its pickle (so a
+        caller can copy it under its lock and wait here without holding it);
+        `store_key` is any value that changes whenever the store does. `cancelled` is polled while waiting.
+        Raises SandboxError if the script fails and SandboxTimeout if it is killed.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise SandboxError("No sandbox worker became available.") from None
+        job = {"code": code, "store_key": store_key, "store": None, "cpu_seconds": self.cpu_seconds}
+        if store is not None and worker.store_key != store_key:
+            job["store"] = store
+        try:
+            worker.conn.send(job)
+            worker.store_key = store_key if store is not None else worker.store_key
+            deadline = time.monotonic() + timeout
+            while not worker.conn.poll(POLL_SECONDS):
+                if time.monotonic() > deadline:
+                    raise SandboxTimeout(f"Generated code did not finish within {timeout:g} s; the worker was killed.")
+                if cancelled is not None and cancelled():
+                    raise SandboxTimeout("Run cancelled; the worker was killed.")
+            result = worker.conn.recv()
+        except SandboxTimeout:
+            self._discard(worker)
+            raise
+        except (EOFError, OSError):
+            status = worker.process.wait()
+            self._discard(worker)
+            raise SandboxError(f"Sandbox worker died (exit code {status}); CPU or memory limit exceeded?")
+        self._idle.put(worker)
+        if "error" in result:
+            raise SandboxError(result["error"])
+        return result
+
+    def close(self):
+        self._closed = True
+        for worker in list(self._workers):
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+        self._workers.clear()
+        self._listener.close()
+
+
+# ========== Replaying Results ========== #
+def apply_result(acad, result):
+    """Replays a sandbox result on a live connection; returns the created handles.
+
+    New entities are created in bulk (acad.add_records when available, so a
+    TrackingAutocad records them); the recorded ops are then replayed in order
+    with synthetic handles mapped to the real ones. A result with
+    `unsupported` entries raises SandboxUnsupported before anything is
+    sent; run such code in-process instead.
+    """
+    from cad_preview import RecordedEntity
+    from cad_transaction import create_entities
+
+    if result.get("unsupported"):
+        raise SandboxUnsupported(result["unsupported"])
+    doc = acad.doc
+    for name in result["layers"]:
+        doc.Layers.Add(name)
+    records = result["records"]
+    create = getattr(acad, "add_records", None) or (lambda items: create_entities(acad, items))
+    handles = create([{k: v for k, v in r.items() if k != "handle"} for r in records])
+    real = {r["handle"]: h for r, h in zip(records, handles) if h}
+    recorded = {op[1] for op in result["ops"] if op[0] == "add"}
+    for op in result["ops"]:
+        kind = op[0]
+        if kind == "command":
+            doc.SendCommand(op[1])
+            continue
+        if kind == "add":
+            continue
+        handle = op[1]
+        if handle in recorded:
+            if handle not in real or kind == "delete":
+                continue  # deleted later in the script: never created
+            if kind == "set" and op[2] in RecordedEntity._GEOMETRY:
+                continue  # already part of the created record
+            handle = real[handle]
+        entity = doc.HandleToObject(handle)
+        if kind == "set":
+            setattr(entity, op[2], op[3])
+        elif kind == "call":
+            getattr(entity, op[2])(*op[3])
+        elif kind == "delete":
+            entity.Delete()
+    for message in result["messages"]:
+        acad.prompt(message)
+    return [h for h in handles if h]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 5 and sys.argv[1] == "--worker":
+        worker_main(sys.argv[2], int(sys.argv[3]), bytes.fromhex(sys.argv[4]),
+                    int(sys.argv[5]) if len(sys.argv) > 5 else MEMORY_MB)
+    else:
+        sys.exit("usage: cad_sandbox.py --worker <host> <port> <authkey hex> [memory MB]")
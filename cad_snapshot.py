@@ -0,0 +1,317 @@
+# Entity snapshot cache for AutoCAD Gemini Copilot.
+# Keeps one record per drawing entity, keyed by its AutoCAD Handle, so the
+# drawing summary and the preview canvas are served from memory instead of
+# walking the model space over COM on every prompt and every redraw.
+# Geometry is held in a columnar GeometryStore (see cad_geometry.py) and
+# entities are read through a pluggable reader (see cad_reader.py).
+# With persist=True the snapshot is also saved next to the drawing and
+# restored on the next start when the document is unchanged (cad_persist.py).
+# A hash tree over the entities (cad_fingerprint.py) is kept in step; its
+# root identifies the drawing state and re-reads are diffed against it.
+# Without document events, a caller that knows which handles changed (e.g. a
+# Transaction after a run) passes them to invalidate(); only those are re-read,
+# and the model space count decides whether anything else changed and a
+# diff is needed after all.
+
+import threading
+
+from cad_fingerprint import DrawingFingerprint
+from cad_geometry import GeometryStore
+from cad_persist import document_fingerprint, load_store, save_store, snapshot_path
+from cad_reader import ComEntityReader, read_entity
+from cad_spatial import SpatialIndex
+
+
+# ========== Change Sets ========== #
+def _merge(first, second):
+    """Change set of two refreshes applied one after the other."""
+    added = (first["added"] - second["erased"]) | (second["added"] - first["erased"])
+    erased = (first["erased"] - second["added"]) | (second["erased"] - first["added"])
+    modified = (first["modified"] | second["modified"] | (first["erased"] & second["added"])) - added - erased
+    return {"added": added, "modified": modified, "erased": erased}
+
+
+# ========== Document Events ========== #
+class _DocumentEventSink:
+    """Receives AcadDocument events and forwards them to the snapshot."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def ObjectAdded(self, this, obj):
+        self.snapshot.mark_modified(obj.Handle)
+
+    def ObjectModified(self, this, obj):
+        self.snapshot.mark_modified(obj.Handle)
+
+    def ObjectErased(self, this, object_id):
+        self.snapshot.mark_erased_id(object_id)
+
+
+# ========== Snapshot Store ========== #
+class EntitySnapshot:
+    """In-memory copy of the drawing, updated incrementally.
+
+    The first refresh reads every entity. After that only entities reported
+    by document events (added/modified/erased) are re-read. When events are
+    not available, an invalidated snapshot is brought up to date by a diff:
+    with a bulk reader the whole drawing is re-exported in one round-trip
+    and compared record by record; with the COM reader one Handle is read
+    per entity and full reads happen only for new ones. invalidate(handles)
+    skips the diff when the model space count shows nothing else changed.
+    """
+
+    def __init__(self, reader=None, persist=False):
+        self.reader = reader or ComEntityReader()
+        self.store = GeometryStore()
+        self.fingerprint = DrawingFingerprint()
+        self.version = 0
+        self.persist = persist
+        self.restored = False
+        self._saved = None  # (version, document) last written or restored
+        self._object_ids = {}
+        self._dirty = set()
+        self._erased = set()
+        self._loaded = False
+        self._stale = False
+        self._needs_diff = False
+        self._check_count = False
+        self._count = None  # model space count as of the last scan, diff or count check
+        self._events = None
+        self._index = None
+        self.lock = threading.RLock()
+
+    # ----- change tracking ----- #
+    def attach_events(self, acad):
+        """Subscribes to document events; returns False if they are unavailable."""
+        try:
+            import comtypes.client
+            self._events = comtypes.client.GetEvents(acad.doc, _DocumentEventSink(self))
+            return True
+        except Exception:
+            self._events = None
+            return False
+
+    def pump_events(self):
+        """Delivers pending document events; call periodically on the COM thread."""
+        if self._events is not None:
+            import comtypes.client
+            comtypes.client.PumpEvents(0)
+
+    def mark_modified(self, handle):
+        self._dirty.add(handle)
+        self._erased.discard(handle)
+
+    def mark_erased(self, handle):
+        self._erased.add(handle)
+        self._dirty.discard(handle)
+
+    def mark_erased_id(self, object_id):
+        handle = self._object_ids.get(object_id)
+        if handle is not None:
+            self.mark_erased(handle)
+        else:
+            self._needs_diff = True
+
+    def invalidate(self, handles=None):
+        """Flags the snapshot for a diff on the next refresh (unless events keep it current).
+
+        With `handles`, only those are re-read; the diff still runs if the
+        model space count does not add up afterwards.
+        """
+        if handles is None:
+            self._stale = True
+        else:
+            self._dirty.update(handles)
+            self._erased.difference_update(handles)
+            self._check_count = True
+
+    @property
+    def root(self):
+        """Hex digest of the drawing state as of the last refresh."""
+        return self.fingerprint.digest
+
+    # ----- refresh ----- #
+    def refresh(self, acad, full=False):
+        """Brings the snapshot in line with the drawing and returns the change set.
+
+        The change set is a dict of handle sets: added, modified, erased.
+        """
+        with self.lock:
+            return self._refresh(acad, full)
+
+    def _refresh(self, acad, full):
+        document = None
+        if full or not self._loaded:
+            document = self._fingerprint(acad)
+            changes = self._full_scan(acad)
+        elif self._needs_diff or (self._stale and self._events is None):
+            changes = self._diff(acad)
+        else:
+            changes = self._apply_events(acad)
+            if self._check_count and self._events is None and not self._count_matches(acad, changes):
+                changes = _merge(changes, self._diff(acad))
+        self._stale = self._needs_diff = self._check_count = False
+        self._dirty.clear()
+        self._erased.clear()
+        if changes["added"] or changes["modified"] or changes["erased"]:
+            self.version += 1
+        if document is not None:
+            self._write(document)
+        return changes
+
+    def _store(self, record):
+        if record is None:
+            return None
+        object_id = record.pop("object_id", None)
+        if object_id is not None:
+            self._object_ids[object_id] = record["handle"]
+        self.store.add(record)
+        return record
+
+    def _remove(self, handle):
+        self.store.remove(handle)
+
+    def _count_matches(self, acad, changes):
+        count = int(acad.model.Count)
+        expected = None if self._count is None else self._count + len(changes["added"]) - len(changes["erased"])
+        self._count = count
+        return count == expected
+
+    def _full_scan(self, acad):
+        self._count = int(acad.model.Count)
+        previous = self.fingerprint
+        self.store.clear()
+        self._object_ids = {}
+        for record in self.reader.read_all(acad):
+            self._store(record)
+        self._loaded = True
+        self.fingerprint = DrawingFingerprint.from_store(self.store)
+        return self.fingerprint.changes_from(previous)  # only entities whose hash changed
+
+    def _diff(self, acad):
+        self._count = int(acad.model.Count)
+        if self.reader.bulk:
+            return self._record_diff(acad)
+        seen = set()
+        added = set()
+        for handle, entity in self.reader.read_handles(acad):
+            seen.add(handle)
+            if handle not in self.store:
+                if self._store(read_entity(entity)) is not None:
+                    added.add(handle)
+        erased = self.store.handles() - seen
+        for handle in erased:
+            self._remove(handle)
+        changes = {"added": added, "modified": set(), "erased": erased}
+        self.fingerprint.update(self.store, changes)
+        return changes
+
+    def _record_diff(self, acad):
+        # read into a scratch store and compare hash trees; only changed entities touch the snapshot
+        current = GeometryStore()
+        object_ids = {}
+        for record in self.reader.read_all(acad):
+            object_id = record.pop("object_id", None)
+            if object_id is not None:
+                object_ids[object_id] = record["handle"]
+            current.add(record)
+        fingerprint = DrawingFingerprint.from_store(current)
+        changes = fingerprint.changes_from(self.fingerprint)
+        for handle in changes["erased"]:
+            self._remove(handle)
+        for handle in changes["added"] | changes["modified"]:
+            self.store.add(current.get(handle))
+        self._object_ids = object_ids
+        self.fingerprint = fingerprint
+        return changes
+
+    def _apply_events(self, acad):
+        added, modified, erased = set(), set(), set()
+        for handle in self._erased:
+            if handle in self.store:
+                self._remove(handle)
+                erased.add(handle)
+        records = self.reader.read_some(acad, self._dirty) if self._dirty else {}
+        for handle in self._dirty:
+            existed = handle in self.store
+            record = self._store(records.get(handle))
+            if record is None:
+                if existed:
+                    self._remove(handle)
+                    erased.add(handle)
+            elif existed:
+                modified.add(handle)
+            else:
+                added.add(handle)
+        changes = {"added": added, "modified": modified, "erased": erased}
+        self.fingerprint.update(self.store, changes)
+        return changes
+
+    # ----- persistence ----- #
+    def _fingerprint(self, acad):
+        if not self.persist:
+            return None
+        try:
+            return document_fingerprint(acad)
+        except Exception:
+            return None
+
+    def _write(self, document):
+        path = snapshot_path(document["name"])
+        if path is None:
+            return None
+        self.store.detach()  # the file being replaced may still be mapped (Windows refuses to replace it)
+        try:
+            save_store(path, self.store, document, self.fingerprint.digest)
+        except OSError:
+            return None
+        self._saved = (self.version, document)
+        return path
+
+    def restore(self, acad):
+        """Loads the saved snapshot if the open drawing still matches it; returns True if it was loaded.
+
+        Call once after connecting, before the first refresh.
+        """
+        document = self._fingerprint(acad)
+        if document is None:
+            return False
+        fingerprints = []
+
+        def verify(store):
+            fingerprints.append(DrawingFingerprint.from_store(store))
+            return fingerprints[-1].digest
+
+        store = load_store(snapshot_path(document["name"]), document, verify)
+        with self.lock:
+            if store is None or self._loaded:
+                return False
+            self.store = store
+            self.fingerprint = fingerprints[-1]
+            self._loaded = self.restored = True
+            self._count = document["count"]
+            self._index = None
+            self.version += 1
+            self._saved = (self.version, document)
+        return True
+
+    def save(self, acad):
+        """Brings the snapshot up to date and writes it next to the drawing; returns the path or None."""
+        with self.lock:
+            # fingerprint first: an edit made during the refresh makes the file stale, never wrong
+            document = self._fingerprint(acad)
+            if document is None:
+                return None
+            self._refresh(acad, False)  # a first refresh is a full scan, which saves by itself
+            if self._saved == (self.version, document):
+                return snapshot_path(document["name"])  # nothing changed since the file was written
+            return self._write(document)
+
+    # ----- queries ----- #
+    def index(self):
+        """Spatial index over the snapshot, rebuilt lazily after changes."""
+        with self.lock:
+            if self._index is None or self._index.version != self.store.version:
+                self._index = SpatialIndex(self.store)
+            return self._index
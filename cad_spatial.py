@@ -0,0 +1,150 @@
+# Spatial index over drawing entities for AutoCAD Gemini Copilot.
+# A uniform grid built from the GeometryStore bounding boxes, stored CSR
+# style (entity ids sorted by cell + per-cell start offsets) so window,
+# radius and nearest-neighbour queries touch only nearby cells instead of
+# iterating every object over COM.
+
+import math
+
+import numpy as np
+
+from cad_geometry import ENTITY_KINDS
+
+TARGET_PER_CELL = 4
+MAX_CELLS_PER_ENTITY = 64
+MAX_CELLS_PER_QUERY = 256
+
+
+class SpatialIndex:
+    """Uniform-grid index; ids refer to (kind, row) pairs of the store."""
+
+    def __init__(self, store):
+        self.store = store
+        self.version = store.version
+        kinds, rows, boxes = [], [], []
+        for code, kind in enumerate(ENTITY_KINDS):
+            kind_rows = store.rows(kind)
+            kind_boxes = store.bboxes(kind, kind_rows)
+            valid = ~np.isnan(kind_boxes).any(axis=1)
+            kinds.append(np.full(int(valid.sum()), code, dtype=np.int8))
+            rows.append(kind_rows[valid])
+            boxes.append(kind_boxes[valid])
+        self.kinds = np.concatenate(kinds)
+        self.rows = np.concatenate(rows)
+        self.boxes = np.concatenate(boxes) if len(self.kinds) else np.zeros((0, 4))
+        self._build_grid()
+
+    # ----- construction ----- #
+    def _build_grid(self):
+        count = len(self.boxes)
+        if not count:
+            self.origin, self.cell, self.shape = (0.0, 0.0), 1.0, (1, 1)
+            self.order = np.zeros(0, dtype=np.int64)
+            self.starts = np.zeros(2, dtype=np.int64)
+            self.large = np.zeros(0, dtype=np.int64)
+            return
+        xmin, ymin = self.boxes[:, 0].min(), self.boxes[:, 1].min()
+        xmax, ymax = self.boxes[:, 2].max(), self.boxes[:, 3].max()
+        width, height = max(xmax - xmin, 1e-9), max(ymax - ymin, 1e-9)
+        cells = max(1, count // TARGET_PER_CELL)
+        self.cell = max(math.sqrt(width * height / cells), max(width, height) / 4096.0)
+        self.origin = (xmin, ymin)
+        self.shape = (int(width // self.cell) + 1, int(height // self.cell) + 1)
+
+        cx0, cy0 = self._cell_of(self.boxes[:, 0], self.boxes[:, 1])
+        cx1, cy1 = self._cell_of(self.boxes[:, 2], self.boxes[:, 3])
+        widths = cx1 - cx0 + 1
+        spans = widths * (cy1 - cy0 + 1)
+        large = spans > MAX_CELLS_PER_ENTITY
+        self.large = np.flatnonzero(large)
+        small = np.flatnonzero(~large)
+        spans, widths, cx0, cy0 = spans[small], widths[small], cx0[small], cy0[small]
+        ids = np.repeat(small, spans)
+        local = np.arange(ids.size) - np.repeat(np.cumsum(spans) - spans, spans)
+        cell_x = np.repeat(cx0, spans) + local % np.repeat(widths, spans)
+        cell_y = np.repeat(cy0, spans) + local // np.repeat(widths, spans)
+        cell_ids = cell_y * self.shape[0] + cell_x
+        sort = np.argsort(cell_ids, kind="stable")
+        self.order = ids[sort]
+        total = self.shape[0] * self.shape[1]
+        self.starts = np.concatenate(([0], np.cumsum(np.bincount(cell_ids, minlength=total))))
+
+    def _cell_of(self, x, y):
+        cx = np.clip(((np.asarray(x) - self.origin[0]) // self.cell).astype(np.int64), 0, self.shape[0] - 1)
+        cy = np.clip(((np.asarray(y) - self.origin[1]) // self.cell).astype(np.int64), 0, self.shape[1] - 1)
+        return cx, cy
+
+    def __len__(self):
+        return len(self.boxes)
+
+    # ----- id queries ----- #
+    def _candidates(self, xmin, ymin, xmax, ymax):
+        (cx0, cx1), (cy0, cy1) = zip(self._cell_of(xmin, ymin), self._cell_of(xmax, ymax))
+        cx0, cx1, cy0, cy1 = int(cx0), int(cx1), int(cy0), int(cy1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > MAX_CELLS_PER_QUERY:
+            return None
+        chunks = [self.large]
+        for cy in range(cy0, cy1 + 1):
+            first = cy * self.shape[0]
+            chunks.append(self.order[self.starts[first + cx0]:self.starts[first + cx1 + 1]])
+        return np.unique(np.concatenate(chunks))
+
+    def ids_in_bbox(self, xmin, ymin, xmax, ymax):
+        """Ids of entities whose bounding box intersects the window."""
+        if not len(self.boxes):
+            return np.zeros(0, dtype=np.int64)
+        ids = self._candidates(xmin, ymin, xmax, ymax)
+        boxes = self.boxes if ids is None else self.boxes[ids]
+        hit = (boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin) & (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin)
+        return np.flatnonzero(hit) if ids is None else ids[hit]
+
+    def distances(self, ids, x, y):
+        """Distance from (x, y) to the bounding boxes of the given ids."""
+        boxes = self.boxes[ids]
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - boxes[:, 3]), 0.0)
+        return np.hypot(dx, dy)
+
+    def ids_within(self, x, y, radius):
+        ids = self.ids_in_bbox(x - radius, y - radius, x + radius, y + radius)
+        return ids[self.distances(ids, x, y) <= radius]
+
+    def ids_nearest(self, x, y, k=1):
+        """Ids of the k entities closest to (x, y), nearest first."""
+        k = min(k, len(self.boxes))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        radius = self.cell
+        while True:
+            ids = self.ids_within(x, y, radius)
+            if len(ids) >= k or radius > self.cell * (self.shape[0] + self.shape[1]) + self._outside(x, y):
+                break
+            radius *= 2
+        distance = self.distances(ids, x, y)
+        order = np.argsort(distance, kind="stable")[:k]
+        return ids[order]
+
+    def _outside(self, x, y):
+        xmax = self.origin[0] + self.cell * self.shape[0]
+        ymax = self.origin[1] + self.cell * self.shape[1]
+        return math.hypot(max(self.origin[0] - x, x - xmax, 0.0), max(self.origin[1] - y, y - ymax, 0.0))
+
+    # ----- entity queries (used by generated code) ----- #
+    def records(self, ids):
+        return [self.store.record(ENTITY_KINDS[self.kinds[i]], int(self.rows[i])) for i in ids.tolist()]
+
+    def entities_in(self, xmin, ymin, xmax, ymax):
+        """Entity dicts whose bounding box intersects the window."""
+        return self.records(self.ids_in_bbox(xmin, ymin, xmax, ymax))
+
+    def within(self, x, y, radius):
+        """Entity dicts within `radius` of (x, y)."""
+        return self.records(self.ids_within(x, y, radius))
+
+    def nearest(self, x, y, k=1):
+        """The k entity dicts closest to (x, y), nearest first."""
+        return self.records(self.ids_nearest(x, y, k))
+
+    def rows_of(self, ids, kind):
+        """Store rows of the given kind among the ids."""
+        return self.rows[ids[self.kinds[ids] == ENTITY_KINDS.index(kind)]]
@@ -0,0 +1,83 @@
+# Start-up profiling for AutoCAD Gemini Copilot.
+# `python CAD_AI_Visual_1.4.py --profile-startup` starts the app again in a
+# child interpreter with `-X importtime`. The child records named marks
+# (imports done, window built, window interactive, and when AutoCAD, Gemini
+# and the history index are ready in the background), prints them and
+# closes itself; the parent then prints the marks, measured from process
+# launch, next to the slowest top-level imports.
+
+import json
+import subprocess
+import sys
+import time
+
+PROFILE_FLAG = "--profile-startup"
+REPORT_FLAG = "--startup-report"
+REPORT_PREFIX = "STARTUP-MARKS "
+TOP_IMPORTS = 15
+WAIT_SECONDS = 30
+
+
+class StartupMarks:
+    """Named wall-clock timestamps, printed as one line when the app runs with REPORT_FLAG."""
+
+    def __init__(self):
+        self.enabled = REPORT_FLAG in sys.argv
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, time.time()))
+
+    def has(self, prefix):
+        return any(name.startswith(prefix) for name, _ in self.marks)
+
+    def finish_when(self, window, prefixes, timeout=WAIT_SECONDS):
+        """Polls (Tk after) until a mark starting with every prefix exists, then reports and closes the window."""
+        deadline = time.time() + timeout
+
+        def check():
+            if all(self.has(prefix) for prefix in prefixes) or time.time() > deadline:
+                print(REPORT_PREFIX + json.dumps(self.marks), flush=True)
+                window.destroy()
+            else:
+                window.after(50, check)
+
+        window.after(50, check)
+
+
+marks = StartupMarks()
+
+
+def parse_importtime(text, top=TOP_IMPORTS):
+    """(cumulative ms, module) of the slowest top-level imports in `-X importtime` output."""
+    imports = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split("|")  # "import time: self [us] | cumulative | <indent>module"
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2]
+        if name.startswith("  "):
+            continue  # nested import, already counted in its parent's cumulative time
+        imports.append((int(parts[1]) / 1000.0, name.strip()))
+    imports.sort(reverse=True)
+    return imports[:top]
+
+
+def profile_startup(script, timeout=WAIT_SECONDS + 30):
+    """Runs `script` once with import timing and start-up marks; prints the report, returns an exit code."""
+    launched = time.time()
+    child = subprocess.run([sys.executable, "-X", "importtime", script, REPORT_FLAG],
+                           capture_output=True, text=True, timeout=timeout)
+    report = [line for line in child.stdout.splitlines() if line.startswith(REPORT_PREFIX)]
+    if not report:
+        print(child.stderr[-2000:] or "The app exited without a start-up report.", file=sys.stderr)
+        return 1
+    print(f"{'start-up mark':<28} {'ms after launch':>15}")
+    for name, stamp in json.loads(report[-1][len(REPORT_PREFIX):]):
+        print(f"{name:<28} {(stamp - launched) * 1000:>15.0f}")
+    print(f"\n{'slowest top-level imports':<40} {'cumulative ms':>13}")
+    for ms, name in parse_importtime(child.stderr):
+        print(f"{name:<40} {ms:>13.1f}")
+    return 0
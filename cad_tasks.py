@@ -0,0 +1,184 @@
+# Background task execution for AutoCAD Gemini Copilot.
+# AutoCAD COM access runs on one dedicated thread (COM objects are bound to
+# the apartment that created them), model calls run on a small thread pool,
+# and results come back through a queue that the Tk main loop polls with
+# window.after(), so the GUI never blocks on the network or on COM.
+# Cancelling stops work that has not finished; COM work that did finish
+# still gets its callback, since the drawing has changed either way.
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL_MS = 50
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    """Handle for a queued unit of work; supports cancellation and progress."""
+
+    def __init__(self, name):
+        self.name = name
+        self.finished = False
+        self.background = False  # start-up/service work, left alone by TaskExecutor.cancel_all
+        self._cancel = threading.Event()
+        self._executor = None
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """Raises TaskCancelled if the task was cancelled; call between steps."""
+        if self._cancel.is_set():
+            raise TaskCancelled(self.name)
+
+    def progress(self, text):
+        if self._executor is not None:
+            self._executor.results.put(("progress", self, text, None))
+
+    def emit(self, callback, value):
+        """Calls callback(value) on the GUI thread, e.g. for partial results."""
+        if self._executor is not None:
+            self._executor.results.put(("emit", self, value, callback))
+
+
+class TaskExecutor:
+    """Runs COM work on a single apartment thread and model calls on a pool.
+
+    Work functions are called as fn(task, *args). Callbacks (on_done with the
+    result, on_error with the exception) are invoked on the thread that calls
+    poll(), i.e. the Tk main thread. Errors without an on_error callback go
+    to the executor-wide `on_error`.
+    """
+
+    def __init__(self, com_init=None, workers=2, pump=None, on_error=None):
+        self.on_error = on_error
+        self.results = queue.Queue()
+        self.active = []
+        self._com_queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini-model")
+        self._pump = pump
+        self._com_thread = threading.Thread(target=self._com_loop, args=(com_init,),
+                                            name="autocad-com", daemon=True)
+        self._com_thread.start()
+
+    # ----- COM apartment thread ----- #
+    def _com_loop(self, com_init):
+        try:
+            import comtypes
+            comtypes.CoInitialize()
+        except ImportError:
+            pass
+        if com_init is not None:
+            init = Task("Connecting to AutoCAD")
+            init._executor = self
+            self._run(init, lambda task: com_init(), (), None, self._report_init_error)
+        while True:
+            try:
+                item = self._com_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._pump is not None:
+                    self._pump()
+                continue
+            if item is None:
+                break
+            self._run(*item, com=True)
+
+    def _report_init_error(self, error):
+        self.results.put(("progress", None, f"AutoCAD connection failed: {error}", None))
+
+    def _run(self, task, fn, args, on_done, on_error, com=False):
+        if task.cancelled:
+            self.results.put(("cancelled", task, None, None))
+            return
+        try:
+            result = fn(task, *args)
+        except TaskCancelled:
+            self.results.put(("cancelled", task, None, None))
+        except Exception as error:
+            self.results.put(("cancelled" if task.cancelled and not com else "error", task, error, on_error))
+        else:
+            # finished COM work changed the drawing: its callback runs even if cancel came too late
+            self.results.put(("cancelled" if task.cancelled and not com else "done", task, result, on_done))
+
+    # ----- submission ----- #
+    def _track(self, task, name, background):
+        task = task or Task(name)
+        task._executor = self
+        task.finished = False
+        task.background = background
+        if task not in self.active:
+            self.active.append(task)
+        return task
+
+    def submit_com(self, name, fn, *args, on_done=None, on_error=None, task=None, background=False):
+        """Queues fn(task, *args) on the AutoCAD COM thread."""
+        task = self._track(task, name, background)
+        self._com_queue.put((task, fn, args, on_done, on_error))
+        return task
+
+    def submit(self, name, fn, *args, on_done=None, on_error=None, task=None, background=False):
+        """Queues fn(task, *args) on the model worker pool.
+
+        `background` work (start-up, indexing) is not stopped by cancel_all().
+        """
+        task = self._track(task, name, background)
+        self._pool.submit(self._run, task, fn, args, on_done, on_error)
+        return task
+
+    def cancel_all(self):
+        """Cancels the user's unfinished tasks; returns how many."""
+        tasks = [task for task in self.active if not task.background]
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    # ----- Tk integration ----- #
+    def poll(self, on_status=None):
+        """Dispatches finished work; call from the GUI thread."""
+        while True:
+            try:
+                kind, task, value, callback = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                if on_status is not None:
+                    on_status(value)
+                continue
+            if kind == "emit":
+                if not task.cancelled:
+                    callback(value)
+                continue
+            if task in self.active:
+                self.active.remove(task)
+            task.finished = True
+            if kind == "cancelled":
+                if on_status is not None:
+                    on_status(f"Cancelled: {task.name}")
+                continue
+            if kind == "error" and callback is None:
+                callback = self.on_error
+            if callback is not None:
+                callback(value)
+
+    def attach(self, window, on_status=None, interval=POLL_INTERVAL_MS):
+        """Polls the result queue from the Tk event loop."""
+        def tick():
+            try:
+                self.poll(on_status)
+            finally:  # a failing callback must not stop result delivery for good
+                window.after(interval, tick)
+        window.after(interval, tick)
+
+    def shutdown(self):
+        for task in self.active:
+            task.cancel()
+        self._com_queue.put(None)
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,230 @@
+# Raster tile cache for AutoCAD Gemini Copilot.
+# An alternative preview for very dense drawings: geometry is rasterized
+# with NumPy into 256x256 grayscale tiles per zoom level and the canvas
+# shows a handful of image items instead of thousands of vector items.
+# Tiles are cached (LRU), so panning only rasterizes newly exposed tiles,
+# and a change set only invalidates the tiles its entities touch.
+#
+# Zoom levels are quarter octaves (scale = 2 ** (level / 4)); in raster mode
+# the viewport scale snaps to the nearest level so cached tiles line up.
+
+import collections
+import math
+
+import numpy as np
+
+from cad_geometry import ENTITY_KINDS
+
+TILE_SIZE = 256
+LEVELS_PER_OCTAVE = 4
+MAX_TILES = 256
+CIRCLE_SEGMENTS = 32
+INK, PAPER = 0, 255
+
+
+def level_of(scale):
+    return int(round(math.log2(scale) * LEVELS_PER_OCTAVE))
+
+
+def level_scale(level):
+    return 2.0 ** (level / LEVELS_PER_OCTAVE)
+
+
+# ========== Segments ========== #
+def entity_segments(store, kind, rows):
+    """(N, 4) x1, y1, x2, y2 world segments outlining the given rows, plus the row of each."""
+    table = store.tables[kind]
+    if kind == "Line":
+        return table.coords[rows], rows
+    if kind == "Circle":
+        c = table.circle[rows]
+        angles = np.linspace(0.0, 2 * np.pi, CIRCLE_SEGMENTS + 1)
+        xs = c[:, :1] + c[:, 2:3] * np.cos(angles)
+        ys = c[:, 1:2] + c[:, 2:3] * np.sin(angles)
+        segments = np.stack((xs[:, :-1], ys[:, :-1], xs[:, 1:], ys[:, 1:]), axis=2).reshape(-1, 4)
+        return segments, np.repeat(rows, CIRCLE_SEGMENTS)
+    if kind == "Text":
+        # greeked: the text's bounding box outline
+        b = store.bboxes("Text", rows)
+        corners = [(0, 1, 2, 1), (2, 1, 2, 3), (2, 3, 0, 3), (0, 3, 0, 1)]
+        segments = np.stack([b[:, list(c)] for c in corners], axis=1).reshape(-1, 4)
+        return segments, np.repeat(rows, 4)
+    counts = table.count[rows]
+    if not counts.sum():
+        return np.zeros((0, 4)), rows[:0]
+    offsets = table.offset[rows]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    index = np.repeat(offsets - starts, counts) + np.arange(int(counts.sum()))
+    points = store.vertices.values[index]
+    owner = np.repeat(np.arange(len(rows)), counts)
+    same = owner[1:] == owner[:-1]
+    segments = np.column_stack((points[:-1][same], points[1:][same]))
+    owners = owner[:-1][same]
+    closed = table.closed[rows] & (counts > 2)
+    if closed.any():
+        first, last = starts[closed], starts[closed] + counts[closed] - 1
+        segments = np.concatenate((segments, np.column_stack((points[last], points[first]))))
+        owners = np.concatenate((owners, np.flatnonzero(closed)))
+    return segments, rows[owners]
+
+
+def rasterize(segments, size=TILE_SIZE):
+    """Draws pixel-space segments into a size x size grayscale image (ink on paper)."""
+    image = np.full((size, size), PAPER, dtype=np.uint8)
+    if not len(segments):
+        return image
+    x1, y1, x2, y2 = segments.T
+    dx, dy = x2 - x1, y2 - y1
+    # Liang-Barsky clip to the tile (one pixel of slack)
+    t0, t1 = np.zeros(len(segments)), np.ones(len(segments))
+    for p, q in ((-dx, x1 + 1), (dx, size - x1), (-dy, y1 + 1), (dy, size - y1)):
+        parallel = p == 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = q / p
+        t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+        t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+        t0 = np.where(parallel & (q < 0), 2.0, t0)
+    keep = t0 <= t1
+    x1, y1, dx, dy, t0, t1 = x1[keep], y1[keep], dx[keep], dy[keep], t0[keep], t1[keep]
+    cx1, cy1 = x1 + dx * t0, y1 + dy * t0
+    cdx, cdy = dx * (t1 - t0), dy * (t1 - t0)
+    steps = np.ceil(np.maximum(np.abs(cdx), np.abs(cdy))).astype(np.int64) + 1
+    owner = np.repeat(np.arange(len(steps)), steps)
+    t = (np.arange(int(steps.sum())) - np.repeat(np.cumsum(steps) - steps, steps)) / np.maximum(steps - 1, 1)[owner]
+    px = np.floor(cx1[owner] + cdx[owner] * t).astype(np.int64)
+    py = np.floor(cy1[owner] + cdy[owner] * t).astype(np.int64)
+    inside = (px >= 0) & (px < size) & (py >= 0) & (py < size)
+    image[py[inside], px[inside]] = INK
+    return image
+
+
+def to_pgm(image):
+    """Binary PGM bytes, which tk.PhotoImage(data=..., format="PPM") accepts without Pillow."""
+    height, width = image.shape
+    return b"P5 %d %d 255\n" % (width, height) + image.tobytes()
+
+
+# ========== Tile Cache ========== #
+Tile = collections.namedtuple("Tile", "image keys")
+
+
+class TileCache:
+    """LRU cache of rasterized tiles keyed by (level, tx, ty)."""
+
+    def __init__(self, max_tiles=MAX_TILES, size=TILE_SIZE):
+        self.max_tiles = max_tiles
+        self.size = size
+        self.tiles = collections.OrderedDict()
+        self.rendered = 0
+
+    def tile_bbox(self, level, tx, ty):
+        span = self.size / level_scale(level)
+        return tx * span, ty * span, (tx + 1) * span, (ty + 1) * span
+
+    def tiles_for(self, level, window):
+        """Tile coordinates covering a world window at a level."""
+        span = self.size / level_scale(level)
+        xmin, ymin, xmax, ymax = window
+        return [(tx, ty) for ty in range(int(math.floor(ymin / span)), int(math.floor(ymax / span)) + 1)
+                for tx in range(int(math.floor(xmin / span)), int(math.floor(xmax / span)) + 1)]
+
+    def get(self, store, index, level, tx, ty):
+        key = (level, tx, ty)
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = self._render(store, index, level, tx, ty)
+            self.tiles[key] = tile
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        else:
+            self.tiles.move_to_end(key)
+        return tile
+
+    def _render(self, store, index, level, tx, ty):
+        scale = level_scale(level)
+        xmin, ymin, xmax, ymax = self.tile_bbox(level, tx, ty)
+        ids = index.ids_in_bbox(xmin, ymin, xmax, ymax)
+        parts, keys = [], []
+        for code, kind in enumerate(ENTITY_KINDS):
+            rows = index.rows[ids[index.kinds[ids] == code]]
+            if not len(rows):
+                continue
+            segments, _ = entity_segments(store, kind, rows)
+            parts.append(segments)
+            keys.append(store.tables[kind].handle.values[rows])
+        segments = np.concatenate(parts) if parts else np.zeros((0, 4))
+        # world -> tile pixels (y flipped: tile row 0 is the top edge)
+        pixels = np.column_stack(((segments[:, 0] - xmin) * scale, (ymax - segments[:, 1]) * scale,
+                                  (segments[:, 2] - xmin) * scale, (ymax - segments[:, 3]) * scale))
+        self.rendered += 1
+        return Tile(rasterize(pixels, self.size), np.sort(np.concatenate(keys)) if keys else np.zeros(0, np.int64))
+
+    def invalidate(self, store, changes):
+        """Drops tiles holding erased/modified entities or touched by added/modified ones."""
+        gone = [int(h, 16) for h in changes["erased"] | changes["modified"] if _is_hex(h)]
+        boxes = []
+        for handle in changes["added"] | changes["modified"]:
+            kind, row = store.locate(handle)
+            if kind is not None:
+                boxes.append(store.bboxes(kind, np.array([row]))[0])
+        boxes = np.array(boxes).reshape(-1, 4)
+        gone = np.array(gone, dtype=np.int64)
+        for key in list(self.tiles):
+            tile = self.tiles[key]
+            stale = len(gone) and np.isin(gone, tile.keys, assume_unique=False).any()
+            if not stale and len(boxes):
+                xmin, ymin, xmax, ymax = self.tile_bbox(*key)
+                stale = ((boxes[:, 0] <= xmax) & (boxes[:, 2] >= xmin)
+                         & (boxes[:, 1] <= ymax) & (boxes[:, 3] >= ymin)).any()
+            if stale:
+                del self.tiles[key]
+
+    def clear(self):
+        self.tiles.clear()
+
+
+def _is_hex(handle):
+    try:
+        int(handle, 16)
+        return True
+    except ValueError:
+        return False
+
+
+# ========== Canvas Layer ========== #
+class TileLayer:
+    """Shows cached tiles for the viewport on a canvas.
+
+    `make_image` turns PGM bytes into a canvas image (tk.PhotoImage in the
+    GUI); images are kept per tile so a pan re-uses them.
+    """
+
+    def __init__(self, make_image, cache=None):
+        self.make_image = make_image
+        self.cache = cache or TileCache()
+        self._images = {}
+
+    def draw(self, canvas, store, index, view):
+        """Places the visible tiles; returns the number of tiles shown."""
+        level = level_of(view.scale)
+        view.scale = level_scale(level)
+        canvas.delete("tiles")
+        shown = 0
+        for tx, ty in self.cache.tiles_for(level, view.world_window()):
+            tile = self.cache.get(store, index, level, tx, ty)
+            image = self._images.get((level, tx, ty))
+            if image is None or image[0] is not tile:
+                image = (tile, self.make_image(to_pgm(tile.image)))
+                self._images[(level, tx, ty)] = image
+            xmin, _, _, ymax = self.cache.tile_bbox(level, tx, ty)
+            sx, sy = view.to_screen(xmin, ymax)
+            canvas.create_image(int(round(float(sx))), int(round(float(sy))), image=image[1], anchor="nw", tags=("tiles",))
+            shown += 1
+        # forget images of tiles the cache has evicted
+        for key in [k for k in self._images if k not in self.cache.tiles]:
+            del self._images[key]
+        canvas.tag_lower("tiles")
+        return shown
+
+    def invalidate(self, store, changes):
+        self.cache.invalidate(store, changes)
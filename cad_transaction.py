@@ -0,0 +1,266 @@
+# Transactional execution for AutoCAD Gemini Copilot.
+# Generated code runs against TrackingAutocad, a thin proxy over the real
+# connection that records the handle of every entity the script creates and
+# the pre-run state (from the snapshot) of every existing entity it modifies
+# or erases. The resulting Transaction undoes the run with one batched erase
+# (cad_lisp gemini-erase) plus property restores, and redoes it by replaying
+# the captured geometry in one batched create (gemini-load) -- the Python is
+# never executed again. Both fall back to per-entity COM calls if the LISP
+# bridge is unavailable. touched() lists the handles a run or replay can have
+# changed, so the snapshot re-reads just those; a run that went around the
+# proxy (SendCommand, acad.app, ...) is marked `opaque` and needs a full diff.
+
+import array
+
+import cad_lisp
+from cad_backend import APoint
+
+MUTATORS = {"Move", "Rotate", "Rotate3D", "ScaleEntity", "TransformBy", "Mirror3D"}
+CREATORS = {"Copy", "Mirror", "Offset", "Explode", "ArrayPolar", "ArrayRectangular"}
+OPAQUE = {"SendCommand", "PostCommand", "Application", "Database", "Blocks", "Layouts", "PaperSpace"}
+
+_lisp = {"available": True}
+
+
+# ========== Writing Entities over COM ========== #
+def add_entity(model, record):
+    """Creates one entity from a record with individual COM calls; returns it."""
+    kind = record["type"]
+    if kind == "Line":
+        entity = model.AddLine(APoint(*record["start"][:2]), APoint(*record["end"][:2]))
+    elif kind == "Circle":
+        entity = model.AddCircle(APoint(*record["center"][:2]), record["radius"])
+    elif kind == "Polyline":
+        entity = model.AddLightWeightPolyline(array.array("d", [v for p in record["vertices"] for v in p[:2]]))
+        entity.Closed = bool(record.get("closed"))
+    elif kind == "Text":
+        entity = model.AddText(record["text"], APoint(*record["position"][:2]), record.get("height", 1.0))
+    else:
+        raise ValueError(f"Unsupported entity type {kind!r}")
+    entity.Layer = record.get("layer", "0")
+    return entity
+
+
+def write_entity(entity, record):
+    """Sets an existing entity's layer and geometry to match a record."""
+    entity.Layer = record.get("layer", "0")
+    kind = record["type"]
+    if kind == "Line":
+        entity.StartPoint = APoint(*record["start"][:2])
+        entity.EndPoint = APoint(*record["end"][:2])
+    elif kind == "Circle":
+        entity.Center = APoint(*record["center"][:2])
+        entity.Radius = record["radius"]
+    elif kind == "Polyline":
+        entity.Coordinates = array.array("d", [v for p in record["vertices"] for v in p[:2]])
+        entity.Closed = bool(record.get("closed"))
+    elif kind == "Text":
+        entity.TextString = record["text"]
+        entity.InsertionPoint = APoint(*record["position"][:2])
+        entity.Height = record.get("height", 1.0)
+
+
+def create_entities(acad, records):
+    """Creates records in one LISP round-trip (COM fallback); returns the new handles.
+
+    Handles line up with `records`; None marks a record that could not be created.
+    """
+    if not records:
+        return []
+    if _lisp["available"]:
+        try:
+            return cad_lisp.load_entities(acad.doc, records)
+        except Exception:
+            _lisp["available"] = False
+    return [add_entity(acad.model, record).Handle for record in records]
+
+
+def erase_entities(acad, handles):
+    """Erases handles in one LISP round-trip (COM fallback); returns how many existed."""
+    if not handles:
+        return 0
+    if _lisp["available"]:
+        try:
+            return cad_lisp.erase_handles(acad.doc, handles)
+        except Exception:
+            _lisp["available"] = False
+    erased = 0
+    for handle in handles:
+        try:
+            acad.doc.HandleToObject(handle).Delete()
+            erased += 1
+        except Exception:
+            pass
+    return erased
+
+
+# ========== Transaction ========== #
+class Transaction:
+    """What one run of generated code did to the drawing, with batched undo/redo."""
+
+    def __init__(self, code, store):
+        self.code = code
+        self.state = "running"
+        self.created = []  # handles of entities the run created
+        self.before = {}  # handle -> record before the run, for entities it modified or erased
+        self.after = {}  # handle -> record after the run, for created and modified entities
+        self.modified = []
+        self.erased = []  # records of existing entities the run erased
+        self.restored = []  # handles of those records while undone
+        self.untracked = set()  # changed outside the proxy (no pre-run state to restore)
+        self.opaque = False  # the script reached the drawing some way the proxies do not see
+        self._store = store
+
+    # ----- recording (called by the proxies) ----- #
+    def on_created(self, handle):
+        self.created.append(handle)
+
+    def on_touch(self, handle):
+        if handle not in self.before and handle not in self.created and self._store is not None:
+            record = self._store.get(handle)
+            if record is not None:
+                self.before[handle] = record
+
+    def touched(self):
+        """Handles this transaction created, modified, erased or restored."""
+        return set(self.created) | set(self.before) | set(self.restored)
+
+    def finish(self, store, changes):
+        """Completes the record from the post-run snapshot and its change set."""
+        known = set(self.created)
+        self.created += [h for h in changes["added"] if h not in known]
+        self.untracked = {h for h in changes["modified"] | changes["erased"] if h not in self.before}
+        self.modified = [h for h in self.before if h not in changes["erased"]]
+        self.erased = [self.before[h] for h in self.before if h in changes["erased"]]
+        self.after = {h: store.get(h) for h in self.created + self.modified}
+        self.created = [h for h in self.created if self.after.get(h) is not None]
+        self.state = "done"
+        self._store = None
+
+    # ----- undo / redo ----- #
+    def undo(self, acad):
+        """Erases what the run created and restores what it modified or erased."""
+        erase_entities(acad, self.created)
+        for handle in self.modified:
+            write_entity(acad.doc.HandleToObject(handle), self.before[handle])
+        self.restored = [h for h in create_entities(acad, self.erased) if h]
+        self.state = "undone"
+
+    def redo(self, acad):
+        """Replays the run's result from the captured geometry (no code is executed)."""
+        records = [self.after[h] for h in self.created]
+        created = [(h, r) for h, r in zip(create_entities(acad, records), records) if h]
+        self.created = [h for h, _ in created]
+        self.after = dict(created, **{h: self.after[h] for h in self.modified})
+        for handle in self.modified:
+            write_entity(acad.doc.HandleToObject(handle), self.after[handle])
+        erase_entities(acad, self.restored)
+        self.restored = []
+        self.state = "done"
+
+    def summary(self):
+        text = f"{len(self.created)} created, {len(self.modified)} modified, {len(self.erased)} erased"
+        if self.untracked:
+            text += f", {len(self.untracked)} changed untracked"
+        return text
+
+
+# ========== Tracking Proxies ========== #
+class _Proxy:
+    def __init__(self, target, transaction):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_transaction", transaction)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+
+class TrackedEntity(_Proxy):
+    """An entity handed to generated code; writes and edits are recorded before they happen."""
+
+    def _touch(self):
+        self._transaction.on_touch(self._target.Handle)
+
+    def __setattr__(self, name, value):
+        self._touch()
+        setattr(self._target, name, value)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name == "Delete" or name in MUTATORS:
+            def mutate(*args):
+                self._touch()
+                return value(*args)
+            return mutate
+        if name in CREATORS:
+            def create(*args):
+                return _track_created(value(*args), self._transaction)
+            return create
+        return value
+
+
+def _track_created(result, transaction):
+    if isinstance(result, (tuple, list)):
+        return type(result)(_track_created(item, transaction) for item in result)
+    transaction.on_created(result.Handle)
+    return TrackedEntity(result, transaction)
+
+
+class TrackingModelSpace(_Proxy):
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name.startswith("Add"):
+            return lambda *args: _track_created(value(*args), self._transaction)
+        if name == "Item":
+            return lambda index: TrackedEntity(value(index), self._transaction)
+        return value
+
+    def __iter__(self):
+        for entity in self._target:
+            yield TrackedEntity(entity, self._transaction)
+
+
+class TrackingDocument(_Proxy):
+    def __getattr__(self, name):
+        if name == "ModelSpace":
+            return TrackingModelSpace(self._target.ModelSpace, self._transaction)
+        if name in OPAQUE:
+            self._transaction.opaque = True
+        value = getattr(self._target, name)
+        if name == "HandleToObject":
+            return lambda handle: TrackedEntity(value(handle), self._transaction)
+        return value
+
+
+class TrackingAutocad(_Proxy):
+    """Wraps an Autocad connection and records what generated code does through it."""
+
+    @property
+    def model(self):
+        return TrackingModelSpace(self._target.model, self._transaction)
+
+    @property
+    def doc(self):
+        return TrackingDocument(self._target.doc, self._transaction)
+
+    ActiveDocument = doc
+
+    @property
+    def app(self):
+        self._transaction.opaque = True
+        return self._target.app
+
+    def add_records(self, records):
+        """Bulk creation for cad_bulk; the new handles count as created by the run."""
+        handles = create_entities(self._target, records)
+        for handle in handles:
+            if handle:
+                self._transaction.on_created(handle)
+        return handles
+
+    def iter_objects(self, *args, **kwargs):
+        for entity in self._target.iter_objects(*args, **kwargs):
+            yield TrackedEntity(entity, self._transaction)
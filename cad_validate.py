@@ -0,0 +1,308 @@
+# Static validation of generated code for AutoCAD Gemini Copilot.
+# Before anything is executed, the script is fence-stripped, parsed, and
+# walked once: imports outside ALLOWED_MODULES, dangerous builtins (called
+# or merely referenced), `__builtins__`, dunder attribute access and strings
+# that spell a dunder name (for getattr-style or str.format lookups) are
+# rejected; `while` loops that can never end and
+# loops whose constant iteration count is absurd are flagged; and the number
+# of entities the script creates (acad.model.Add* and batch.* calls times the
+# enclosing loop counts) is estimated. It takes milliseconds and no COM call.
+# numpy is not allowed: its file functions (load, savetxt, ...) would get
+# around the `open` block and unpickle arbitrary data. Recursion is not
+# checked; the sandbox timeout (and, in-process, Python's recursion limit)
+# is the only guard against a script that recurses without end.
+# repair() feeds the problems back to the model until the code passes.
+
+import ast
+import collections
+import re
+
+from cad_model import strip_code_fences
+
+ALLOWED_MODULES = {"pyautocad", "math", "cmath", "random", "itertools", "functools", "collections",
+                   "array", "statistics", "decimal", "fractions", "string", "re"}
+BLOCKED_CALLS = {"eval", "exec", "compile", "open", "__import__", "input", "breakpoint", "exit", "quit",
+                 "globals", "locals", "vars", "getattr", "setattr", "delattr"}
+ALLOWED_DUNDER_NAMES = {"__name__", "__main__"}  # `if __name__ == "__main__":`
+BATCH_METHODS = {"line", "circle", "polyline", "rectangle", "text"}
+MAX_ITERATIONS = 1000000
+MAX_ENTITIES = 200000
+REPAIR_ATTEMPTS = 1
+
+
+class Validation(collections.namedtuple("Validation", "code errors warnings entities exact")):
+    """Outcome of validate(): the stripped code, problems found and the entity estimate.
+
+    `exact` is False when some loop count is unknown, so `entities` is a lower bound.
+    """
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def report(self):
+        return "\n".join(f"- {problem}" for problem in self.errors + self.warnings)
+
+
+# ========== Constant Folding ========== #
+_DUNDER = re.compile(r"__\w+__")
+_OPERATORS = {ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b, ast.Mult: lambda a, b: a * b,
+              ast.FloorDiv: lambda a, b: a // b, ast.Div: lambda a, b: a / b, ast.Mod: lambda a, b: a % b,
+              ast.Pow: lambda a, b: a ** b if abs(b) <= 64 else None}
+
+
+def _number(node, constants):
+    """Value of a numeric expression built from literals and known names, else None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.Name):
+        return constants.get(node.id)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _number(node.operand, constants)
+        return -value if value is not None else None
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        left, right = _number(node.left, constants), _number(node.right, constants)
+        if left is None or right is None:
+            return None
+        try:
+            return _OPERATORS[type(node.op)](left, right)
+        except (ArithmeticError, ValueError):
+            return None
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ("int", "round") \
+            and len(node.args) == 1:
+        value = _number(node.args[0], constants)
+        return int(value) if value is not None else None
+    return None
+
+
+def _string(node):
+    """Value of a string built from literals ('a' + 'b', f'{"a"}b', ''.join([...])), else None."""
+    if isinstance(node, ast.Constant):
+        return node.value if isinstance(node.value, str) else None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left, right = _string(node.left), _string(node.right)
+        return left + right if left is not None and right is not None else None
+    if isinstance(node, ast.FormattedValue):
+        return _string(node.value)
+    if isinstance(node, ast.JoinedStr):
+        parts = [_string(value) for value in node.values]
+        return "".join(parts) if None not in parts else None
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "join" \
+            and len(node.args) == 1 and isinstance(node.args[0], (ast.List, ast.Tuple)):
+        separator = _string(node.func.value)
+        parts = [_string(element) for element in node.args[0].elts]
+        return separator.join(parts) if separator is not None and None not in parts else None
+    return None
+
+
+# ========== Analysis ========== #
+def _leaves_loop(body):
+    """True if the loop body can end the loop: a break of this loop, or a return/raise anywhere in it."""
+    stack = [(node, True) for node in body]
+    while stack:
+        node, own = stack.pop()
+        if isinstance(node, (ast.Return, ast.Raise)) or (own and isinstance(node, ast.Break)):
+            return True
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            continue
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+            # a break in a nested loop only ends that loop; one in its else clause ends ours
+            stack.extend((child, False) for child in node.body)
+            stack.extend((child, own) for child in node.orelse)
+        else:
+            stack.extend((child, own) for child in ast.iter_child_nodes(node))
+    return False
+
+
+def _assigned_names(body):
+    names = set()
+    for node in ast.walk(ast.Module(body=list(body), type_ignores=[])):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+    return names
+
+
+class _Analyzer(ast.NodeVisitor):
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+        self.constants = {}
+        self.multiplier = 1
+        self.entities = 0
+        self.exact = True
+
+    def problem(self, node, text, warning=False):
+        (self.warnings if warning else self.errors).append(f"line {getattr(node, 'lineno', '?')}: {text}")
+
+    # ----- imports, names, attributes ----- #
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._check_module(node, alias.name)
+
+    def visit_ImportFrom(self, node):
+        self._check_module(node, node.module or "")
+
+    def _check_module(self, node, name):
+        if name.split(".")[0] not in ALLOWED_MODULES:
+            self.problem(node, f"import of '{name}' is not allowed")
+
+    def visit_Attribute(self, node):
+        if node.attr.startswith("__") and node.attr.endswith("__"):
+            self.problem(node, f"access to '{node.attr}' is not allowed")
+        self.generic_visit(node)
+
+    def visit_Name(self, node):
+        if node.id in BLOCKED_CALLS:  # also catches aliases such as `g = getattr`
+            self.problem(node, f"use of '{node.id}' is not allowed")
+        elif node.id.startswith("__") and node.id.endswith("__") and node.id not in ALLOWED_DUNDER_NAMES:
+            self.problem(node, f"access to '{node.id}' is not allowed")
+
+    def _check_string(self, node):
+        text = _string(node)
+        names = [name for name in _DUNDER.findall(text or "") if name not in ALLOWED_DUNDER_NAMES]
+        if names:
+            self.problem(node, f"string naming a dunder attribute ({names[0]}) is not allowed")
+        return bool(names)
+
+    def visit_Constant(self, node):
+        self._check_string(node)
+
+    def visit_BinOp(self, node):
+        if not self._check_string(node):
+            self.generic_visit(node)
+
+    def visit_JoinedStr(self, node):
+        if not self._check_string(node):
+            self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        value = _number(node.value, self.constants)
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                if value is not None and self.multiplier == 1:
+                    self.constants[target.id] = value
+                else:
+                    self.constants.pop(target.id, None)
+        self.generic_visit(node)
+
+    # ----- calls ----- #
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Name) and func.id in BLOCKED_CALLS:
+            self.problem(node, f"call to '{func.id}()' is not allowed")
+            for child in node.args + node.keywords:  # not func: one problem per call is enough
+                self.visit(child)
+            return
+        if isinstance(func, ast.Attribute):
+            if func.attr.startswith("Add") and func.attr != "Add":
+                self.entities += self.multiplier
+            elif func.attr in BATCH_METHODS and isinstance(func.value, ast.Name) and func.value.id == "batch":
+                self.entities += self.multiplier
+            elif func.attr == "join" and self._check_string(node):
+                return
+        self.generic_visit(node)
+
+    # ----- loops ----- #
+    def _iterations(self, node):
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return len(node.elts)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            name, args = node.func.id, node.args
+            if name == "range" and 1 <= len(args) <= 3:
+                values = [_number(arg, self.constants) for arg in args]
+                if all(isinstance(v, int) for v in values) and values[-1 if len(values) == 3 else 0] != 0:
+                    return len(range(*values))
+            if name in ("enumerate", "reversed", "sorted", "list", "tuple") and args:
+                return self._iterations(args[0])
+            if name == "zip" and args:
+                counts = [self._iterations(arg) for arg in args]
+                return min(counts) if None not in counts else None
+        return None
+
+    def _loop(self, node, count, body):
+        if count is None:
+            self.exact = False
+            count = 1
+        total = self.multiplier * count
+        if total > MAX_ITERATIONS:
+            self.problem(node, f"loop runs about {total:,} iterations (limit {MAX_ITERATIONS:,})")
+        outer, self.multiplier = self.multiplier, max(total, 1)
+        for child in body:
+            self.visit(child)
+        self.multiplier = outer
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self.visit(node.target)
+        self._loop(node, self._iterations(node.iter), node.body)
+        for child in node.orelse:
+            self.visit(child)
+
+    def visit_While(self, node):
+        self.visit(node.test)
+        if not _leaves_loop(node.body):
+            constant = _number(node.test, {}) if not isinstance(node.test, ast.Constant) else node.test.value
+            names = {n.id for n in ast.walk(node.test) if isinstance(n, ast.Name)}
+            calls = any(isinstance(n, ast.Call) for n in ast.walk(node.test))
+            if constant:
+                self.problem(node, "'while' loop with a constant condition and no break never ends")
+            elif names and not calls and not names & _assigned_names(node.body):
+                self.problem(node, f"'while' condition never changes inside the loop ({', '.join(sorted(names))})")
+        self._loop(node, None, node.body)
+        for child in node.orelse:
+            self.visit(child)
+
+    def _comprehension(self, node, elements):
+        outer = self.multiplier
+        for generator in node.generators:
+            self.visit(generator.iter)
+            count = self._iterations(generator.iter)
+            if count is None:
+                self.exact = False
+                count = 1
+            self.multiplier *= max(count, 1)
+            if self.multiplier > MAX_ITERATIONS:
+                self.problem(node, f"comprehension runs about {self.multiplier:,} iterations (limit {MAX_ITERATIONS:,})")
+            for condition in generator.ifs:
+                self.visit(condition)
+        for element in elements:
+            self.visit(element)
+        self.multiplier = outer
+
+    def visit_ListComp(self, node):
+        self._comprehension(node, [node.elt])
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._comprehension(node, [node.key, node.value])
+
+
+# ========== Entry Points ========== #
+def validate(code):
+    """Checks generated code without running it; returns a Validation."""
+    code = strip_code_fences(code)
+    if not code.strip():
+        return Validation(code, ["the response contains no code"], [], 0, True)
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return Validation(code, [f"line {e.lineno}: syntax error: {e.msg}"], [], 0, True)
+    analyzer = _Analyzer()
+    analyzer.visit(tree)
+    if analyzer.entities > MAX_ENTITIES:
+        analyzer.errors.append(f"creates about {analyzer.entities:,} entities (limit {MAX_ENTITIES:,})")
+    return Validation(code, analyzer.errors, analyzer.warnings, analyzer.entities, analyzer.exact)
+
+
+def repair(code, fix, attempts=REPAIR_ATTEMPTS):
+    """Validates code and, while it fails, asks `fix(code, report)` for a corrected version.
+
+    Returns the last Validation (check .ok) and the number of repair round-trips made.
+    """
+    result = validate(code)
+    rounds = 0
+    while not result.ok and rounds < attempts:
+        rounds += 1
+        result = validate(fix(result.code, result.report()))
+    return result, rounds
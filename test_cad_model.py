@@ -0,0 +1,44 @@
+# Tests for the markdown fence stripping in cad_model.py.
+# Every reply is checked whole (strip_code_fences), fed in small chunks the
+# way a streamed reply arrives, and through stream_code with the fake model.
+#
+# Usage:
+#   python -m pytest test_cad_model.py
+
+from cad_model import FakeModel, FenceStripper, stream_code, strip_code_fences
+
+REPLIES = {
+    "plain code": ("x = 1\ny = 2", "x = 1\ny = 2"),
+    "fenced": ("```python\nx = 1\n```", "x = 1"),
+    "fenced, text after": ("```python\nx = 1\n```\nThis draws a line.", "x = 1"),
+    "unclosed fence": ("```python\nx = 1\n", "x = 1"),
+    "closing fence only": ("x = 1\n```", "x = 1"),
+    "prose first": ("Here is the code:\n```python\nacad.model.AddLine(1,2)\n```\n", "acad.model.AddLine(1,2)"),
+    "prose lines first": ("Sure.\nIt draws a line.\n```\nx = 1\n```\nDone.", "x = 1"),
+}
+
+
+def _chunked(text, size):
+    stripper = FenceStripper()
+    for i in range(0, len(text), size):
+        stripper.feed(text[i:i + size])
+    stripper.finish()
+    return stripper.text.strip()
+
+
+def test_strip_code_fences():
+    for name, (reply, code) in REPLIES.items():
+        assert strip_code_fences(reply) == code, name
+
+
+def test_chunked_input():
+    for name, (reply, code) in REPLIES.items():
+        for size in (1, 2, 3, 5, 16):
+            assert _chunked(reply, size) == code, (name, size)
+
+
+def test_stream_code():
+    for name, (reply, code) in REPLIES.items():
+        chunks = []
+        assert stream_code(FakeModel(reply=reply, chunk_size=4), "prompt", chunks.append) == code, name
+        assert chunks, name